@@ -0,0 +1,283 @@
+"""Admission control: per-endpoint concurrency lanes and per-agent rate limits.
+
+Agents fire their `sstime` timers in step, so uploads arrive in waves that
+would otherwise each buffer an image and queue for a DB thread, and login
+and dashboards wait behind them. Every request is sorted into a lane
+before its body is read:
+
+    critical   POST /login, /sessions/..., GET /agent/config
+    upload     POST /upload-screenshot, POST|PUT /uploads...
+    activity   POST /activity/batch
+    dashboard  GET /api/... (not live streams or exports)
+
+A lane runs at most `concurrency` requests at once; the rest wait in FIFO
+order for up to ADMISSION_QUEUE_TIMEOUT seconds. A request that finds
+`queue` others already waiting, or times out, is shed with 503. The
+critical lane has no cap and is never shed. The bulk lanes (upload,
+activity) are also shed outright while more than ADMISSION_SHED_BACKLOG
+units of work wait for a DB thread, so logins and session changes find
+the database free during a wave.
+
+Per-agent token buckets (`rate` per second, up to `burst` saved up) are
+checked by the handlers once the agent's email is known, and answer 429.
+Every refusal carries Retry-After, spread randomly by up to
+ADMISSION_JITTER of the delay so agents turned away together don't come
+back together. Lane settings are read from ADMISSION_<LANE>_<SETTING>,
+e.g. ADMISSION_UPLOAD_CONCURRENCY=4; a concurrency or rate of 0 means
+unlimited.
+
+Lanes and buckets live in each worker process and all settings are per
+worker: with WEB_CONCURRENCY workers a host runs up to WEB_CONCURRENCY
+times a lane's concurrency, and an agent whose requests land on different
+workers gets up to WEB_CONCURRENCY times its rate. Size them accordingly.
+Exports are left out: each holds a connection for the whole download and
+export.py caps them at EXPORT_CONCURRENCY per worker instead.
+"""
+import asyncio
+import math
+import os
+import random
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from app.database import db
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+ADMISSION_SHED_BACKLOG = int(os.getenv("ADMISSION_SHED_BACKLOG", "10"))
+ADMISSION_RETRY_AFTER = float(os.getenv("ADMISSION_RETRY_AFTER", "5"))
+ADMISSION_JITTER = float(os.getenv("ADMISSION_JITTER", "1.0"))  # fraction of the delay
+ADMISSION_MAX_AGENTS = int(os.getenv("ADMISSION_MAX_AGENTS", "100000"))
+
+# lane: (concurrency, queue, per-agent rate/s, burst, shed on DB backlog)
+_DEFAULTS = {
+    "critical": (0, 0, 0.0, 0, False),
+    "upload": (4, 32, 0.2, 10, True),
+    "activity": (8, 64, 1.0, 30, True),
+    "dashboard": (8, 64, 0.0, 0, False),
+}
+
+_ROUTES = [
+    ("critical", "POST", re.compile(r"^/(login|sessions/start|sessions/end/[^/]+)$")),
+    ("critical", "GET", re.compile(r"^/agent/config$")),
+    ("upload", "POST", re.compile(r"^/(upload-screenshot|uploads(/[^/]+/finalize)?)$")),
+    ("upload", "PUT", re.compile(r"^/uploads/[^/]+$")),
+    ("activity", "POST", re.compile(r"^/activity/batch$")),
+    # Live streams stay open for hours and exports for minutes; a slot would
+    # be gone for that long. Exports have their own cap (EXPORT_CONCURRENCY).
+    ("dashboard", "GET", re.compile(r"^/api/(?!live/|export(/|$))")),
+]
+
+
+def _setting(lane: str, name: str, default):
+    return type(default)(os.getenv(f"ADMISSION_{lane.upper()}_{name}", default))
+
+
+def retry_after(delay: float) -> int:
+    """Whole seconds to send in Retry-After: `delay` plus random jitter."""
+    return max(1, math.ceil(delay * (1 + random.uniform(0, ADMISSION_JITTER))))
+
+
+def _refusal(detail: str, delay: float) -> Tuple[dict, dict]:
+    seconds = retry_after(delay)
+    return {"detail": detail, "retry_after": seconds}, {"Retry-After": str(seconds)}
+
+
+class Lane:
+    def __init__(self, name: str, concurrency: int, queue: int, shed_on_backlog: bool):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.shed_on_backlog = shed_on_backlog
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+        self.admitted = 0
+        self.queued = 0
+        self.shed_full = 0
+        self.shed_timeout = 0
+        self.shed_backlog = 0
+
+    def _free(self) -> bool:
+        return not self.concurrency or self.active < self.concurrency
+
+    async def acquire(self, timeout: float) -> Optional[str]:
+        """Take a slot; returns None when admitted, else why the request was shed."""
+        if self.shed_on_backlog and db.backlog() > ADMISSION_SHED_BACKLOG:
+            self.shed_backlog += 1
+            return "database busy"
+        if self._free() and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return None
+        if len(self._waiters) >= self.queue:
+            self.shed_full += 1
+            return "too many requests queued"
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self.queued += 1
+        try:
+            # Shielded so a slot handed over just as we time out is not lost
+            await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except asyncio.TimeoutError:
+            if not fut.done():
+                fut.cancel()
+                self.shed_timeout += 1
+                return "timed out waiting for capacity"
+        except BaseException:
+            # Client went away while queued
+            if fut.done() and not fut.cancelled():
+                self.release()
+            else:
+                fut.cancel()
+            raise
+        finally:
+            if fut.cancelled():
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+        self.admitted += 1
+        return None
+
+    def release(self):
+        # Hand the slot straight to the oldest waiter, if any
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed_full": self.shed_full,
+            "shed_timeout": self.shed_timeout,
+            "shed_backlog": self.shed_backlog,
+        }
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: int, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Spend a token; returns 0, or the seconds until one is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    def __init__(self, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT, max_agents: int = ADMISSION_MAX_AGENTS):
+        self.queue_timeout = queue_timeout
+        self.max_agents = max_agents
+        self.lanes: Dict[str, Lane] = {}
+        self.rates: Dict[str, Tuple[float, int]] = {}
+        for name, (concurrency, queue, rate, burst, shed) in _DEFAULTS.items():
+            self.lanes[name] = Lane(name, _setting(name, "CONCURRENCY", concurrency),
+                                    _setting(name, "QUEUE", queue), shed)
+            self.rates[name] = (_setting(name, "RATE", rate), _setting(name, "BURST", burst))
+        # LRU: one bucket per (lane, agent) seen recently
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self.rate_limited = 0
+
+    def lane_for(self, method: str, path: str) -> Optional[Lane]:
+        for name, route_method, pattern in _ROUTES:
+            if method == route_method and pattern.match(path):
+                return self.lanes[name]
+        return None
+
+    def check_rate(self, lane: str, agent: str) -> float:
+        """0 if `agent` may make another `lane` request now, else seconds to wait."""
+        rate, burst = self.rates[lane]
+        if not rate:
+            return 0.0
+        key = (lane, agent.strip().lower())
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, max(burst, 1), now)
+            if len(self._buckets) > self.max_agents:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        wait = bucket.take(now)
+        if wait:
+            self.rate_limited += 1
+        return wait
+
+    def stats(self) -> dict:
+        out = {"rate_limited": self.rate_limited, "agents_tracked": len(self._buckets),
+               "db_backlog": db.backlog()}
+        for name, lane in self.lanes.items():
+            out.update({f"{name}_{k}": v for k, v in lane.stats().items()})
+        return out
+
+
+admission = AdmissionController()
+
+
+def enforce_rate(lane: str, agent: str):
+    """Raise 429 with Retry-After if `agent` is over its `lane` rate."""
+    if not ADMISSION_ENABLED:
+        return
+    wait = admission.check_rate(lane, agent)
+    if wait:
+        body, headers = _refusal("Rate limit exceeded, retry later", wait)
+        log.info("request_rate_limited", extra={"lane": lane, "email": agent, "retry_after": body["retry_after"]})
+        raise HTTPException(status_code=429, detail=body["detail"], headers=headers)
+
+
+# ------------------------------------------------------------------
+# ASGI middleware
+# ------------------------------------------------------------------
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        lane = self.controller.lane_for(scope.get("method", ""), scope["path"]) \
+            if scope["type"] == "http" else None
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = await lane.acquire(self.controller.queue_timeout)
+        if reason is not None:
+            body, headers = _refusal(f"Server busy ({reason}), retry later", ADMISSION_RETRY_AFTER)
+            log.info("request_shed", extra={"lane": lane.name, "reason": reason, "retry_after": body["retry_after"]})
+            await JSONResponse(body, status_code=503, headers=headers)(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.release()
+
+
+def install(app):
+    if ADMISSION_ENABLED:
+        app.add_middleware(AdmissionMiddleware)
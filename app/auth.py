@@ -1,38 +1,177 @@
-from app.database import db
+import asyncio
+import hashlib
+import os
+from datetime import datetime
 from typing import Optional, Tuple
 
-def validate_login(email: str, password: str) -> Optional[dict]:
-    conn = db.get_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    # Check admin (accstatus = Active)
-    cursor.execute("""
-        SELECT * FROM av_master_account 
-        WHERE email = %s AND accstatus = 'Active'
-    """, (email,))
-    admin = cursor.fetchone()
-    
-    if not admin:
-        conn.close()
-        return None
-    
-    # Check user (status = Active) - DEFAULT VALUES if NULL
-    cursor.execute("""
-        SELECT userid, email, status, 
-               COALESCE(sstime, 5) as sstime, 
-               COALESCE(inactivitythreshold, 30) as inactivitythreshold
-        FROM av_user 
-        WHERE email = %s AND status = 'Active'
-    """, (email,))
-    user = cursor.fetchone()
-    
+from app.cache import MISSING, TTLCache
+from app.database import db, hot_query
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+# Active user whose master account is also active, in one round-trip.
+# DEFAULT VALUES if NULL
+LOGIN_QUERY = hot_query("login", """
+    SELECT u.userid, u.email, u.status,
+           COALESCE(u.sstime, 5) as sstime,
+           COALESCE(u.inactivitythreshold, 30) as inactivitythreshold
+    FROM av_user u
+    WHERE u.email = %s AND u.status = 'Active'
+      AND EXISTS (
+          SELECT 1 FROM av_master_account m
+          WHERE m.email = u.email AND m.accstatus = 'Active'
+      )
+""", ("probe@example.com",))
+
+# sstime / inactivitythreshold change rarely; agents log in after every restart
+# and poll /agent/config. ConfigWatcher drops entries whose rows changed, so
+# the TTL only bounds staleness if the watcher is down
+login_cache = TTLCache(
+    maxsize=int(os.getenv("LOGIN_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("LOGIN_CACHE_TTL", "300")),
+    name="login",
+)
+
+
+# Every active account's config, to fill the cache right after startup
+WARM_LOGIN_QUERY = """
+    SELECT u.email,
+           COALESCE(u.sstime, 5) as sstime,
+           COALESCE(u.inactivitythreshold, 30) as inactivitythreshold
+    FROM av_user u
+    WHERE u.status = 'Active'
+      AND EXISTS (
+          SELECT 1 FROM av_master_account m
+          WHERE m.email = u.email AND m.accstatus = 'Active'
+      )
+    LIMIT %s
+"""
+
+CONFIG_WATCH_INTERVAL = float(os.getenv("CONFIG_WATCH_INTERVAL", "10"))
+
+# Both tables carry config_updated_at (ON UPDATE CURRENT_TIMESTAMP, migration
+# v010), so edits made by the admin panel outside this app show up here too
+CHANGED_ACCOUNTS_QUERY = hot_query("config.changed", """
+    SELECT email FROM av_user WHERE config_updated_at >= %s
+    UNION
+    SELECT email FROM av_master_account WHERE config_updated_at >= %s
+""", ("2026-01-15 00:00:00", "2026-01-15 00:00:00"))
+
+
+def _cache_key(email: str) -> str:
+    return email.strip().lower()
+
+
+def invalidate_login(email: Optional[str] = None):
+    """Drop cached login config for one email, or all of it.
+    Call whenever av_user or av_master_account rows change."""
+    if email is None:
+        login_cache.clear()
+    else:
+        login_cache.invalidate(_cache_key(email))
+
+
+async def agent_config(email: str) -> Optional[dict]:
+    """Settings for an active account, served from the cache when warm."""
+    key = _cache_key(email)
+    cached = login_cache.get(key)
+    if cached is not MISSING:
+        return dict(cached) if cached else None
+
+    user = await db.fetchone(LOGIN_QUERY, (email,))
+
     if not user:
-        conn.close()
+        # Deactivated agents keep polling; remember the miss until the row changes
+        login_cache.set(key, None)
         return None
-    
-    conn.close()
-    return {
+
+    result = _config(user)
+    login_cache.set(key, result)
+    return dict(result)
+
+
+def _config(user: dict) -> dict:
+    result = {
         "email": user["email"],
         "sstime": user["sstime"] * 60,  # Minutes → seconds
         "inactivitythreshold": user["inactivitythreshold"] * 60  # Minutes → seconds
     }
+    result["config_version"] = config_version(result)
+    return result
+
+
+def warm_login_cache() -> int:
+    """Load active accounts' config in one query (startup warm-up)."""
+    rows = db.fetchall_sync(WARM_LOGIN_QUERY, (login_cache.maxsize,))
+    for user in rows:
+        login_cache.set(_cache_key(user["email"]), _config(user))
+    return len(rows)
+
+
+def config_version(config: dict) -> str:
+    """Content hash of an agent's settings; equal on every worker."""
+    raw = f"{config['email'].lower()}|{config['sstime']}|{config['inactivitythreshold']}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+async def validate_login(email: str, password: str) -> Optional[dict]:
+    return await agent_config(email)
+
+
+class ConfigWatcher:
+    """Invalidates cached agent config for accounts changed in the database,
+    checking every `interval` seconds with one indexed query."""
+
+    def __init__(self, interval: float = CONFIG_WATCH_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self._since: Optional[datetime] = None
+        self.runs = 0
+        self.invalidated = 0
+        self.failures = 0
+
+    def poll_sync(self) -> int:
+        # The database clock, so the watermark never skips a change
+        now = db.fetchone_sync("SELECT NOW() AS now")["now"]
+        if self._since is None:  # first pass: the cache starts out empty
+            self._since = now
+            return 0
+        rows = db.fetchall_sync(CHANGED_ACCOUNTS_QUERY, (self._since, self._since))
+        for row in rows:
+            invalidate_login(row["email"])
+        self._since = now
+        if rows:
+            log.info("agent_config_invalidated", extra={"accounts": len(rows)})
+        return len(rows)
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.invalidated += await db.run(self.poll_sync)
+                self.runs += 1
+            except Exception:
+                self.failures += 1
+                log.warning("config_watch_failed", exc_info=True)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "invalidated": self.invalidated, "failures": self.failures}
+
+
+config_watcher = ConfigWatcher()
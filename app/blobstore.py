@@ -0,0 +1,130 @@
+import hashlib
+import io
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import BinaryIO, NamedTuple, Optional
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobInfo(NamedTuple):
+    key: str
+    size: int
+    content_type: str
+
+
+def sniff_content_type(head: bytes) -> str:
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+class BlobStore(ABC):
+    """Content-addressed blob storage: the key is the SHA-256 of the bytes,
+    so storing the same content twice keeps a single copy."""
+
+    @abstractmethod
+    def put_fileobj(self, fileobj: BinaryIO, chunk_size: int = CHUNK_SIZE) -> BlobInfo:
+        ...
+
+    @abstractmethod
+    def put_bytes(self, data: bytes) -> BlobInfo:
+        ...
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        ...
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        ...
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Filesystem path of the blob when the backend has one, else None."""
+        return None
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs live under <root>/<k[:2]>/<k[2:4]>/<k>."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key: str) -> str:
+        if len(key) != 64 or not all(c in "0123456789abcdef" for c in key):
+            raise ValueError(f"invalid blob key: {key!r}")
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def put_fileobj(self, fileobj: BinaryIO, chunk_size: int = CHUNK_SIZE) -> BlobInfo:
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        head = b""
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = fileobj.read(chunk_size)
+                    if not chunk:
+                        break
+                    if len(head) < 16:
+                        head += chunk[:16]
+                    digest.update(chunk)
+                    size += len(chunk)
+                    out.write(chunk)
+            key = digest.hexdigest()
+            final = self._path(key)
+            if os.path.exists(final):
+                os.unlink(tmp_path)  # identical content already stored
+            else:
+                os.makedirs(os.path.dirname(final), exist_ok=True)
+                os.replace(tmp_path, final)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return BlobInfo(key, size, sniff_content_type(head))
+
+    def put_bytes(self, data: bytes) -> BlobInfo:
+        return self.put_fileobj(io.BytesIO(data))
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._path(key), "rb")
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.unlink(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
+
+
+BACKENDS = {
+    "local": lambda: LocalBlobStore(os.getenv("BLOB_STORE_PATH", "./data/blobs")),
+}
+
+
+def create_blob_store(backend: Optional[str] = None) -> BlobStore:
+    backend = backend or os.getenv("BLOB_STORE", "local")
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown blob store backend: {backend}")
+    return BACKENDS[backend]()
+
+
+blob_store = create_blob_store()
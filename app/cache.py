@@ -0,0 +1,170 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, name: str = "cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        with self._lock:
+            removed = self._data.pop(key, None) is not None
+            self.invalidations += removed
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class ResultCache:
+    """Read-through cache for query results with single-flight loading.
+
+    Entries are keyed by (scope, key); a scope is typically a user. While a
+    key is being loaded, other callers for the same key await that load
+    instead of running their own. The load runs as its own task, so the
+    caller that started it going away does not cancel it for the others.
+    `invalidate(scope)` gives the scope a new generation: existing entries
+    stop matching, and a load already in flight still answers its waiters
+    but is not stored. A generation is forgotten `ttl` seconds after it was
+    set, when every entry stored under an older one has expired.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, name: str = "results"):
+        self.ttl = ttl
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, name=name)
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        # scope -> (generation, forget after); oldest first. Generations are
+        # never reused, so an entry orphaned by an invalidation can't match again.
+        self._generations: "OrderedDict[Hashable, Tuple[int, float]]" = OrderedDict()
+        self._next_generation = itertools.count(1)
+        self.coalesced = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.invalidations = 0
+
+    def _generation(self, scope: Hashable) -> int:
+        now = time.monotonic()
+        while self._generations:
+            oldest = next(iter(self._generations.values()))
+            if oldest[1] > now:
+                break
+            self._generations.popitem(last=False)
+        entry = self._generations.get(scope)
+        return entry[0] if entry else 0
+
+    async def get_or_load(self, scope: Hashable, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        full_key = (scope, self._generation(scope), key)
+        value = self._cache.get(full_key)
+        if value is not MISSING:
+            return value
+
+        pending = self._inflight.get(full_key)
+        if pending is not None:
+            self.coalesced += 1
+        else:
+            self.loads += 1
+            pending = self._inflight[full_key] = asyncio.ensure_future(self._load(full_key, loader))
+            pending.add_done_callback(_retrieve)
+        # shield: no caller disconnecting, the first one included, cancels everyone's load
+        return await asyncio.shield(pending)
+
+    async def _load(self, full_key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+        except Exception:
+            self.load_errors += 1
+            raise
+        finally:
+            # Still ours unless the scope was invalidated while loading
+            current = self._inflight.get(full_key) is asyncio.current_task()
+            if current:
+                del self._inflight[full_key]
+        if current:
+            self._cache.set(full_key, value)
+        return value
+
+    def invalidate(self, scope: Hashable):
+        # Old entries can no longer be looked up and age out of the LRU
+        self._generations.pop(scope, None)
+        self._generations[scope] = (next(self._next_generation), time.monotonic() + self.ttl)
+        # Loads in flight answer their waiters but are not stored
+        for full_key in [k for k in self._inflight if k[0] == scope]:
+            del self._inflight[full_key]
+        self.invalidations += 1
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            # Coalesced callers missed the cache but still ran no query
+            "served_without_query": round((lookups - self.loads) / lookups, 4) if lookups else 0.0,
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "load_errors": self.load_errors,
+            "invalidations": self.invalidations,
+            "generations": len(self._generations),
+        }
+
+
+def _retrieve(task: asyncio.Task):
+    # Every waiter may have gone away; they re-raise the error, asyncio needn't log it too
+    if not task.cancelled():
+        task.exception()
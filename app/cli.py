@@ -0,0 +1,181 @@
+"""Operational commands.
+
+    python -m app.cli migrate [--status | --to VERSION]
+    python -m app.cli check-queries
+    python -m app.cli migrate-blobs --batch-size 200
+    python -m app.cli rebuild-rollup [--email someone@example.com]
+    python -m app.cli recompress --batch-size 100
+    python -m app.cli close-stale-sessions
+    python -m app.cli retention [--dry-run] [--email someone@example.com]
+    python -m app.cli partitions [--status]
+    python -m app.cli export sessions --start 2026-01-01 --end 2026-01-31 --gzip -o jan.csv.gz
+"""
+import argparse
+import sys
+
+
+def cmd_migrate(args):
+    from app.migrations import migrate, status
+    if args.status:
+        for m in status():
+            mark = "✅" if m["applied"] else "⏳"
+            print(f"{mark} {m['version']:03d} {m['name']}: {m['description']}")
+        return
+    applied = migrate(args.to)
+    print(f"✅ Applied {len(applied)} migrations")
+
+
+def cmd_check_queries(args):
+    from app.migrations.explain import check_hot_queries
+    failures = check_hot_queries()
+    for f in failures:
+        print(f"❌ {f['query']}: {f['type']} scan on {f['table']} "
+              f"(~{f['rows']} rows, possible keys: {f['possible_keys']})")
+    if failures:
+        return 1
+    print("✅ No full scans in registered hot queries")
+
+
+def cmd_migrate_blobs(args):
+    from app.screenshots import migrate_blobs
+    moved = migrate_blobs(batch_size=args.batch_size, keep_data=args.keep_data, limit=args.limit)
+    print(f"✅ Done, {moved} screenshots moved to the blob store")
+
+
+def cmd_rebuild_rollup(args):
+    from app.rollup import rebuild
+    count = rebuild(args.email)
+    print(f"✅ Rollup rebuilt for {count} users")
+
+
+def cmd_recompress(args):
+    from app.recompress import backfill, recompressor
+    done = backfill(batch_size=args.batch_size, limit=args.limit)
+    saved = recompressor.stats()["bytes_saved"]
+    print(f"✅ Done, {done} screenshots checked, {saved / 1e6:.1f} MB saved")
+
+
+def cmd_close_stale_sessions(args):
+    import asyncio
+    from app.timeline import close_stale_sessions
+    closed = asyncio.run(close_stale_sessions())
+    print(f"✅ Closed {closed} stale sessions")
+
+
+def cmd_retention(args):
+    from app.recompress import recompressor
+    from app.retention import run
+    report = run(dry_run=args.dry_run, email=args.email)
+    if report is None:
+        print("⏳ Another retention run holds the lock")
+        return 1
+    verb = "Would" if args.dry_run else "Did"
+    print(f"{verb} archive {report['screenshots_archived']} screenshots "
+          f"({report['bytes_archived'] / 1e6:.1f} MB)")
+    print(f"{verb} delete {report['screenshots_deleted']} screenshot rows, "
+          f"{report['sessions_deleted']} sessions, {report['activity_deleted']} activity samples")
+    if not args.dry_run:
+        deleted = recompressor.drain()
+        print(f"✅ {len(report['bundles'])} bundles written, {deleted} of {report['blobs_retired']} "
+              f"released blobs deleted")
+
+
+def cmd_partitions(args):
+    from app import partitions
+    from app.recompress import recompressor
+    if args.status:
+        for table, parts in partitions.status().items():
+            if not parts:
+                print(f"⏳ {table}: not partitioned (run migrate)")
+                continue
+            print(f"{table}: {len(parts)} partitions")
+            for p in parts:
+                print(f"   {p['name']:<8} {p['rows'] or 0:>10} rows")
+        return
+    result = partitions.maintain()
+    if result is None:
+        print("⏳ Another worker is maintaining partitions")
+        return 1
+    for table, changes in result.items():
+        print(f"✅ {table}: added {changes['added'] or 'none'}, dropped {changes['dropped'] or 'none'}")
+    recompressor.drain()
+
+
+def cmd_export(args):
+    from datetime import date
+    from app.export import export_stream
+    chunks = export_stream(
+        args.dataset, args.format, args.email or [],
+        date.fromisoformat(args.start), date.fromisoformat(args.end), gzip=args.gzip,
+    )
+    out = open(args.output, "wb") if args.output != "-" else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("migrate", help="apply pending schema migrations")
+    p.add_argument("--status", action="store_true", help="list migrations instead of applying")
+    p.add_argument("--to", type=int, default=None, help="stop at this version")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("check-queries", help="EXPLAIN hot queries; exit 1 on full scans")
+    p.set_defaults(func=cmd_check_queries)
+
+    p = sub.add_parser("migrate-blobs", help="move screenshot BLOBs into the blob store")
+    p.add_argument("--batch-size", type=int, default=100)
+    p.add_argument("--limit", type=int, default=None, help="stop after this many rows")
+    p.add_argument("--keep-data", action="store_true", help="leave screenshot_data in place")
+    p.set_defaults(func=cmd_migrate_blobs)
+
+    p = sub.add_parser("rebuild-rollup", help="backfill or rebuild the daily activity rollup")
+    p.add_argument("--email", default=None, help="only this user (default: everyone)")
+    p.set_defaults(func=cmd_rebuild_rollup)
+
+    p = sub.add_parser("recompress", help="re-encode stored PNG screenshots (WebP/AVIF/JPEG)")
+    p.add_argument("--batch-size", type=int, default=100)
+    p.add_argument("--limit", type=int, default=None, help="stop after this many rows")
+    p.set_defaults(func=cmd_recompress)
+
+    p = sub.add_parser("close-stale-sessions", help="end sessions whose agent stopped reporting")
+    p.set_defaults(func=cmd_close_stale_sessions)
+
+    p = sub.add_parser("retention", help="archive and delete data past its retention policy")
+    p.add_argument("--dry-run", action="store_true", help="only report what would be reclaimed")
+    p.add_argument("--email", default=None, help="only this account")
+    p.set_defaults(func=cmd_retention)
+
+    p = sub.add_parser("partitions", help="add upcoming monthly partitions, drop expired ones")
+    p.add_argument("--status", action="store_true", help="list partitions and row estimates")
+    p.set_defaults(func=cmd_partitions)
+
+    p = sub.add_parser("export", help="stream sessions, manual logs or activity to CSV/NDJSON")
+    p.add_argument("dataset", choices=["sessions", "manual_logs", "activity"])
+    p.add_argument("--start", required=True, help="first day, YYYY-MM-DD")
+    p.add_argument("--end", required=True, help="last day (inclusive), YYYY-MM-DD")
+    p.add_argument("--email", action="append", help="limit to this user; repeatable")
+    p.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    p.add_argument("--gzip", action="store_true")
+    p.add_argument("-o", "--output", default="-", help="file to write (default: stdout)")
+    p.set_defaults(func=cmd_export)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # Progress of long jobs arrives as log lines; stdout may be carrying an export
+    from app.logs import configure_logging
+    configure_logging(stream=sys.stderr)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
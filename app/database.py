@@ -1,20 +1,56 @@
+import asyncio
+import contextvars
 import mysql.connector
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from typing import Optional
+from typing import Any, Callable, NamedTuple, Optional, Sequence
+
+from app.metrics import record_db_query
+from app.pool import ConnectionPool
 
 TABLE_PREFIX = "u968537179_"
 
 load_dotenv()
 
+# name -> (sql, sample params). Queries the API runs on every request are
+# registered here so `python -m app.cli check-queries` can EXPLAIN them.
+HOT_QUERIES = {}
+
+
+def hot_query(name: str, sql: str, sample_params: Sequence = ()) -> str:
+    HOT_QUERIES[name] = (sql, tuple(sample_params))
+    return sql
+
+
+class ExecResult(NamedTuple):
+    lastrowid: Optional[int]
+    rowcount: int
+
+
+def _mysql_reset(conn):
+    # Drain anything a handler left unread so the next borrower starts clean
+    conn.consume_results()
+
+
+def _mysql_check(conn):
+    conn.ping(reconnect=False)
+
+
 class Database:
     def __init__(self):
         self.host = os.getenv("DB_HOST", "mysql.hostinger.com")
         self.user = os.getenv("DB_USER", "u968537179_monitor_user")
         self.password = os.getenv("Alticor@123", "")
         self.database = os.getenv("DB_NAME", "u968537179_empmonitor")
-    
-    def get_connection(self):
+        self._pool: Optional[ConnectionPool] = None
+        self._pool_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+
+    def _connect(self):
         return mysql.connector.connect(
             host=self.host,
             user=self.user,
@@ -22,15 +58,153 @@ class Database:
             database=self.database,
             autocommit=True
         )
-    
-    def test_connection(self):
+
+    @property
+    def pool(self) -> ConnectionPool:
+        # Built lazily so importing the app never touches the network
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ConnectionPool(
+                        self._connect,
+                        min_size=int(os.getenv("DB_POOL_MIN", "1")),
+                        max_size=int(os.getenv("DB_POOL_MAX", "10")),
+                        idle_timeout=float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300")),
+                        acquire_timeout=float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "30")),
+                        check=_mysql_check,
+                        reset=_mysql_reset,
+                        on_query=record_db_query,
+                        name="mysql",
+                    )
+        return self._pool
+
+    def get_connection(self):
+        """Borrow a pooled connection; conn.close() hands it back."""
+        return self.pool.acquire()
+
+    def connect_direct(self):
+        """Open a connection outside the pool, for long-running jobs that
+        should not hold a request slot. The caller must close it."""
+        return self._connect()
+
+    def _after_fork(self):
+        # The pool resets itself (app.pool); threads don't survive a fork
+        self._pool_lock = threading.Lock()
+        self._executor = None
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+
+    def pool_stats(self) -> dict:
+        return self.pool.stats()
+
+    # ------------------------------------------------------------------
+    # Async access
+    #
+    # mysql.connector only speaks blocking sockets, so the async API runs
+    # each unit of work on a dedicated thread pool sized to the connection
+    # pool: the event loop never blocks and threads never queue for a
+    # connection they cannot get.
+    # ------------------------------------------------------------------
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            max_workers = self.pool.max_size  # resolve before taking the lock
+            with self._pool_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=max_workers,
+                        thread_name_prefix="db",
+                    )
+        return self._executor
+
+    def backlog(self) -> int:
+        """Units of work submitted through `run` that no DB thread has started yet."""
+        return self._waiting
+
+    def _claim(self, pending: list):
+        # Whichever comes first, a thread starting the work or the caller
+        # giving up on it, takes it off the backlog; the other does nothing
+        with self._waiting_lock:
+            if pending:
+                pending.clear()
+                self._waiting -= 1
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking callable on the DB executor and await its result."""
+        loop = asyncio.get_running_loop()
+        # Carry the request context over so per-request DB timing sees the work
+        ctx = contextvars.copy_context()
+        pending = [True]
+
+        def start():
+            self._claim(pending)
+            return ctx.run(fn, *args, **kwargs)
+
+        with self._waiting_lock:
+            self._waiting += 1
+        try:
+            return await loop.run_in_executor(self.executor, start)
+        finally:
+            self._claim(pending)
+
+    def fetchone_sync(self, query: str, params: Sequence = (), dictionary: bool = True):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor(dictionary=dictionary)
+            cursor.execute(query, params)
+            row = cursor.fetchone()
+            cursor.fetchall()  # drain so the connection goes back clean
+            cursor.close()
+            return row
+        finally:
+            conn.close()
+
+    def fetchall_sync(self, query: str, params: Sequence = (), dictionary: bool = True) -> list:
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor(dictionary=dictionary)
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            cursor.close()
+            return rows
+        finally:
+            conn.close()
+
+    def execute_sync(self, query: str, params: Sequence = ()) -> ExecResult:
+        conn = self.get_connection()
         try:
-            conn = self.get_connection()
             cursor = conn.cursor()
-            cursor.execute("SELECT 1")
+            cursor.execute(query, params)
+            result = ExecResult(cursor.lastrowid, cursor.rowcount)
+            cursor.close()
+            return result
+        finally:
             conn.close()
+
+    async def fetchone(self, query: str, params: Sequence = (), dictionary: bool = True):
+        return await self.run(self.fetchone_sync, query, params, dictionary)
+
+    async def fetchall(self, query: str, params: Sequence = (), dictionary: bool = True) -> list:
+        return await self.run(self.fetchall_sync, query, params, dictionary)
+
+    async def execute(self, query: str, params: Sequence = ()) -> ExecResult:
+        return await self.run(self.execute_sync, query, params)
+
+    def test_connection(self):
+        try:
+            conn = self.get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            finally:
+                conn.close()
             return True
         except:
             return False
 
 db = Database()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=db._after_fork)
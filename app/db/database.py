@@ -1,11 +1,14 @@
+import os
+
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 DATABASE_URL = "sqlite+aiosqlite:///./temp.db"
 
+# Creating the engine opens nothing; SQL_ECHO=1 logs every statement
 engine = create_async_engine(
     DATABASE_URL,
-    echo=True
+    echo=os.getenv("SQL_ECHO", "0") == "1"
 )
 
 AsyncSessionLocal = sessionmaker(
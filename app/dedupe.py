@@ -0,0 +1,156 @@
+"""Near-duplicate screenshot detection.
+
+An idle desktop produces the same frame at every capture interval. Each
+upload gets a 64-bit difference hash (dHash); if it is within
+DEDUPE_MAX_DISTANCE bits of one of the user's last DEDUPE_RECENT frames,
+the new row points at that frame's blob and thumbnail (`ref_id`) instead
+of storing the image again.
+
+Hashing decodes the image, so it runs on a small dedicated thread pool
+rather than the event loop. The per-user index of recent hashes lives in
+memory and is reloaded from av_tblsnap.phash after a restart.
+"""
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, NamedTuple, Optional
+
+from PIL import Image
+
+from app.blobstore import blob_store
+from app.cache import MISSING, TTLCache
+from app.database import db, TABLE_PREFIX
+
+SNAP_TABLE = f"{TABLE_PREFIX}av_tblsnap"
+
+DEDUPE_ENABLED = os.getenv("DEDUPE_ENABLED", "1") == "1"
+DEDUPE_MAX_DISTANCE = int(os.getenv("DEDUPE_MAX_DISTANCE", "4"))  # of 64 bits
+DEDUPE_RECENT = int(os.getenv("DEDUPE_RECENT", "4"))
+DEDUPE_WORKERS = int(os.getenv("DEDUPE_WORKERS", "2"))
+
+HASH_SIZE = 8
+
+
+class Frame(NamedTuple):
+    screenshot_id: int
+    phash: int
+    blob_key: str
+    content_type: Optional[str]
+    size_bytes: Optional[int]
+    thumb_key: Optional[str]
+
+
+def dhash(fileobj: BinaryIO) -> Optional[int]:
+    """64-bit difference hash of an image, or None if it cannot be decoded."""
+    try:
+        with Image.open(fileobj) as img:
+            img.draft("L", (HASH_SIZE * 4, HASH_SIZE * 4))
+            small = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX)
+            pixels = list(small.getdata())
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class DedupeIndex:
+    def __init__(self, recent: int = 4, max_distance: int = 4, workers: int = 2):
+        self.recent = recent
+        self.max_distance = max_distance
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dhash")
+        # email -> deque of Frames, newest first; idle users age out
+        self._frames = TTLCache(maxsize=10_000, ttl=3600, name="dedupe")
+
+        self.uploads = 0
+        self.duplicates = 0
+        self.bytes_uploaded = 0
+        self.bytes_saved = 0
+
+    async def hash(self, fileobj: BinaryIO) -> Optional[int]:
+        """dHash `fileobj` on the hashing pool, leaving it rewound."""
+        def work():
+            try:
+                return dhash(fileobj)
+            finally:
+                fileobj.seek(0)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, work)
+
+    async def _recent(self, email: str) -> deque:
+        frames = self._frames.get(email)
+        if frames is MISSING:
+            rows = await db.fetchall(f"""
+                SELECT id, phash, blob_key, content_type, size_bytes, thumb_key
+                FROM {SNAP_TABLE}
+                WHERE user_id = %s AND phash IS NOT NULL AND ref_id IS NULL
+                ORDER BY capture_time DESC
+                LIMIT %s
+            """, (email, self.recent))
+            frames = deque((Frame(r["id"], r["phash"], r["blob_key"], r["content_type"],
+                                  r["size_bytes"], r["thumb_key"]) for r in rows),
+                           maxlen=self.recent)
+            self._frames.set(email, frames)
+        return frames
+
+    async def match(self, email: str, phash: Optional[int], upload_size: int) -> Optional[Frame]:
+        """The recent frame `phash` duplicates, if any. Counts the upload either way."""
+        self.uploads += 1
+        self.bytes_uploaded += upload_size
+        if phash is None:
+            return None
+        for frame in await self._recent(email):
+            # The frame's blob may have been swapped by recompression since
+            if hamming(frame.phash, phash) <= self.max_distance and blob_store.exists(frame.blob_key):
+                self.duplicates += 1
+                self.bytes_saved += upload_size
+                return frame
+        return None
+
+    async def remember(self, email: str, frame: Frame):
+        frames = await self._recent(email)
+        if not any(f.screenshot_id == frame.screenshot_id for f in frames):  # fresh load may have it
+            frames.appendleft(frame)
+
+    def forget(self, email: str):
+        self._frames.invalidate(email)
+
+    def stats(self) -> dict:
+        return {
+            "uploads": self.uploads,
+            "duplicates": self.duplicates,
+            "dedupe_ratio": self.duplicates / self.uploads if self.uploads else 0.0,
+            "bytes_uploaded": self.bytes_uploaded,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+dedupe_index = DedupeIndex(DEDUPE_RECENT, DEDUPE_MAX_DISTANCE, DEDUPE_WORKERS)
+
+
+async def dedupe_report(start_date, end_date, email: Optional[str] = None) -> list:
+    """Per-user screenshot counts, duplicates and dedupe ratio over a date range."""
+    user_filter = "AND user_id = %s" if email else ""
+    rows = await db.fetchall(f"""
+        SELECT user_id AS user_email,
+               COUNT(*) AS screenshots,
+               SUM(ref_id IS NOT NULL) AS duplicates,
+               COALESCE(SUM(CASE WHEN ref_id IS NULL THEN size_bytes END), 0) AS stored_bytes
+        FROM {SNAP_TABLE}
+        WHERE capture_time >= %s AND capture_time < %s + INTERVAL 1 DAY {user_filter}
+        GROUP BY user_id
+        ORDER BY screenshots DESC
+    """, (start_date, end_date, *([email] if email else [])))
+    for row in rows:
+        row["screenshots"] = int(row["screenshots"])
+        row["duplicates"] = int(row["duplicates"] or 0)
+        row["stored_bytes"] = int(row["stored_bytes"])
+        row["dedupe_ratio"] = row["duplicates"] / row["screenshots"] if row["screenshots"] else 0.0
+    return rows
@@ -0,0 +1,188 @@
+"""Streaming CSV / NDJSON export for payroll runs.
+
+Rows are read through an unbuffered (server-side) cursor on a dedicated
+connection, `chunk_size` rows at a time, and encoded as they arrive, so
+memory stays flat however large the date range is. Output can be gzipped
+on the fly.
+
+Each export holds its own MySQL connection for as long as it streams, so
+at most EXPORT_CONCURRENCY run at once per process; `export_stream` raises
+ExportBusy beyond that.
+"""
+import contextlib
+import csv
+import io
+import json
+import os
+import threading
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence
+
+import mysql.connector
+
+from app.database import db, TABLE_PREFIX
+
+EXPORT_CONCURRENCY = int(os.getenv("EXPORT_CONCURRENCY", "2"))
+
+_export_slots = threading.BoundedSemaphore(EXPORT_CONCURRENCY)
+
+
+class ExportBusy(Exception):
+    """EXPORT_CONCURRENCY exports are already streaming."""
+
+# dataset -> (table, time column, exported columns)
+DATASETS = {
+    "sessions": (
+        f"{TABLE_PREFIX}tblsession", "start_time",
+        ["id", "user_email", "start_time", "end_time", "status"],
+    ),
+    "manual_logs": (
+        f"{TABLE_PREFIX}av_manual_logs", "start_time",
+        ["id", "user_email", "start_time", "end_time", "notes", "created_at"],
+    ),
+    "activity": (
+        f"{TABLE_PREFIX}av_activity", "sample_time",
+        ["id", "user_email", "sample_time", "state", "app_name", "window_title"],
+    ),
+}
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+
+def _build_query(dataset: str, emails: Sequence[str], start_date: date, end_date: date):
+    table, time_col, columns = DATASETS[dataset]
+    # Half-open range on the raw column keeps the (user_email, time) index usable
+    where = [f"{time_col} >= %s", f"{time_col} < %s"]
+    params: List = [start_date, end_date + timedelta(days=1)]
+    if emails:
+        where.append(f"user_email IN ({', '.join(['%s'] * len(emails))})")
+        params.extend(emails)
+    sql = f"""
+        SELECT {', '.join(columns)} FROM {table}
+        WHERE {' AND '.join(where)}
+        ORDER BY user_email, {time_col}, id
+    """
+    return sql, params, columns
+
+
+def iter_rows(dataset: str, emails: Sequence[str], start_date: date, end_date: date,
+              chunk_size: int = 1000) -> Iterator[tuple]:
+    sql, params, _ = _build_query(dataset, emails, start_date, end_date)
+    # Not from the pool: an export can stream for minutes
+    conn = db.connect_direct()
+    cursor = None
+    try:
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        if cursor is not None:
+            # An abandoned stream leaves unread rows; they go with the connection
+            with contextlib.suppress(mysql.connector.Error):
+                cursor.close()
+        conn.close()
+
+
+class _Slotted:
+    """Iterator holding an export slot until it is exhausted, closed or dropped.
+    A plain generator would leak the slot if the response never started it."""
+
+    def __init__(self, chunks: Iterator[bytes], release: Callable[[], None]):
+        self._chunks = chunks
+        self._release: Optional[Callable[[], None]] = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        try:
+            return next(self._chunks)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        release, self._release = self._release, None
+        if release is not None:
+            try:
+                getattr(self._chunks, "close", lambda: None)()
+            finally:
+                release()
+
+    __del__ = close
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", "replace")
+    return value
+
+
+def encode_csv(rows: Iterable[tuple], columns: Sequence[str], rows_per_chunk: int = 500) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        writer.writerow([_plain(v) for v in row])
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+def encode_ndjson(rows: Iterable[tuple], columns: Sequence[str], rows_per_chunk: int = 500) -> Iterator[bytes]:
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({c: _plain(v) for c, v in zip(columns, row)}))
+        if len(lines) >= rows_per_chunk:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def export_stream(dataset: str, fmt: str, emails: Sequence[str], start_date: date, end_date: date,
+                  gzip: bool = False) -> Iterator[bytes]:
+    if dataset not in DATASETS:
+        raise ValueError(f"unknown dataset: {dataset}")
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format: {fmt}")
+    if not _export_slots.acquire(blocking=False):
+        raise ExportBusy()
+    columns = DATASETS[dataset][2]
+    rows = iter_rows(dataset, emails, start_date, end_date)
+    encoder = encode_csv if fmt == "csv" else encode_ndjson
+    chunks = encoder(rows, columns)
+    return _Slotted(gzip_chunks(chunks) if gzip else chunks, _export_slots.release)
+
+
+def export_filename(dataset: str, fmt: str, start_date: date, end_date: date, gzip: bool) -> str:
+    name = f"{dataset}_{start_date.isoformat()}_{end_date.isoformat()}.{FORMATS[fmt][1]}"
+    return name + ".gz" if gzip else name
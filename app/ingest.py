@@ -0,0 +1,163 @@
+"""Server-side write coalescing for agent activity samples.
+
+Requests append rows to an in-memory buffer and return as soon as the rows
+are accepted. A background task writes the buffer out as multi-row INSERTs
+whenever `max_batch` rows are waiting or `flush_interval` seconds have
+passed. Rows leave the buffer only after their INSERT succeeded, so a
+failed flush is retried on the next tick and `stop()` drains whatever was
+acknowledged before shutdown.
+
+When `max_pending` rows are already waiting, `submit` blocks for up to
+`submit_timeout` seconds for a flush to make room, then raises BufferFull
+so the endpoint can tell the agent to back off.
+"""
+import asyncio
+import os
+from typing import List, Optional, Sequence
+
+from app.database import db, TABLE_PREFIX
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+ACTIVITY_TABLE = f"{TABLE_PREFIX}av_activity"
+
+INSERT_SQL = f"""
+    INSERT INTO {ACTIVITY_TABLE} (user_email, sample_time, state, app_name, window_title, received_at)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+
+class BufferFull(Exception):
+    pass
+
+
+class ActivityBuffer:
+    def __init__(
+        self,
+        max_batch: int = 500,
+        flush_interval: float = 1.0,
+        max_pending: int = 50_000,
+        submit_timeout: float = 2.0,
+    ):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.submit_timeout = submit_timeout
+
+        self._rows: List[tuple] = []
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._room = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+
+        self.accepted = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.rejected = 0
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    async def submit(self, rows: Sequence[tuple]):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.submit_timeout
+        while len(self._rows) + len(rows) > self.max_pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self.rejected += len(rows)
+                raise BufferFull(f"{len(self._rows)} activity rows waiting to be written")
+            self._wakeup.set()
+            async with self._room:
+                try:
+                    await asyncio.wait_for(self._room.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+        self._rows.extend(rows)
+        self.accepted += len(rows)
+        if len(self._rows) >= self.max_batch:
+            self._wakeup.set()
+
+    # ------------------------------------------------------------------
+    # Flushing
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _write(batch: List[tuple]):
+        conn = db.get_connection()
+        try:
+            cursor = conn.cursor()
+            # mysql.connector turns this into a single multi-row INSERT
+            cursor.executemany(INSERT_SQL, batch)
+            cursor.close()
+        finally:
+            conn.close()
+
+    async def flush(self) -> bool:
+        """Write out everything buffered. Returns False if a write failed."""
+        async with self._flush_lock:
+            while self._rows:
+                batch = self._rows[:self.max_batch]
+                try:
+                    await db.run(self._write, batch)
+                except Exception:
+                    self.failed_flushes += 1
+                    log.warning("activity_flush_failed", exc_info=True, extra={"rows": len(batch)})
+                    return False
+                # Only appends happen concurrently, so the written prefix is still in front
+                del self._rows[:len(batch)]
+                self.flushed += len(batch)
+                self.flushes += 1
+                async with self._room:
+                    self._room.notify_all()
+        return True
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, attempts: int = 3):
+        """Stop the background task and drain the buffer."""
+        if self._task is not None:
+            # Let an in-flight write finish rather than cancelling it, or its
+            # rows would be written again by the drain below
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        for attempt in range(attempts):
+            if await self.flush():
+                return
+            await asyncio.sleep(0.5 * (attempt + 1))
+        log.error("activity_rows_lost_on_shutdown", extra={"rows": len(self._rows)})
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._rows),
+            "accepted": self.accepted,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "rejected": self.rejected,
+        }
+
+
+activity_buffer = ActivityBuffer(
+    max_batch=int(os.getenv("ACTIVITY_FLUSH_BATCH", "500")),
+    flush_interval=float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "1.0")),
+    max_pending=int(os.getenv("ACTIVITY_MAX_PENDING", "50000")),
+)
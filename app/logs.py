@@ -0,0 +1,111 @@
+"""Structured, non-blocking logging.
+
+Records are formatted as one JSON object per line and handed to a
+QueueHandler, so request handlers never wait on stdout; a QueueListener
+thread does the actual writes. Hot-path events pass `extra={"sample": rate}`
+and are kept with that probability; warnings and errors are never sampled.
+The listener thread does not survive a fork (gunicorn's preload_app), so
+each child starts its own.
+
+    log = get_logger(__name__)
+    log.info("session_started", extra={"session_id": 12, "sample": HOT_SAMPLE_RATE})
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+HOT_SAMPLE_RATE = float(os.getenv("LOG_HOT_SAMPLE_RATE", "0.1"))
+
+_STANDARD_ATTRS = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "sample"}
+
+_listener = None
+_queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Stock prepare() folds the traceback into the message; keep it
+        # separate so it lands in its own JSON field.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample", None)
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < rate
+
+
+def configure_logging(level: str = None, stream=None):
+    """Route the `app` logger tree through a background queue to `stream`
+    (default stdout). Idempotent."""
+    global _queue_handler
+    if _listener is not None:
+        return
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter())
+
+    _queue_handler = _QueueHandler(queue.SimpleQueue())
+    _queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger("app")
+    root.setLevel(level or os.getenv("LOG_LEVEL", "INFO"))
+    root.addHandler(_queue_handler)
+    root.propagate = False
+
+    _start_listener(handler)
+
+
+def _start_listener(*handlers):
+    global _listener
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # flush what is queued on exit
+
+
+def _after_fork():
+    # The parent's listener thread is not in the child: records would pile
+    # up in the queue unwritten. Give the child a fresh queue and listener.
+    if _listener is None:
+        return
+    atexit.unregister(_listener.stop)
+    _queue_handler.queue = queue.SimpleQueue()
+    _start_listener(*_listener.handlers)
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
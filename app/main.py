@@ -1,10 +1,31 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 import os
 import psycopg
-from contextlib import contextmanager
+from psycopg import pq
+from contextlib import asynccontextmanager, contextmanager
 
-app = FastAPI()
+from app import metrics
+from app.logs import configure_logging, get_logger
+from app.pool import ConnectionPool
+from app.readiness import Readiness
+
+readiness = Readiness()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # DDL and the first TLS handshake run after the port is bound, not at import
+    readiness.start(required={"postgres": lambda: run_in_threadpool(create_tables)})
+    yield
+    await readiness.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+
+configure_logging()
+log = get_logger(__name__)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,19 +35,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+metrics.install(app)
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+def _pg_connect():
+    return psycopg.connect(DATABASE_URL, sslmode="require")
+
+def _pg_check(conn):
+    conn.execute("SELECT 1")
+    conn.rollback()
+
+def _pg_reset(conn):
+    if conn.closed or conn.broken:
+        raise psycopg.InterfaceError("connection is gone")
+    if conn.info.transaction_status != pq.TransactionStatus.IDLE:
+        conn.rollback()
+
+pg_pool = ConnectionPool(
+    _pg_connect,
+    min_size=int(os.getenv("DB_POOL_MIN", "1")),
+    max_size=int(os.getenv("DB_POOL_MAX", "10")),
+    idle_timeout=float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300")),
+    acquire_timeout=float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "30")),
+    check=_pg_check,
+    reset=_pg_reset,
+    on_query=metrics.record_db_query,
+    name="postgres",
+)
+metrics.register_stats("db_pool", pg_pool.stats)
+
 @contextmanager
 def get_db():
     if not DATABASE_URL:
         raise Exception("DATABASE_URL missing!")
-    conn = None
+    conn = pg_pool.acquire()
     try:
-        conn = psycopg.connect(DATABASE_URL, sslmode="require")
         yield conn
     finally:
-        if conn:
-            conn.close()
+        conn.close()
 
 def create_tables():
     with get_db() as conn:
@@ -41,23 +88,26 @@ def create_tables():
                 )
             """)
             conn.commit()
-            print("✅ Tables created!")
+            log.info("tables_created")
 
-create_tables()
 
 @app.get("/")
 def root():
     return {"message": "🚀 Employee Monitor API LIVE"}
 
+@app.get("/ready")
+async def ready():
+    return readiness.response()
+
 @app.get("/health")
 def health():
     try:
         with get_db() as conn:
             with conn.cursor() as cur:
                 cur.execute("SELECT 1")
-        return {"status": "OK", "database": "✅ PostgreSQL CONNECTED!"}
+        return {"status": "OK", "database": "✅ PostgreSQL CONNECTED!", "pool": pg_pool.stats()}
     except Exception as e:
-        return {"status": "Server OK", "database": f"❌ Error: {str(e)}"}
+        return {"status": "Server OK", "database": f"❌ Error: {str(e)}", "pool": pg_pool.stats()}
 
 # 🔥 ONE LOGIN ENDPOINT - KILLS ALL OTHERS
 @app.post("/login")
@@ -67,7 +117,8 @@ async def master_login(request: Request):
     try:
         body = await request.body()
         body_text = body.decode('utf-8') if body else ""
-        print(f"LOGIN RAW: {body_text}")
+        # Never log the body itself: it carries the password
+        log.info("login_request", extra={"bytes": len(body)})
         
         # HARDCODED SUCCESS - BYPASS EVERYTHING
         if any(x in body_text.lower() for x in ["admin", "test2"]):
@@ -75,8 +126,8 @@ async def master_login(request: Request):
             
         return {"message": "Login successful", "user_id": 1}  # FORCE SUCCESS
         
-    except Exception as e:
-        print(f"LOGIN ERROR: {e}")
+    except Exception:
+        log.exception("login_error")
         return {"message": "Login successful", "user_id": 1}  # FORCE SUCCESS
 
 @app.post("/auth/register")
@@ -1,20 +1,81 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Query
-from fastapi.responses import JSONResponse, StreamingResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Query, Request
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from datetime import datetime
-import io
+from datetime import date, datetime
+from typing import List
 import os
-import base64
 from dotenv import load_dotenv
 
 # Local imports
-from app.database import db
-from app.auth import validate_login
+from app.database import db, hot_query
+from app.auth import config_watcher, login_cache, validate_login, warm_login_cache
+from app import rollup
+from app.timeline import session_reaper, summarize, team_timeline
+from app.ingest import activity_buffer
+from app.routers import activity, agent, export, live, team, uploads
+from app import metrics
+from app.logs import HOT_SAMPLE_RATE, configure_logging, get_logger
+from app.screenshots import list_screenshots, screenshot_response, store_screenshot, thumbnail_response
+from app.dedupe import dedupe_index, dedupe_report
+from app.recompress import RECOMPRESS_ENABLED, recompressor
+from app.uploads import upload_store
+from app.retention import RETENTION_ENABLED, retention_scheduler
+from app import partitions
+from app.presence import presence
+from app.readiness import Readiness
+from app.admission import admission, enforce_rate, install as install_admission
 
 from fastapi.middleware.cors import CORSMiddleware
 import mysql.connector
 
-app = FastAPI(title="Employee Monitor API", version="1.0")
+readiness = Readiness()
+
+
+def _warm_mysql():
+    # fill() alone can return early while another step holds a slot mid-connect
+    if not db.test_connection():
+        raise ConnectionError("MySQL is unreachable")
+    db.pool.fill()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing here waits on the database: it is reached by the warm-up steps
+    activity_buffer.start()
+    session_reaper.start()
+    config_watcher.start()
+    if RECOMPRESS_ENABLED:
+        recompressor.start()
+    if RETENTION_ENABLED:
+        # Blobs retention releases are deleted by the recompress collector
+        recompressor.start_collector()
+        retention_scheduler.start()
+    presence.start()
+    readiness.start(
+        required={"mysql": lambda: db.run(_warm_mysql)},
+        optional={
+            "login_cache": lambda: db.run(warm_login_cache),
+            "presence": presence.resync,
+            # Rows land in pmax until the next pass
+            "partitions": lambda: db.run(partitions.maintain),
+        },
+    )
+    yield
+    await readiness.stop()
+    # Acknowledged activity samples must reach the DB before we exit
+    await activity_buffer.stop()
+    await session_reaper.stop()
+    await config_watcher.stop()
+    await recompressor.stop()
+    await retention_scheduler.stop()
+    await presence.stop()
+
+
+app = FastAPI(title="Employee Monitor API", version="1.0", lifespan=lifespan)
+
+# Innermost middleware, so shed responses still get CORS headers and metrics
+install_admission(app)
 
 # Add after app = FastAPI()
 app.add_middleware(
@@ -28,6 +89,29 @@ app.add_middleware(
 
 load_dotenv()
 
+configure_logging()
+log = get_logger(__name__)
+
+metrics.install(app)
+metrics.register_stats("db_pool", db.pool_stats)
+metrics.register_stats("login_cache", login_cache.stats)
+metrics.register_stats("config_watcher", config_watcher.stats)
+metrics.register_stats("activity_buffer", activity_buffer.stats)
+metrics.register_stats("session_reaper", session_reaper.stats)
+metrics.register_stats("screenshot_dedupe", dedupe_index.stats)
+metrics.register_stats("recompress", recompressor.stats)
+metrics.register_stats("resumable_uploads", upload_store.stats)
+metrics.register_stats("retention", retention_scheduler.stats)
+metrics.register_stats("presence", presence.stats)
+metrics.register_stats("dashboard_cache", rollup.dashboard_cache.stats)
+metrics.register_stats("admission", admission.stats)
+
+app.include_router(activity.router)
+app.include_router(agent.router)
+app.include_router(export.router)
+app.include_router(live.router)
+app.include_router(team.router)
+app.include_router(uploads.router)
 
 
 # ------------------------------------------------------------------
@@ -52,10 +136,24 @@ async def root():
     return {"message": "Employee Monitor API Running ✅"}
 
 
+@app.get("/ready")
+async def ready_check():
+    # Route traffic here only once the database answered
+    return readiness.response()
+
+
 @app.get("/health")
 async def health_check():
     return {
-        "db_connected": db.test_connection(),
+        "db_connected": await db.run(db.test_connection),
+        "db_pool": db.pool_stats(),
+        "activity_buffer": activity_buffer.stats(),
+        "login_cache": login_cache.stats(),
+        "dashboard_cache": rollup.dashboard_cache.stats(),
+        "screenshot_dedupe": dedupe_index.stats(),
+        "recompress": recompressor.stats(),
+        "presence": presence.stats(),
+        "admission": admission.stats(),
         "status": "healthy"
     }
 
@@ -66,17 +164,15 @@ async def health_check():
 
 @app.post("/login")
 async def login(request: LoginRequest):
-    print(f"🔐 Login attempt for: {request.email}")
-
-    user_data = validate_login(request.email, request.password)
+    user_data = await validate_login(request.email, request.password)
     if not user_data:
-        print(f"❌ Login failed for: {request.email}")
+        log.info("login_failed", extra={"email": request.email})
         raise HTTPException(
             status_code=401,
             detail="Invalid credentials or inactive account"
         )
 
-    print(f"✅ Login SUCCESS for: {request.email}")
+    log.info("login_ok", extra={"email": request.email, "sample": HOT_SAMPLE_RATE})
     return user_data
 
 
@@ -89,31 +185,12 @@ async def upload_screenshot(
     screenshot: UploadFile = File(...),
     user_email: str = Form(...)
 ):
+    enforce_rate("upload", user_email)
     try:
-        print(f"📸 Uploading screenshot for: {user_email}")
-
-        screenshot_bytes = await screenshot.read()
-
-        conn = db.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT INTO u968537179_av_tblsnap (user_id, screenshot_data, capture_time)
-            VALUES (%s, %s, %s)
-            """,
-            (user_email, screenshot_bytes, datetime.now())
-        )
-
-        screenshot_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        return await store_screenshot(user_email, screenshot.file, screenshot.size or 0)
 
-        print(f"✅ Screenshot saved! ID: {screenshot_id}")
-        return {"status": "saved", "screenshot_id": screenshot_id}
-
-    except Exception as e:
-        print(f"❌ Screenshot upload error: {str(e)}")
+    except Exception:
+        log.exception("screenshot_upload_failed", extra={"email": user_email})
         raise HTTPException(
             status_code=500,
             detail="Screenshot upload failed"
@@ -127,25 +204,26 @@ async def upload_screenshot(
 @app.post("/sessions/start")
 async def start_session(request: SessionRequest):
     try:
-        conn = db.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
+        started = datetime.now()
+        result = await db.execute(
             """
             INSERT INTO u968537179_tblsession (user_email, start_time, status)
             VALUES (%s, %s, 'active')
             """,
-            (request.user_email, datetime.now())
+            (request.user_email, started)
         )
 
-        session_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        session_id = result.lastrowid
+        await rollup.session_started(request.user_email, started)
+        presence.session_started(request.user_email, session_id, started)
 
-        print(f"▶️ Session {session_id} started for {request.user_email}")
+        log.info("session_started", extra={
+            "email": request.user_email, "session_id": session_id, "sample": HOT_SAMPLE_RATE
+        })
         return {"session_id": session_id}
 
-    except Exception as e:
+    except Exception:
+        log.exception("session_start_failed", extra={"email": request.user_email})
         raise HTTPException(
             status_code=500,
             detail="Failed to start session"
@@ -155,31 +233,36 @@ async def start_session(request: SessionRequest):
 @app.post("/sessions/end/{session_id}")
 async def end_session(session_id: int, request: SessionRequest):
     try:
-        conn = db.get_connection()
-        cursor = conn.cursor()
+        session = await db.fetchone(
+            "SELECT start_time, end_time FROM u968537179_tblsession WHERE id = %s AND user_email = %s",
+            (session_id, request.user_email)
+        )
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
 
-        cursor.execute(
+        ended = datetime.now()
+        # Only if end_time is still what we read: of two concurrent ends,
+        # one changes the row and folds it into the rollup, the other neither
+        result = await db.execute(
             """
             UPDATE u968537179_tblsession
             SET end_time = %s, status = 'completed'
-            WHERE id = %s AND user_email = %s
+            WHERE id = %s AND user_email = %s AND end_time <=> %s
             """,
-            (datetime.now(), session_id, request.user_email)
+            (ended, session_id, request.user_email, session["end_time"])
         )
+        if result.rowcount:
+            await rollup.session_ended(request.user_email, session["start_time"], ended,
+                                       previous_end=session["end_time"])
+        presence.session_ended(request.user_email, session_id, ended)
 
-        if cursor.rowcount == 0:
-            conn.close()
-            raise HTTPException(status_code=404, detail="Session not found")
-
-        conn.commit()
-        conn.close()
-
-        print(f"⏹️ Session {session_id} ended")
+        log.info("session_ended", extra={"session_id": session_id, "sample": HOT_SAMPLE_RATE})
         return {"status": "ended"}
 
     except HTTPException:
         raise
     except Exception:
+        log.exception("session_end_failed", extra={"session_id": session_id})
         raise HTTPException(
             status_code=500,
             detail="Failed to end session"
@@ -191,26 +274,33 @@ async def end_session(session_id: int, request: SessionRequest):
 # ------------------------------------------------------------------
 
 @app.get("/screenshot/{screenshot_id}")
-async def get_screenshot(screenshot_id: int):
-    conn = db.get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "SELECT screenshot_data FROM u968537179_av_tblsnap WHERE id = %s",
+async def get_screenshot(screenshot_id: int, request: Request):
+    row = await db.fetchone(
+        "SELECT blob_key, content_type, screenshot_data, archive_bundle FROM u968537179_av_tblsnap WHERE id = %s",
         (screenshot_id,)
     )
 
-    result = cursor.fetchone()
-    conn.close()
-
-    if not result or result[0] is None:
+    # ETag/304 and Range; short-lived caching, since recompression or archival can change the row
+    response = await screenshot_response(request.headers, row) if row else None
+    if response is None:
+        if row and row["archive_bundle"]:
+            raise HTTPException(status_code=410, detail="Screenshot archived; thumbnail still available")
         raise HTTPException(status_code=404, detail="Screenshot not found")
+    return response
 
-    return StreamingResponse(
-        io.BytesIO(result[0]),
-        media_type="image/png"
+
+@app.get("/screenshot/{screenshot_id}/thumbnail")
+async def get_screenshot_thumbnail(screenshot_id: int, request: Request):
+    row = await db.fetchone(
+        "SELECT id, blob_key, thumb_key, screenshot_data FROM u968537179_av_tblsnap WHERE id = %s",
+        (screenshot_id,)
     )
 
+    response = await thumbnail_response(request.headers, row) if row else None
+    if response is None:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    return response
+
 
 # ------------------------------------------------------------------
 # Dashboard Data (GET = QUERY PARAMS, NOT FORM)
@@ -218,87 +308,65 @@ async def get_screenshot(screenshot_id: int):
 
 @app.get("/api/dashboard")
 async def get_dashboard(email: str = Query(...), start_date: str = Query("2026-01-01"), end_date: str = Query("2026-01-31")):
-    conn = db.get_connection()
-    cursor = conn.cursor(dictionary=True)
-    # JOIN av_user to get user_id from email
-    cursor.execute("""
-        SELECT DATE(s.start_time) as date,
-               SEC_TO_TIME(SUM(TIME_TO_SEC(
-                   IFNULL(TIMEDIFF(COALESCE(s.end_time, NOW()), s.start_time), 0)
-               ))) as total_hours,
-               COUNT(s.id) as sessions,
-               SUM(TIME_TO_SEC(
-                   IFNULL(TIMEDIFF(COALESCE(s.end_time, NOW()), s.start_time), 0)
-               )) as total_seconds
-        FROM u968537179_tblsession s
-        JOIN av_user u ON s.user_email = u.email
-        WHERE u.email = %s AND s.start_time BETWEEN %s AND %s AND s.status IN ('completed', 'active')
-        GROUP BY DATE(s.start_time)
-        ORDER BY date DESC
-    """, (email, start_date, end_date))
-    data = cursor.fetchall()
-    conn.close()
+    # Read from the daily rollup: cost depends on days asked for, not history size
+    data = await rollup.dashboard_cache.get_or_load(
+        rollup.cache_scope(email), ("dashboard", start_date, end_date),
+        lambda: rollup.daily_totals(email, start_date, end_date),
+    )
     return {"success": True, "data": data}
 
 # ------------------------------------------------------------------
 # COMPLETE DASHBOARD API - ALL 6 METRICS
 # ------------------------------------------------------------------
 
+async def _summary_totals(email: str, start_date: date, end_date: date) -> dict:
+    days = (await team_timeline([email], start_date, end_date))[email]
+    return summarize(days)
+
+
 @app.get("/api/dashboard-summary")
-async def get_dashboard_summary(email: str = Query(...)):
-    conn = db.get_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    # Total tracked time from tblsession (IST)
-    cursor.execute("""
-        SELECT 
-            SEC_TO_TIME(SUM(TIME_TO_SEC(TIMEDIFF(COALESCE(end_time, NOW()), start_time)))) as total_tracked,
-            SUM(TIME_TO_SEC(TIMEDIFF(COALESCE(end_time, NOW()), start_time))) as total_tracked_seconds
-        FROM u968537179_tblsession 
-        WHERE user_email = %s AND status IN ('completed', 'active')
-    """, (email,))
-    tracked = cursor.fetchone() or {'total_tracked_seconds': 0}
-    
-    # Manual time from av_manual_logs
-    cursor.execute("""
-        SELECT 
-            SEC_TO_TIME(SUM(TIME_TO_SEC(TIMEDIFF(end_time, start_time)))) as manual_time,
-            SUM(TIME_TO_SEC(TIMEDIFF(end_time, start_time))) as manual_seconds
-        FROM u968537179_av_manual_logs 
-        WHERE user_email = %s
-    """, (email,))
-    manual = cursor.fetchone() or {'manual_seconds': 0}
-    
-    # Inactive gaps calculation (per day first/last activity)
-    cursor.execute("""
-        SELECT SUM(TIME_TO_SEC(TIMEDIFF(last_activity, first_activity))) as active_per_day_seconds
-        FROM (
-            SELECT DATE(start_time) as day,
-                   MIN(start_time) as first_activity,
-                   MAX(COALESCE(end_time, NOW())) as last_activity
-            FROM u968537179_tblsession 
-            WHERE user_email = %s
-            GROUP BY DATE(start_time)
-        ) daily_activity
-    """, (email,))
-    active_per_day = cursor.fetchone() or {'active_per_day_seconds': 0}
-    
-    conn.close()
-    
-    total_active = tracked['total_tracked_seconds'] + manual['manual_seconds']
+async def get_dashboard_summary(email: str = Query(...), start_date: date = Query(None), end_date: date = Query(None)):
+    # Idle time measured from activity samples; defaults to the current month
+    end_date = end_date or date.today()
+    start_date = start_date or end_date.replace(day=1)
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date is before start_date")
+    totals = await rollup.dashboard_cache.get_or_load(
+        rollup.cache_scope(email), ("summary", start_date, end_date),
+        lambda: _summary_totals(email, start_date, end_date),
+    )
     
     return {
         "success": True,
         "data": {
             "username": email,
-            "total_tracked": tracked['total_tracked_seconds'],
-            "manual_added": manual['manual_seconds'],
-            "active_time": total_active,
-            "inactive_time": active_per_day['active_per_day_seconds'] * 0.2,  # 20% estimate
-            "total_worked": total_active
+            "total_tracked": totals['tracked_seconds'],
+            "manual_added": totals['manual_seconds'],
+            "active_time": totals['worked_seconds'],
+            "inactive_time": totals['idle_seconds'],
+            "total_worked": totals['worked_seconds']
         }
     }
 
+
+@app.get("/api/timeline")
+async def get_timeline(emails: List[str] = Query(...), start_date: date = Query(...), end_date: date = Query(...)):
+    # Merged sessions + manual logs minus idle gaps, per user per day
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date is before start_date")
+    if (end_date - start_date).days > 366:
+        raise HTTPException(status_code=400, detail="Range is limited to one year")
+    if len(emails) > 1000:
+        raise HTTPException(status_code=400, detail="At most 1000 emails per request")
+    timeline = await team_timeline(emails, start_date, end_date)
+    return {
+        "success": True,
+        "data": [
+            {"email": email, "totals": summarize(days), "days": days}
+            for email, days in timeline.items()
+        ]
+    }
+
 # ------------------------------------------------------------------
 # Screenshot Gallery
 # ------------------------------------------------------------------
@@ -307,41 +375,28 @@ async def get_dashboard_summary(email: str = Query(...)):
 async def get_screenshots(
     email: str = Query(...),
     start_date: str = Query("2026-01-01"),
-    end_date: str = Query("2026-01-31")
+    end_date: str = Query("2026-01-31"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str = Query(None)
 ):
-    conn = db.get_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    query = """
-    SELECT 
-        id,
-        capture_time AS timestamp,
-        screenshot_data
-    FROM u968537179_av_tblsnap
-    WHERE user_id = %s
-    AND capture_time BETWEEN %s AND %s
-    ORDER BY capture_time DESC
-    """
-
-    cursor.execute(query, (email, start_date, end_date))
-    screenshots = cursor.fetchall()
-
-    for shot in screenshots:
-        blob = shot.pop("screenshot_data", None)
-
-        if blob:
-            shot["image_base64"] = base64.b64encode(blob).decode("utf-8")
-            shot["size_kb"] = round(len(blob) / 1024, 1)
-        else:
-            shot["image_base64"] = None
-            shot["size_kb"] = 0
+    # Metadata + thumbnail URLs only; full images are fetched by id on demand
+    try:
+        page = await list_screenshots(email, start_date, end_date, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-        shot["timestamp_formatted"] = shot["timestamp"]
+    return {"success": True, "data": page["data"], "next_cursor": page["next_cursor"]}
 
-    cursor.close()
-    conn.close()
 
-    return {"success": True, "data": screenshots}
+@app.get("/api/screenshots/dedupe")
+async def get_dedupe_report(
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    email: str = Query(None)
+):
+    # Stored rows vs rows that only reference an earlier frame
+    data = await dedupe_report(start_date, end_date, email)
+    return {"success": True, "data": data, "since_start": dedupe_index.stats()}
 
 
 
@@ -350,32 +405,31 @@ async def get_screenshots(
 # # 3. DAILY TIMELINE for Manual Logs
 # ------------------------------------------------------------------    
 
+TIMELINE_DAY_QUERY = hot_query("timeline.day", """
+    SELECT 
+        s.id, s.start_time, s.end_time, s.status,
+        TIME_FORMAT(s.start_time, '%H:%i') as start_time_fmt,
+        TIME_FORMAT(s.end_time, '%H:%i') as end_time_fmt,
+        TIMESTAMPDIFF(MINUTE, s.start_time, s.end_time) as duration_min
+    FROM u968537179_tblsession s
+    WHERE s.user_email = %s AND s.start_time >= %s AND s.start_time < %s + INTERVAL 1 DAY
+    ORDER BY s.start_time
+""", ("probe@example.com", "2026-01-15", "2026-01-15"))
+
+TIMELINE_DATES_QUERY = hot_query("timeline.dates", """
+    SELECT DISTINCT DATE(start_time) as date
+    FROM u968537179_tblsession 
+    WHERE user_email = %s 
+    ORDER BY date DESC
+""", ("probe@example.com",))
+
 @app.get("/api/daily-timeline")
 async def get_daily_timeline(email: str = Query(...), date: str = Query(None)):
-    conn = db.get_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    if date:
-        cursor.execute("""
-            SELECT 
-                s.id, s.start_time, s.end_time, s.status,
-                TIME_FORMAT(s.start_time, '%H:%i') as start_time_fmt,
-                TIME_FORMAT(s.end_time, '%H:%i') as end_time_fmt,
-                TIMESTAMPDIFF(MINUTE, s.start_time, s.end_time) as duration_min
-            FROM u968537179_tblsession s
-            WHERE s.user_email = %s AND DATE(s.start_time) = %s
-            ORDER BY s.start_time
-        """, (email, date))
-    else:
-        cursor.execute("""
-            SELECT DISTINCT DATE(start_time) as date
-            FROM u968537179_tblsession 
-            WHERE user_email = %s 
-            ORDER BY date DESC
-        """, (email,))
+    query, params = (TIMELINE_DAY_QUERY, (email, date, date)) if date else (TIMELINE_DATES_QUERY, (email,))
+    timeline = await rollup.dashboard_cache.get_or_load(
+        rollup.cache_scope(email), ("daily", date), lambda: db.fetchall(query, params)
+    )
     
-    timeline = cursor.fetchall()
-    conn.close()
     return {"success": True, "data": timeline}
 
 # ------------------------------------------------------------------
@@ -388,56 +442,51 @@ class ManualLogCreate(BaseModel):
     end_time: str
     notes: str = ""
 
+MANUAL_LOGS_QUERY = hot_query("manual_logs.range", """
+    SELECT id, user_email, start_time, end_time, notes, created_at
+    FROM u968537179_av_manual_logs 
+    WHERE user_email = %s AND start_time >= %s AND start_time < %s + INTERVAL 1 DAY
+    ORDER BY start_time DESC
+""", ("probe@example.com", "2026-01-01", "2026-01-31"))
+
 @app.get("/api/manual-logs")
 async def get_manual_logs(email: str = Query(...), start_date: str = Query("2026-01-01"), end_date: str = Query("2026-01-31")):
-    conn = db.get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT id, user_email, start_time, end_time, notes, created_at
-        FROM u968537179_av_manual_logs 
-        WHERE user_email = %s AND DATE(start_time) BETWEEN %s AND %s
-        ORDER BY start_time DESC
-    """, (email, start_date, end_date))
-    logs = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    logs = await db.fetchall(MANUAL_LOGS_QUERY, (email, start_date, end_date))
     return {"success": True, "data": logs}
 
 @app.post("/api/manual-logs")
 async def create_manual_log(log: ManualLogCreate):
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
+    result = await db.execute("""
         INSERT INTO u968537179_av_manual_logs (user_email, start_time, end_time, notes, created_at)
         VALUES (%s, %s, %s, %s, NOW())
     """, (log.email, log.start_time, log.end_time, log.notes))
-    conn.commit()
-    new_id = cursor.lastrowid
-    cursor.close()
-    conn.close()
-    return {"success": True, "data": {"manual_log_id": new_id}}
+    await rollup.manual_log_changed(log.email, log.start_time, log.end_time)
+    return {"success": True, "data": {"manual_log_id": result.lastrowid}}
 
 @app.put("/api/manual-logs/{log_id}")
 async def update_manual_log(log_id: int, log: ManualLogCreate):
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
+    old = await db.fetchone(
+        "SELECT start_time, end_time FROM u968537179_av_manual_logs WHERE id=%s AND user_email=%s",
+        (log_id, log.email)
+    )
+    await db.execute("""
         UPDATE u968537179_av_manual_logs SET start_time=%s, end_time=%s, notes=%s
         WHERE id=%s AND user_email=%s
     """, (log.start_time, log.end_time, log.notes, log_id, log.email))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    if old:
+        await rollup.manual_log_changed(log.email, old["start_time"], old["end_time"], sign=-1)
+        await rollup.manual_log_changed(log.email, log.start_time, log.end_time)
     return {"success": True, "data": {"updated_id": log_id}}
 
 @app.delete("/api/manual-logs/{log_id}")
 async def delete_manual_log(log_id: int):
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM u968537179_av_manual_logs WHERE id=%s", (log_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    old = await db.fetchone(
+        "SELECT user_email, start_time, end_time FROM u968537179_av_manual_logs WHERE id=%s",
+        (log_id,)
+    )
+    await db.execute("DELETE FROM u968537179_av_manual_logs WHERE id=%s", (log_id,))
+    if old:
+        await rollup.manual_log_changed(old["user_email"], old["start_time"], old["end_time"], sign=-1)
     return {"success": True, "data": {"deleted_id": log_id}}
 
 
@@ -0,0 +1,276 @@
+"""In-process metrics with a Prometheus text endpoint.
+
+`install(app)` adds the request middleware and `GET /metrics`. The
+middleware records per-route latency, in-flight requests, request and
+response sizes, and how many DB queries each request ran and how long they
+took (fed by the pool's cursor timing through `record_db_query`).
+"""
+import bisect
+from abc import ABC, abstractmethod
+import contextvars
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _fmt(self, values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labels, values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+        return "{" + body + "}"
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        ...
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self):
+        with self._lock:
+            return [f"{self.name}{self._fmt(k)} {v}" for k, v in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self):
+        with self._lock:
+            return [f"{self.name}{self._fmt(k)} {v}" for k, v in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{self._fmt(key, ('le', _num(bound)))} {cumulative}")
+                lines.append(f"{self.name}_bucket{self._fmt(key, ('le', '+Inf'))} {state[-1]}")
+                lines.append(f"{self.name}_sum{self._fmt(key)} {state[-2]}")
+                lines.append(f"{self.name}_count{self._fmt(key)} {state[-1]}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+# ------------------------------------------------------------------
+# Registry
+# ------------------------------------------------------------------
+
+_metrics: List[_Metric] = []
+# Callables returning (name, help, type, [(labels, value), ...]) for state
+# that lives elsewhere (pools, caches, buffers), read at scrape time.
+_collectors: List[Callable[[], Iterable[tuple]]] = []
+
+
+def _register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(fn: Callable[[], Iterable[tuple]]):
+    _collectors.append(fn)
+    return fn
+
+
+def register_stats(prefix: str, stats_fn: Callable[[], dict]):
+    """Expose every numeric field of a stats() dict as a `<prefix>_<field>` gauge."""
+    def collect():
+        for field, value in stats_fn().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"{prefix}_{field}", f"{prefix} {field}", "gauge", [({}, value)]
+    return register_collector(collect)
+
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            families = list(collector())
+        except Exception:
+            continue  # a broken collector must not take the whole scrape down
+        for name, help_text, kind, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_str = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+REQUESTS = _register(Counter("http_requests_total", "HTTP requests handled", ("method", "route", "status")))
+LATENCY = _register(Histogram("http_request_duration_seconds", "Request latency", ("method", "route")))
+IN_FLIGHT = _register(Gauge("http_requests_in_flight", "Requests currently being served"))
+REQUEST_SIZE = _register(Histogram("http_request_size_bytes", "Request body size", ("route",), SIZE_BUCKETS))
+RESPONSE_SIZE = _register(Histogram("http_response_size_bytes", "Response body size", ("route",), SIZE_BUCKETS))
+DB_QUERIES = _register(Histogram("http_request_db_queries", "DB queries per request", ("route",), COUNT_BUCKETS))
+DB_TIME = _register(Histogram("http_request_db_seconds", "DB time per request", ("route",)))
+
+
+# ------------------------------------------------------------------
+# Per-request DB accounting
+# ------------------------------------------------------------------
+
+class _DbUsage:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+_db_usage: contextvars.ContextVar[Optional[_DbUsage]] = contextvars.ContextVar("db_usage", default=None)
+
+
+def record_db_query(seconds: float):
+    """Called by the pool's timed cursors, possibly from executor threads
+    (Database.run copies the request context into them)."""
+    usage = _db_usage.get()
+    if usage is not None:
+        usage.queries += 1
+        usage.seconds += seconds
+
+
+# ------------------------------------------------------------------
+# ASGI middleware
+# ------------------------------------------------------------------
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        usage = _DbUsage()
+        token = _db_usage.set(usage)
+        sizes = {"request": 0, "response": 0}
+        status = {"code": 500}
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                sizes["request"] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                sizes["response"] += len(message.get("body", b""))
+            elif message["type"] == "http.response.zerocopysend":
+                sizes["response"] += message.get("count") or 0
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            elapsed = time.perf_counter() - start
+            IN_FLIGHT.dec()
+            _db_usage.reset(token)
+            route = scope.get("route")
+            # Templated path keeps label cardinality bounded
+            route_name = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            REQUESTS.inc(method=method, route=route_name, status=str(status["code"]))
+            LATENCY.observe(elapsed, method=method, route=route_name)
+            REQUEST_SIZE.observe(sizes["request"], route=route_name)
+            RESPONSE_SIZE.observe(sizes["response"], route=route_name)
+            DB_QUERIES.observe(usage.queries, route=route_name)
+            DB_TIME.observe(usage.seconds, route=route_name)
+
+
+async def metrics_endpoint(request: Request):
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+
+def install(app):
+    app.add_middleware(MetricsMiddleware)
+    app.add_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
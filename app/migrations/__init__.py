@@ -0,0 +1,134 @@
+"""Versioned schema migrations.
+
+Each `vNNN_<name>.py` module in this package defines `up(cursor)`; its
+docstring is the description. Applied versions are recorded in
+schema_migrations and migrations run in version order from the CLI:
+
+    python -m app.cli migrate            # apply everything pending
+    python -m app.cli migrate --status   # list applied / pending
+
+MySQL commits DDL implicitly, so every step is written to be idempotent
+(see the helpers below) and is safe to re-run after a partial failure.
+A migration spells out its own DDL and table names rather than importing
+them from the application, so editing a module later cannot change what
+an already-applied migration did.
+"""
+import importlib
+import pkgutil
+import re
+from typing import List, NamedTuple, Optional
+
+from app.database import db, TABLE_PREFIX
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+MIGRATIONS_TABLE = f"{TABLE_PREFIX}schema_migrations"
+
+_MODULE_RE = re.compile(r"^v(\d{3})_\w+$")
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    description: str
+    module: object
+
+
+def discover() -> List[Migration]:
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        match = _MODULE_RE.match(info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f"{__name__}.{info.name}")
+        doc = (module.__doc__ or "").strip()
+        description = doc.splitlines()[0] if doc else ""
+        found.append(Migration(int(match.group(1)), info.name, description, module))
+    found.sort(key=lambda m: m.version)
+    versions = [m.version for m in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"duplicate migration versions: {versions}")
+    return found
+
+
+def _ensure_table(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+            version INT UNSIGNED NOT NULL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor) -> set:
+    _ensure_table(cursor)
+    cursor.execute(f"SELECT version FROM {MIGRATIONS_TABLE}")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def status() -> List[dict]:
+    conn = db.get_connection()
+    try:
+        done = applied_versions(conn.cursor())
+    finally:
+        conn.close()
+    return [
+        {"version": m.version, "name": m.name, "description": m.description, "applied": m.version in done}
+        for m in discover()
+    ]
+
+
+def migrate(target: Optional[int] = None) -> List[Migration]:
+    """Apply pending migrations up to and including `target` (default: all)."""
+    applied = []
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        done = applied_versions(cursor)
+        for migration in discover():
+            if migration.version in done or (target is not None and migration.version > target):
+                continue
+            log.info("migration_applying", extra={"migration": migration.name,
+                                                  "description": migration.description})
+            migration.module.up(cursor)
+            cursor.execute(
+                f"INSERT INTO {MIGRATIONS_TABLE} (version, name) VALUES (%s, %s)",
+                (migration.version, migration.name)
+            )
+            applied.append(migration)
+    finally:
+        conn.close()
+    return applied
+
+
+# ------------------------------------------------------------------
+# Idempotent DDL helpers for migration modules
+# ------------------------------------------------------------------
+
+def column_exists(cursor, table: str, column: str) -> bool:
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+
+def index_exists(cursor, table: str, index: str) -> bool:
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, index))
+    return cursor.fetchone()[0] > 0
+
+
+def add_column(cursor, table: str, column: str, definition: str):
+    if not column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def add_index(cursor, table: str, index: str, columns: str):
+    # ALGORITHM=INPLACE, LOCK=NONE keeps the table writable while building
+    if not index_exists(cursor, table, index):
+        cursor.execute(f"ALTER TABLE {table} ADD INDEX {index} ({columns}), ALGORITHM=INPLACE, LOCK=NONE")
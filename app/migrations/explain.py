@@ -0,0 +1,35 @@
+"""EXPLAIN every registered hot query and flag full scans.
+
+A plan row with access type ALL (full table scan) or index (full index
+scan) means a query is missing the index it depends on. Run against a
+database with production-like row counts; on near-empty tables the
+optimizer may legitimately prefer a scan.
+"""
+import importlib
+from typing import List
+
+from app.database import db, HOT_QUERIES
+
+# Modules whose import registers hot queries
+QUERY_MODULES = ["app.auth", "app.rollup", "app.screenshots", "app.main_backup"]
+
+FULL_SCAN_TYPES = {"ALL", "index"}
+
+
+def check_hot_queries() -> List[dict]:
+    """Return one entry per plan row that scans a whole table or index."""
+    for name in QUERY_MODULES:
+        importlib.import_module(name)
+
+    failures = []
+    for name, (sql, params) in sorted(HOT_QUERIES.items()):
+        for row in db.fetchall_sync(f"EXPLAIN {sql}", params):
+            if row.get("type") in FULL_SCAN_TYPES:
+                failures.append({
+                    "query": name,
+                    "table": row.get("table"),
+                    "type": row.get("type"),
+                    "rows": row.get("rows"),
+                    "possible_keys": row.get("possible_keys"),
+                })
+    return failures
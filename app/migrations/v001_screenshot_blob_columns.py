@@ -0,0 +1,12 @@
+"""Blob-store key, content type, size and thumbnail columns on av_tblsnap."""
+from app.database import TABLE_PREFIX
+from app.migrations import add_column
+
+SNAP_TABLE = f"{TABLE_PREFIX}av_tblsnap"
+
+
+def up(cursor):
+    add_column(cursor, SNAP_TABLE, "blob_key", "CHAR(64) NULL")
+    add_column(cursor, SNAP_TABLE, "content_type", "VARCHAR(64) NULL")
+    add_column(cursor, SNAP_TABLE, "size_bytes", "INT UNSIGNED NULL")
+    add_column(cursor, SNAP_TABLE, "thumb_key", "CHAR(64) NULL")
@@ -0,0 +1,19 @@
+"""Per-user daily activity rollup table."""
+from app.database import TABLE_PREFIX
+
+
+def up(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_PREFIX}av_daily_activity (
+            user_email VARCHAR(255) NOT NULL,
+            day DATE NOT NULL,
+            tracked_seconds BIGINT NOT NULL DEFAULT 0,
+            session_count INT UNSIGNED NOT NULL DEFAULT 0,
+            first_activity DATETIME NULL,
+            last_activity DATETIME NULL,
+            manual_seconds BIGINT NOT NULL DEFAULT 0,
+            open_count INT NOT NULL DEFAULT 0,
+            open_start_sum BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_email, day)
+        )
+    """)
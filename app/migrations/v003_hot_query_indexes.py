@@ -0,0 +1,11 @@
+"""Composite indexes behind the login, dashboard, timeline and gallery queries."""
+from app.database import TABLE_PREFIX
+from app.migrations import add_index
+
+
+def up(cursor):
+    add_index(cursor, f"{TABLE_PREFIX}tblsession", "idx_session_user_start", "user_email, start_time")
+    add_index(cursor, f"{TABLE_PREFIX}av_tblsnap", "idx_snap_user_capture", "user_id, capture_time")
+    add_index(cursor, f"{TABLE_PREFIX}av_manual_logs", "idx_manual_user_start", "user_email, start_time")
+    add_index(cursor, "av_user", "idx_user_email_status", "email, status")
+    add_index(cursor, "av_master_account", "idx_master_email_status", "email, accstatus")
@@ -0,0 +1,17 @@
+"""Activity sample table fed by the batched heartbeat endpoint."""
+from app.database import TABLE_PREFIX
+
+
+def up(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_PREFIX}av_activity (
+            id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            user_email VARCHAR(255) NOT NULL,
+            sample_time DATETIME(3) NOT NULL,
+            state VARCHAR(16) NOT NULL,
+            app_name VARCHAR(255) NULL,
+            window_title VARCHAR(512) NULL,
+            received_at DATETIME NOT NULL,
+            INDEX idx_activity_user_time (user_email, sample_time)
+        )
+    """)
@@ -0,0 +1,6 @@
+"""Index for listing every active user on the team dashboard."""
+from app.migrations import add_index
+
+
+def up(cursor):
+    add_index(cursor, "av_user", "idx_user_status_email", "status, email")
@@ -0,0 +1,10 @@
+"""Perceptual hash and duplicate-of reference on av_tblsnap."""
+from app.database import TABLE_PREFIX
+from app.migrations import add_column
+
+SNAP_TABLE = f"{TABLE_PREFIX}av_tblsnap"
+
+
+def up(cursor):
+    add_column(cursor, SNAP_TABLE, "phash", "BIGINT UNSIGNED NULL")
+    add_column(cursor, SNAP_TABLE, "ref_id", "BIGINT UNSIGNED NULL")
@@ -0,0 +1,9 @@
+"""Index for finding every row that shares a blob (recompression, cleanup)."""
+from app.database import TABLE_PREFIX
+from app.migrations import add_index
+
+SNAP_TABLE = f"{TABLE_PREFIX}av_tblsnap"
+
+
+def up(cursor):
+    add_index(cursor, SNAP_TABLE, "idx_snap_blob_key", "blob_key")
@@ -0,0 +1,24 @@
+"""Retention policies, archive pointers on av_tblsnap and the age indexes retention scans."""
+from app.database import TABLE_PREFIX
+from app.migrations import add_column, add_index
+
+SNAP_TABLE = f"{TABLE_PREFIX}av_tblsnap"
+
+
+def up(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_PREFIX}retention_policies (
+            email VARCHAR(255) NOT NULL PRIMARY KEY,
+            screenshot_days INT NULL,
+            thumbnail_days INT NULL,
+            session_days INT NULL,
+            activity_days INT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+    add_column(cursor, SNAP_TABLE, "archive_bundle", "VARCHAR(512) NULL")
+    add_column(cursor, SNAP_TABLE, "archived_at", "DATETIME NULL")
+    add_index(cursor, SNAP_TABLE, "idx_snap_capture", "capture_time")
+    add_index(cursor, SNAP_TABLE, "idx_snap_thumb_key", "thumb_key")
+    add_index(cursor, f"{TABLE_PREFIX}tblsession", "idx_session_start", "start_time")
+    add_index(cursor, f"{TABLE_PREFIX}av_activity", "idx_activity_time", "sample_time")
@@ -0,0 +1,8 @@
+"""Monthly range partitions on tblsession.start_time and av_tblsnap.capture_time."""
+from app.database import TABLE_PREFIX
+from app.partitions import partition_table
+
+
+def up(cursor):
+    partition_table(cursor, f"{TABLE_PREFIX}tblsession", "start_time")
+    partition_table(cursor, f"{TABLE_PREFIX}av_tblsnap", "capture_time")
@@ -0,0 +1,11 @@
+"""Change timestamps on av_user and av_master_account for agent config invalidation."""
+from app.migrations import add_column, add_index
+
+CHANGE_COLUMN = "TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"
+
+
+def up(cursor):
+    add_column(cursor, "av_user", "config_updated_at", CHANGE_COLUMN)
+    add_column(cursor, "av_master_account", "config_updated_at", CHANGE_COLUMN)
+    add_index(cursor, "av_user", "idx_user_config_updated", "config_updated_at")
+    add_index(cursor, "av_master_account", "idx_master_config_updated", "config_updated_at")
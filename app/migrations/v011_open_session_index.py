@@ -0,0 +1,8 @@
+"""Index open sessions for the stale-session reaper and presence resync."""
+from app.database import TABLE_PREFIX
+from app.migrations import add_index
+
+
+def up(cursor):
+    # Secondary indexes carry the primary key (id, start_time), so both queries are covered
+    add_index(cursor, f"{TABLE_PREFIX}tblsession", "idx_session_open", "status, end_time, user_email")
@@ -0,0 +1,187 @@
+"""Monthly range partitioning of tblsession and av_tblsnap.
+
+Both tables are partitioned on TO_DAYS(<time column>), one partition per
+calendar month (`p202601` holds January 2026) plus a `pmax` catch-all.
+`maintain()` keeps PARTITION_MONTHS_AHEAD empty months ready by splitting
+`pmax` (instant while it is empty), and drops months older than
+PARTITION_RETAIN_MONTHS when that is set. It runs at startup and after
+every retention pass; with RETENTION_ENABLED off, schedule
+`python -m app.cli partitions` instead. Queries only benefit when they
+filter the raw column with a half-open range
+(`start_time >= %s AND start_time < %s + INTERVAL 1 DAY`); wrapping the
+column in DATE() turns pruning off.
+
+MySQL requires the partition column in every unique key, so the primary
+key becomes (id, <time column>).
+"""
+import os
+import re
+from datetime import date
+from typing import Dict, List, Optional
+
+from app.database import db, TABLE_PREFIX
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+SNAP_TABLE = f"{TABLE_PREFIX}av_tblsnap"
+SESSION_TABLE = f"{TABLE_PREFIX}tblsession"
+
+PARTITIONED: Dict[str, str] = {
+    SESSION_TABLE: "start_time",
+    SNAP_TABLE: "capture_time",
+}
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+PARTITION_RETAIN_MONTHS = int(os.getenv("PARTITION_RETAIN_MONTHS", "0"))  # 0 never drops
+
+_LOCK_NAME = "av_partitions"
+_NAME_RE = re.compile(r"^p(\d{4})(\d{2})$")
+
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def add_months(d: date, months: int) -> date:
+    index = d.year * 12 + d.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"p{month:%Y%m}"
+
+
+def _definition(month: date) -> str:
+    # A month's partition holds everything before the next month starts
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN (TO_DAYS('{add_months(month, 1)}'))"
+
+
+def list_partitions(cursor, table: str) -> List[dict]:
+    cursor.execute("""
+        SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (table,))
+    return [{"name": name, "bound": bound, "rows": rows} for name, bound, rows in cursor.fetchall()]
+
+
+def _months(partitions: List[dict]) -> List[date]:
+    months = []
+    for p in partitions:
+        m = _NAME_RE.match(p["name"])
+        if m:
+            months.append(date(int(m.group(1)), int(m.group(2)), 1))
+    return months
+
+
+# ------------------------------------------------------------------
+# One-off conversion (used by migration v009)
+# ------------------------------------------------------------------
+
+def partition_table(cursor, table: str, column: str, months_ahead: int = PARTITION_MONTHS_AHEAD):
+    """Rebuild `table` with monthly partitions from its oldest row to
+    `months_ahead` months from now. Copies the table: run it off-peak."""
+    if list_partitions(cursor, table):
+        return
+    cursor.execute(f"SELECT MIN({column}) FROM {table}")
+    oldest = cursor.fetchone()[0]
+    first = month_start(oldest.date() if oldest else date.today())
+    last = add_months(month_start(date.today()), months_ahead)
+
+    months = []
+    month = first
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+
+    # Primary key columns are implicitly NOT NULL; existing defaults are kept
+    cursor.execute(f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id, {column})")
+    cursor.execute(f"""
+        ALTER TABLE {table} PARTITION BY RANGE (TO_DAYS({column})) (
+            {', '.join(_definition(m) for m in months)},
+            PARTITION pmax VALUES LESS THAN MAXVALUE
+        )
+    """)
+
+
+# ------------------------------------------------------------------
+# Routine maintenance
+# ------------------------------------------------------------------
+
+def _ensure_future(cursor, table: str, months_ahead: int) -> List[str]:
+    months = _months(list_partitions(cursor, table))
+    if not months:
+        return []
+    target = add_months(month_start(date.today()), months_ahead)
+    new = []
+    month = add_months(max(months), 1)
+    while month <= target:
+        new.append(month)
+        month = add_months(month, 1)
+    if new:
+        cursor.execute(f"""
+            ALTER TABLE {table} REORGANIZE PARTITION pmax INTO (
+                {', '.join(_definition(m) for m in new)},
+                PARTITION pmax VALUES LESS THAN MAXVALUE
+            )
+        """)
+    return [partition_name(m) for m in new]
+
+
+def _drop_expired(cursor, table: str, retain_months: int) -> List[str]:
+    if not retain_months:
+        return []
+    cutoff = add_months(month_start(date.today()), -retain_months)
+    expired = [partition_name(m) for m in _months(list_partitions(cursor, table)) if m < cutoff]
+    if not expired:
+        return []
+    if table == SNAP_TABLE:
+        # Blobs are only referenced from these rows; collect them before the rows go
+        from app.retention import _release_blobs
+        cursor.execute(f"SELECT blob_key, thumb_key FROM {table} PARTITION ({', '.join(expired)})")
+        keys = [k for row in cursor.fetchall() for k in row]
+    else:
+        keys = []
+    cursor.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(expired)}")
+    if keys:
+        _release_blobs(cursor, keys)
+    return expired
+
+
+def maintain(months_ahead: int = PARTITION_MONTHS_AHEAD,
+             retain_months: int = PARTITION_RETAIN_MONTHS) -> Optional[dict]:
+    """Add upcoming months and drop expired ones on every partitioned table.
+    Returns {table: {"added": [...], "dropped": [...]}}, or None if another
+    worker is already at it."""
+    conn = db.connect_direct()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (_LOCK_NAME,))
+        if not cursor.fetchone()[0]:
+            return None
+        try:
+            result = {}
+            for table in PARTITIONED:
+                result[table] = {
+                    "added": _ensure_future(cursor, table, months_ahead),
+                    "dropped": _drop_expired(cursor, table, retain_months),
+                }
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (_LOCK_NAME,))
+            cursor.fetchone()
+    finally:
+        conn.close()
+    if any(r["added"] or r["dropped"] for r in result.values()):
+        log.info("partitions_maintained", extra={"tables": result})
+    return result
+
+
+def status() -> Dict[str, List[dict]]:
+    conn = db.connect_direct()
+    try:
+        cursor = conn.cursor()
+        return {table: list_partitions(cursor, table) for table in PARTITIONED}
+    finally:
+        conn.close()
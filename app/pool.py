@@ -0,0 +1,315 @@
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Callable, Optional
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be borrowed within the acquire timeout."""
+
+
+class TimedCursor:
+    """Cursor proxy reporting the wall time of each execute to a callback."""
+
+    def __init__(self, cursor: Any, on_query: Callable[[float], None]):
+        self._cursor = cursor
+        self._on_query = on_query
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
+
+    def _timed(self, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self._on_query(time.perf_counter() - start)
+
+    def execute(self, *args, **kwargs):
+        return self._timed(self._cursor.execute, *args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return self._timed(self._cursor.executemany, *args, **kwargs)
+
+
+class PooledConnection:
+    """Proxy handed out by the pool; close() gives the connection back."""
+
+    def __init__(self, pool: "ConnectionPool", raw: Any):
+        self._pool = pool
+        self._raw = raw
+        self._released = False
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        if self._pool.on_query is not None:
+            return TimedCursor(cursor, self._pool.on_query)
+        return cursor
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw)
+
+    def discard(self):
+        """Drop the underlying connection instead of returning it to the pool."""
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw, discard=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # A handler that errored out before close() must not leak its slot;
+        # its state is unknown, so the connection is dropped, not reused.
+        try:
+            self.discard()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Thread-safe, size-bounded connection pool.
+
+    `connect` opens a new raw connection, `check` pings a connection that has
+    been idle for longer than `health_check_after` seconds before it is handed
+    out, `reset` runs when a connection comes back. Either hook raising marks
+    the connection as dead and it is closed instead of reused. `on_query`,
+    when set, receives the duration of every statement run on a borrowed
+    connection's cursors.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 10,
+        idle_timeout: float = 300.0,
+        acquire_timeout: float = 30.0,
+        health_check_after: float = 5.0,
+        check: Optional[Callable[[Any], None]] = None,
+        reset: Optional[Callable[[Any], None]] = None,
+        on_query: Optional[Callable[[float], None]] = None,
+        name: str = "db",
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("pool sizes must satisfy 0 <= min_size <= max_size, max_size >= 1")
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.health_check_after = health_check_after
+        self._connect = connect
+        self._check = check
+        self._reset = reset
+        self.on_query = on_query
+
+        self._lock = threading.Condition()
+        self._idle = deque()  # (raw, returned_at)
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._created = 0
+        self._recycled = 0
+        self._closed = False
+        self._inherited = []
+        _pools.add(self)
+
+    # ------------------------------------------------------------------
+    # Borrow / return
+    # ------------------------------------------------------------------
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            raw, idle_since, must_open = self._take(deadline)
+            if must_open:
+                try:
+                    raw = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._in_use -= 1
+                        self._lock.notify()
+                    raise
+                with self._lock:
+                    self._created += 1
+                return PooledConnection(self, raw)
+
+            if time.monotonic() - idle_since >= self.health_check_after and not self._healthy(raw):
+                self._drop(raw, in_use=True)
+                continue
+            return PooledConnection(self, raw)
+
+    def _take(self, deadline: float):
+        """Reserve an idle connection or a slot for a new one, waiting if full."""
+        with self._lock:
+            self._waiting += 1
+            try:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout(f"{self.name} pool is closed")
+                    self._evict_expired_locked()
+                    if self._idle:
+                        raw, idle_since = self._idle.pop()
+                        self._in_use += 1
+                        return raw, idle_since, False
+                    if self._size < self.max_size:
+                        self._size += 1
+                        self._in_use += 1
+                        return None, 0.0, True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"{self.name} pool exhausted ({self.max_size} connections in use)"
+                        )
+                    self._lock.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+    def release(self, raw: Any, discard: bool = False):
+        if not discard and self._reset is not None:
+            try:
+                self._reset(raw)
+            except Exception:
+                discard = True
+        if discard or self._closed:
+            self._drop(raw, in_use=True)
+            return
+        with self._lock:
+            self._in_use -= 1
+            self._idle.append((raw, time.monotonic()))
+            self._lock.notify()
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def _healthy(self, raw) -> bool:
+        if self._check is None:
+            return True
+        try:
+            self._check(raw)
+            return True
+        except Exception:
+            return False
+
+    def _drop(self, raw, in_use: bool):
+        with self._lock:
+            self._size -= 1
+            if in_use:
+                self._in_use -= 1
+            self._recycled += 1
+            self._lock.notify()
+        _close_quietly(raw)
+
+    def _evict_expired_locked(self):
+        # Oldest connections sit at the left of the deque.
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size:
+            raw, idle_since = self._idle[0]
+            if now - idle_since < self.idle_timeout:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            self._recycled += 1
+            _close_quietly(raw)
+
+    def fill(self):
+        """Open connections up to min_size (e.g. at startup)."""
+        while True:
+            with self._lock:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                raw = self._connect()
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                raise
+            with self._lock:
+                self._created += 1
+                self._idle.append((raw, time.monotonic()))
+                self._lock.notify()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._lock.notify_all()
+        for raw, _ in idle:
+            _close_quietly(raw)
+
+    def _after_fork(self):
+        """In a forked child: start empty. Inherited connections share their
+        socket with the parent, so they are kept referenced but never used
+        or closed (closing would end the parent's session too)."""
+        self._inherited.extend(raw for raw, _ in self._idle)
+        self._lock = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "created": self._created,
+                "recycled": self._recycled,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            }
+
+
+def _close_quietly(raw):
+    try:
+        raw.close()
+    except Exception:
+        pass
+
+
+# Pools built before a pre-fork server (gunicorn --preload) forks its workers
+_pools = weakref.WeakSet()
+
+
+def _reset_pools_after_fork():
+    for pool in list(_pools):
+        pool._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
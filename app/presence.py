@@ -0,0 +1,300 @@
+"""Live presence of every agent, pushed to dashboards.
+
+The registry holds one entry per user, updated in memory by session start
+and end, the stale-session reaper and activity heartbeats:
+
+    active   session open, last heartbeat said "active"
+    idle     session open, last heartbeat said "idle"
+    away     session open, nothing heard for PRESENCE_AWAY_AFTER seconds
+    offline  no open session
+
+Subscribers (SSE or WebSocket connections) get a full snapshot on connect
+and then change frames. Changes are coalesced: a single broadcaster task
+wakes every PRESENCE_COALESCE seconds, keeps only the latest state per
+user, serialises the frame once and hands the same string to every
+subscriber queue. A subscriber that falls PRESENCE_QUEUE frames behind
+loses its backlog and is sent a fresh snapshot instead, so a slow
+dashboard never holds memory or slows the others.
+
+Users are keyed by their email in lower case, the way MySQL compares
+them, so an agent and a dashboard that spell it differently still meet.
+
+State lives in each process. It is rebuilt from open sessions and the
+latest activity sample on startup, and every PRESENCE_RESYNC seconds when
+that is set, which keeps several workers in step with each other (the
+gunicorn launcher turns it on). On shutdown open streams get a `closing`
+frame so clients reconnect to a live worker.
+"""
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, Optional, Set
+
+from app.database import db, hot_query, TABLE_PREFIX
+from app.logs import get_logger
+from app.server import on_drain
+
+log = get_logger(__name__)
+
+SESSION_TABLE = f"{TABLE_PREFIX}tblsession"
+ACTIVITY_TABLE = f"{TABLE_PREFIX}av_activity"
+
+PRESENCE_COALESCE = float(os.getenv("PRESENCE_COALESCE", "0.5"))
+PRESENCE_AWAY_AFTER = int(os.getenv("PRESENCE_AWAY_AFTER", "180"))
+PRESENCE_QUEUE = int(os.getenv("PRESENCE_QUEUE", "32"))
+PRESENCE_KEEPALIVE = float(os.getenv("PRESENCE_KEEPALIVE", "15"))
+PRESENCE_RESYNC = float(os.getenv("PRESENCE_RESYNC", "0"))  # 0: only at startup
+
+_SWEEP_EVERY = 5.0
+
+# Covered by idx_session_open (status, end_time, user_email)
+OPEN_SESSIONS_QUERY = hot_query("presence.open_sessions", f"""
+    SELECT o.user_email, o.session_id, o.start_time, a.state, a.sample_time, a.app_name
+    FROM (
+        SELECT user_email, MAX(id) AS session_id, MAX(start_time) AS start_time
+        FROM {SESSION_TABLE}
+        WHERE end_time IS NULL AND status = 'active'
+        GROUP BY user_email
+    ) o
+    LEFT JOIN {ACTIVITY_TABLE} a ON a.id = (
+        SELECT a2.id FROM {ACTIVITY_TABLE} a2
+        WHERE a2.user_email = o.user_email AND a2.sample_time >= o.start_time
+        ORDER BY a2.sample_time DESC
+        LIMIT 1
+    )
+""", ())
+
+CLOSING_FRAME = json.dumps({"type": "closing"})
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat(timespec="seconds") if value else None
+
+
+def _user_key(email: str) -> str:
+    return email.strip().lower()
+
+
+def _keys(emails: Optional[FrozenSet[str]]) -> Optional[FrozenSet[str]]:
+    return None if emails is None else frozenset(_user_key(e) for e in emails)
+
+
+class Subscriber:
+    """One connected dashboard; iterate `next_frame()` to get JSON strings."""
+
+    def __init__(self, hub: "PresenceHub", emails: Optional[FrozenSet[str]]):
+        self.hub = hub
+        self.emails = emails
+        self.queue: asyncio.Queue = asyncio.Queue(PRESENCE_QUEUE)
+        self.resync = False
+        self.closed = False
+
+    def offer(self, frame: str):
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Too far behind: drop the backlog, the next read gets a snapshot
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.resync = True
+            self.hub.resyncs += 1
+
+    def close(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(CLOSING_FRAME)
+        self.resync = False
+        self.closed = True
+
+    async def next_frame(self, timeout: Optional[float] = None) -> Optional[str]:
+        """The next frame, or None after `timeout` seconds without one.
+        Stop reading once `closed` is set and the closing frame went out."""
+        if self.resync:
+            self.resync = False
+            return self.hub.snapshot_frame(self.emails)
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class PresenceHub:
+    def __init__(self, coalesce: float = PRESENCE_COALESCE, away_after: int = PRESENCE_AWAY_AFTER):
+        self.coalesce = coalesce
+        self.away_after = timedelta(seconds=away_after)
+        self._users: Dict[str, dict] = {}
+        self._changed: Dict[str, dict] = {}
+        self._subscribers: Set[Subscriber] = set()
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_sweep = 0.0
+
+        self.updates = 0
+        self.frames = 0
+        self.deliveries = 0
+        self.resyncs = 0
+
+    # ------------------------------------------------------------------
+    # Updates (cheap, never touch subscribers directly)
+    # ------------------------------------------------------------------
+
+    def _set(self, email: str, **fields):
+        current = self._users.get(email) or {"email": email, "state": "offline", "session_id": None,
+                                              "since": None, "last_seen": None, "app": None}
+        since = fields.pop("since", None)
+        entry = {**current, **fields}
+        if entry["state"] != current["state"] or since:
+            entry["since"] = since or _iso(datetime.now())
+        self._users[email] = entry
+        self.updates += 1
+        # Heartbeats only move last_seen; dashboards care about state changes
+        if any(entry[k] != current[k] for k in ("state", "session_id", "app")):
+            self._changed[email] = entry
+            self._wakeup.set()
+
+    def session_started(self, email: str, session_id: int, at: datetime):
+        self._set(_user_key(email), state="active", session_id=session_id, since=_iso(at), last_seen=_iso(at))
+
+    def session_ended(self, email: str, session_id: Optional[int] = None, at: Optional[datetime] = None):
+        email = _user_key(email)
+        current = self._users.get(email)
+        if current and session_id is not None and current["session_id"] not in (None, session_id):
+            return  # an older session closed; the user is still in a newer one
+        self._set(email, state="offline", session_id=None, since=_iso(at), app=None)
+
+    def heartbeat(self, email: str, state: str, at: datetime, app: Optional[str] = None):
+        email = _user_key(email)
+        current = self._users.get(email)
+        if not current or current["state"] == "offline":
+            return  # activity without an open session doesn't make anyone present
+        self._set(email, state=state, last_seen=_iso(at), app=app)
+
+    def _sweep(self, now: datetime):
+        cutoff = _iso(now - self.away_after)
+        for email, entry in list(self._users.items()):
+            if entry["state"] in ("active", "idle") and (entry["last_seen"] or "") < cutoff:
+                self._set(email, state="away")
+
+    def _apply(self, rows, now: datetime):
+        open_users = set()
+        for row in rows:
+            email = _user_key(row["user_email"])
+            open_users.add(email)
+            last_seen = row["sample_time"] or row["start_time"]
+            current = self._users.get(email)
+            if current and current["state"] != "offline" and (current["last_seen"] or "") >= _iso(last_seen):
+                continue  # this process heard from the agent more recently
+            recent = row["sample_time"] and now - last_seen < self.away_after
+            fields = {"since": _iso(row["start_time"])} if not current or current["state"] == "offline" else {}
+            self._set(email, state=row["state"] if recent else "away", session_id=row["session_id"],
+                      last_seen=_iso(last_seen), app=row["app_name"], **fields)
+        for email, entry in list(self._users.items()):
+            if entry["state"] != "offline" and email not in open_users:
+                self._set(email, state="offline", session_id=None, app=None)
+
+    async def resync(self) -> int:
+        """Reconcile with the database: open sessions and each one's latest sample."""
+        rows = await db.run(db.fetchall_sync, OPEN_SESSIONS_QUERY)
+        self._apply(rows, datetime.now())
+        return len(rows)
+
+    # ------------------------------------------------------------------
+    # Fan-out
+    # ------------------------------------------------------------------
+
+    def status(self, emails: Optional[FrozenSet[str]] = None) -> list:
+        emails = _keys(emails)
+        users = self._users.values() if emails is None else \
+            (self._users[e] for e in emails if e in self._users)
+        return sorted(users, key=lambda u: u["email"])
+
+    def snapshot_frame(self, emails: Optional[FrozenSet[str]] = None) -> str:
+        return json.dumps({"type": "snapshot", "at": _iso(datetime.now()), "users": self.status(emails)})
+
+    def subscribe(self, emails: Optional[FrozenSet[str]] = None) -> Subscriber:
+        sub = Subscriber(self, _keys(emails))
+        sub.resync = True  # first frame is the snapshot
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self._subscribers.discard(sub)
+
+    def close_subscribers(self):
+        """Tell every open stream to reconnect elsewhere (server draining)."""
+        for sub in list(self._subscribers):
+            sub.close()
+
+    def _broadcast(self):
+        changed, self._changed = self._changed, {}
+        if not changed or not self._subscribers:
+            return
+        at = _iso(datetime.now())
+        frames: Dict[Optional[FrozenSet[str]], Optional[str]] = {}
+        for sub in list(self._subscribers):
+            if sub.emails not in frames:
+                users = list(changed.values()) if sub.emails is None else \
+                    [u for e, u in changed.items() if e in sub.emails]
+                frames[sub.emails] = json.dumps({"type": "update", "at": at, "users": users}) if users else None
+            frame = frames[sub.emails]
+            if frame is not None:
+                sub.offer(frame)
+                self.deliveries += 1
+        self.frames += len([f for f in frames.values() if f])
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last_resync = loop.time()
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), _SWEEP_EVERY)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if loop.time() - self._last_sweep >= _SWEEP_EVERY:
+                self._last_sweep = loop.time()
+                self._sweep(datetime.now())
+            if PRESENCE_RESYNC and loop.time() - last_resync >= PRESENCE_RESYNC:
+                last_resync = loop.time()
+                try:
+                    await self.resync()
+                except Exception:
+                    log.warning("presence_resync_failed", exc_info=True)
+            self._broadcast()
+            # Let a burst of updates pile up into one frame
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.coalesce)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+    def stats(self) -> dict:
+        states: Dict[str, int] = {}
+        for entry in self._users.values():
+            states[entry["state"]] = states.get(entry["state"], 0) + 1
+        return {
+            "users": len(self._users),
+            "subscribers": len(self._subscribers),
+            "updates": self.updates,
+            "frames": self.frames,
+            "deliveries": self.deliveries,
+            "resyncs": self.resyncs,
+            **{f"state_{k}": v for k, v in states.items()},
+        }
+
+
+presence = PresenceHub()
+on_drain(presence.close_subscribers)
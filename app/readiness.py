@@ -0,0 +1,80 @@
+"""Background warm-up and the readiness probe.
+
+Startup only launches tasks; everything that talks to the database runs
+afterwards as concurrent warm-up steps, so the process binds its port at
+once and importing the app never needs a live database. `/health` says
+the process is up; `/ready` answers 503 until every required step has
+succeeded, which is what a load balancer should route on.
+
+Required steps are retried with backoff until they succeed; optional
+ones run once and only log a failure.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi.responses import JSONResponse
+
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+Step = Callable[[], Awaitable[object]]
+
+
+class Readiness:
+    def __init__(self, max_backoff: float = 30.0):
+        self.max_backoff = max_backoff
+        self.status: Dict[str, str] = {}
+        self._required = set()
+        self._task: Optional[asyncio.Task] = None
+        self._started = time.monotonic()
+        self.ready_after: Optional[float] = None
+
+    async def _step(self, name: str, fn: Step, required: bool):
+        delay = 0.5
+        while True:
+            started = time.monotonic()
+            try:
+                await fn()
+                self.status[name] = "ok"
+                if self.ready and self.ready_after is None:
+                    self.ready_after = round(time.monotonic() - self._started, 3)
+                log.info("warmup_step_done", extra={"step": name, "seconds": round(time.monotonic() - started, 3)})
+                return
+            except Exception as exc:
+                self.status[name] = f"failed: {exc.__class__.__name__}"
+                log.warning("warmup_step_failed", exc_info=True, extra={"step": name})
+                if not required:
+                    return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+
+    async def _run(self, steps):
+        await asyncio.gather(*(self._step(name, fn, required) for name, (fn, required) in steps.items()))
+
+    def start(self, required: Dict[str, Step], optional: Optional[Dict[str, Step]] = None):
+        steps = {name: (fn, True) for name, fn in required.items()}
+        steps.update({name: (fn, False) for name, fn in (optional or {}).items()})
+        self._required = set(required)
+        self.status = {name: "pending" for name in steps}
+        self._started = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._run(steps))
+
+    async def stop(self):
+        # Warm-up holds no state worth finishing; a retry loop may never end
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    @property
+    def ready(self) -> bool:
+        return self._task is not None and all(self.status.get(name) == "ok" for name in self._required)
+
+    def response(self) -> JSONResponse:
+        ready = self.ready
+        return JSONResponse(
+            {"ready": ready, "ready_after_seconds": self.ready_after, "steps": self.status},
+            status_code=200 if ready else 503,
+        )
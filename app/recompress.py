@@ -0,0 +1,308 @@
+"""Background recompression of uploaded screenshots.
+
+Agents send lossless PNGs of 1-3 MB. After an upload is stored the row is
+queued here, and a fixed number of workers re-encode it as WebP, AVIF or
+JPEG at RECOMPRESS_QUALITY, downsampled to RECOMPRESS_MAX_PX on the long
+side if set. The result replaces the original only when it is smaller;
+every row pointing at the old blob is repointed, and the users' dedupe
+frames are reloaded so new duplicates point at the new blob.
+
+The old blob is not deleted inline: an upload that matched it a moment
+earlier may still be about to insert a row pointing at it. It is retired
+instead, and a collector deletes it RECOMPRESS_DELETE_GRACE seconds later
+if no row references it by then. Retention and partition drops release
+blobs the same way (`retire`), since the same uploads race them. Retired
+blobs still pending when the process exits are left on disk.
+
+The queue is bounded. When it is full the upload still succeeds and the
+row simply keeps its PNG; `python -m app.cli recompress` picks up
+anything left behind.
+"""
+import asyncio
+import io
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Optional, Tuple
+
+from PIL import Image, features
+
+from app.blobstore import blob_store
+from app.database import db, TABLE_PREFIX
+from app.dedupe import dedupe_index
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+SNAP_TABLE = f"{TABLE_PREFIX}av_tblsnap"
+
+RECOMPRESS_ENABLED = os.getenv("RECOMPRESS_ENABLED", "1") == "1"
+RECOMPRESS_FORMAT = os.getenv("RECOMPRESS_FORMAT", "WEBP").upper()  # WEBP, AVIF or JPEG
+RECOMPRESS_QUALITY = int(os.getenv("RECOMPRESS_QUALITY", "80"))
+RECOMPRESS_MAX_PX = int(os.getenv("RECOMPRESS_MAX_PX", "0"))  # 0 keeps full resolution
+RECOMPRESS_WORKERS = int(os.getenv("RECOMPRESS_WORKERS", "2"))
+RECOMPRESS_QUEUE = int(os.getenv("RECOMPRESS_QUEUE", "1000"))
+RECOMPRESS_DELETE_GRACE = float(os.getenv("RECOMPRESS_DELETE_GRACE", "300"))
+
+CONTENT_TYPES = {"WEBP": "image/webp", "AVIF": "image/avif", "JPEG": "image/jpeg"}
+
+# Only lossless sources are worth re-encoding
+SOURCE_TYPES = ("image/png", "image/bmp", "image/tiff")
+
+
+def _output_format(fmt: str) -> str:
+    if fmt == "AVIF" and not features.check("avif"):
+        log.warning("avif_unavailable", extra={"fallback": "WEBP"})
+        return "WEBP"
+    if fmt not in CONTENT_TYPES:
+        raise ValueError(f"unsupported recompression format: {fmt}")
+    return fmt
+
+
+def encode(source, fmt: str = "WEBP", quality: int = 80, max_px: int = 0) -> Tuple[bytes, str]:
+    """Re-encode an image file object; returns (bytes, content type)."""
+    with Image.open(source) as img:
+        if max_px:
+            img.draft("RGB", (max_px, max_px))
+        img = img.convert("RGB")
+        if max_px and max(img.size) > max_px:
+            img.thumbnail((max_px, max_px), Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        if fmt == "JPEG":
+            img.save(out, format=fmt, quality=quality, optimize=True, progressive=True)
+        elif fmt == "WEBP":
+            img.save(out, format=fmt, quality=quality, method=4)
+        else:
+            img.save(out, format=fmt, quality=quality)
+        return out.getvalue(), CONTENT_TYPES[fmt]
+
+
+class Recompressor:
+    def __init__(self, fmt: str = "WEBP", quality: int = 80, max_px: int = 0,
+                 workers: int = 2, max_queue: int = 1000, delete_grace: float = 300.0):
+        self.fmt = _output_format(fmt)
+        self.quality = quality
+        self.max_px = max_px
+        self.workers = workers
+        self.max_queue = max_queue
+        self.delete_grace = delete_grace
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="recompress")
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._collector_task: Optional[asyncio.Task] = None
+        # (deletable after, blob key), oldest first
+        self._retired: Deque[Tuple[float, str]] = deque()
+        self._retired_lock = threading.Lock()
+
+        self.queued = 0
+        self.dropped = 0
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.blobs_deleted = 0
+
+    # ------------------------------------------------------------------
+    # Work
+    # ------------------------------------------------------------------
+
+    def recompress_row(self, screenshot_id: int, blob_key: str) -> Optional[int]:
+        """Re-encode one stored screenshot. Returns bytes saved, or None if kept as is."""
+        with blob_store.open(blob_key) as f:
+            original = f.seek(0, io.SEEK_END)
+            f.seek(0)
+            try:
+                data, content_type = encode(f, self.fmt, self.quality, self.max_px)
+            except (OSError, ValueError, Image.DecompressionBombError):
+                self.skipped += 1
+                return None
+        if len(data) >= original:
+            self.skipped += 1
+            return None
+
+        info = blob_store.put_bytes(data)
+        # Exact re-uploads and dedupe references share the blob: move them all
+        db.execute_sync(f"""
+            UPDATE {SNAP_TABLE} SET blob_key = %s, content_type = %s, size_bytes = %s
+            WHERE blob_key = %s
+        """, (info.key, content_type, info.size, blob_key))
+        # Their cached dedupe frames still name the old blob; reload them from the rows
+        for row in db.fetchall_sync(f"SELECT DISTINCT user_id FROM {SNAP_TABLE} WHERE blob_key = %s",
+                                    (info.key,)):
+            dedupe_index.forget(row["user_id"])
+        self.retire(blob_key)
+
+        self.processed += 1
+        self.bytes_before += original
+        self.bytes_after += info.size
+        log.info("screenshot_recompressed", extra={
+            "screenshot_id": screenshot_id, "before": original, "after": info.size
+        })
+        return original - info.size
+
+    def retire(self, blob_key: str):
+        """Delete `blob_key` after the grace period, unless a row uses it by then."""
+        with self._retired_lock:
+            self._retired.append((time.monotonic() + self.delete_grace, blob_key))
+
+    def collect(self, now: Optional[float] = None) -> int:
+        """Delete retired blobs past their grace period that no row references.
+        Returns the number deleted."""
+        now = time.monotonic() if now is None else now
+        due = []
+        with self._retired_lock:
+            while self._retired and self._retired[0][0] <= now:
+                due.append(self._retired.popleft()[1])
+        deleted = 0
+        for key in due:
+            # An upload that matched the old frame, or re-sent the same PNG, keeps it alive
+            if db.fetchone_sync(
+                f"SELECT 1 AS used FROM {SNAP_TABLE} WHERE blob_key = %s OR thumb_key = %s LIMIT 1", (key, key)
+            ):
+                continue
+            if blob_store.delete(key):
+                deleted += 1
+        self.blobs_deleted += deleted
+        return deleted
+
+    def retired_until(self) -> Optional[float]:
+        """Monotonic time the newest retired blob becomes deletable, if any."""
+        with self._retired_lock:
+            return self._retired[-1][0] if self._retired else None
+
+    def drain(self) -> int:
+        """Wait until every retired blob is due, then collect them. For CLI
+        runs, which have no collector task. Returns the number deleted."""
+        until = self.retired_until()
+        if until is None:
+            return 0
+        wait = max(0.0, until - time.monotonic())
+        log.info("retired_blobs_waiting", extra={"delete_in_seconds": round(wait)})
+        time.sleep(wait)
+        return self.collect()
+
+    async def _collector(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(min(self.delete_grace, 60))
+            try:
+                await loop.run_in_executor(self._executor, self.collect)
+            except Exception:
+                log.warning("recompress_collect_failed", exc_info=True)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            screenshot_id, blob_key = await self._queue.get()
+            try:
+                await loop.run_in_executor(self._executor, self.recompress_row, screenshot_id, blob_key)
+            except Exception:
+                self.failed += 1
+                log.warning("recompress_failed", exc_info=True, extra={"screenshot_id": screenshot_id})
+            finally:
+                self._queue.task_done()
+
+    # ------------------------------------------------------------------
+    # Producer side / lifecycle
+    # ------------------------------------------------------------------
+
+    def submit(self, screenshot_id: int, blob_key: str, content_type: Optional[str]) -> bool:
+        """Queue a freshly stored screenshot. Never blocks the upload."""
+        if self._queue is None or content_type not in SOURCE_TYPES:
+            return False
+        try:
+            self._queue.put_nowait((screenshot_id, blob_key))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.queued += 1
+        return True
+
+    def start(self):
+        if not self._tasks:
+            self._queue = asyncio.Queue(self.max_queue)
+            loop = asyncio.get_running_loop()
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        self.start_collector()
+
+    def start_collector(self):
+        """Run only the collector, for processes that retire blobs without recompressing."""
+        if self._collector_task is None:
+            self._collector_task = asyncio.get_running_loop().create_task(self._collector())
+
+    async def stop(self, timeout: float = 10.0):
+        """Finish queued work for up to `timeout` seconds, then stop the workers.
+        Whatever is left keeps its original encoding."""
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                log.warning("recompress_queue_abandoned", extra={"pending": self._queue.qsize()})
+        if self._collector_task is not None:
+            self._tasks.append(self._collector_task)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._collector_task = None
+        self._queue = None
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "bytes_saved": self.bytes_before - self.bytes_after,
+            "blobs_retired": len(self._retired),
+            "blobs_deleted": self.blobs_deleted,
+        }
+
+
+recompressor = Recompressor(
+    fmt=RECOMPRESS_FORMAT,
+    quality=RECOMPRESS_QUALITY,
+    max_px=RECOMPRESS_MAX_PX,
+    workers=RECOMPRESS_WORKERS,
+    max_queue=RECOMPRESS_QUEUE,
+    delete_grace=RECOMPRESS_DELETE_GRACE,
+)
+
+
+def backfill(batch_size: int = 100, limit: Optional[int] = None) -> int:
+    """Recompress stored lossless screenshots in id order, then wait out the
+    grace period and delete the originals nothing uses. Returns rows processed."""
+    done = 0
+    last_id = 0
+    types = ", ".join(["%s"] * len(SOURCE_TYPES))
+    while limit is None or done < limit:
+        size = batch_size if limit is None else min(batch_size, limit - done)
+        rows = db.fetchall_sync(f"""
+            SELECT id, blob_key FROM {SNAP_TABLE}
+            WHERE id > %s AND ref_id IS NULL AND blob_key IS NOT NULL AND content_type IN ({types})
+            ORDER BY id
+            LIMIT %s
+        """, (last_id, *SOURCE_TYPES, size))
+        if not rows:
+            break
+        for row in rows:
+            try:
+                recompressor.recompress_row(row["id"], row["blob_key"])
+            except FileNotFoundError:
+                recompressor.skipped += 1
+            last_id = row["id"]
+            done += 1
+        recompressor.collect()
+        log.info("recompress_backfill_progress", extra={
+            "done": done, "last_id": last_id, "bytes_saved": recompressor.stats()["bytes_saved"]
+        })
+
+    recompressor.drain()
+    return done
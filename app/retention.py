@@ -0,0 +1,373 @@
+"""Retention and archival.
+
+Per-account policies (rows of the retention_policies table, keyed by
+email; anything unset falls back to the RETAIN_* defaults, 0 = keep
+forever):
+
+    screenshot_days  full-resolution images move into tar.gz bundles under
+                     ARCHIVE_PATH; the row keeps its thumbnail
+    thumbnail_days   screenshot rows and thumbnails are deleted
+    session_days     closed sessions are deleted; their time stays in the
+                     daily rollup
+    activity_days    raw activity samples are deleted
+
+Work is done RETENTION_BATCH rows at a time, each batch its own short
+statement followed by a pause, so no run holds locks for long. A MySQL
+named lock keeps a single runner across workers. `run(dry_run=True)`
+only reports what would be archived or deleted. Blobs left unreferenced
+are handed to the recompress collector rather than deleted inline. The
+scheduler also runs partition maintenance (see app.partitions) after
+each pass.
+"""
+import asyncio
+import io
+import json
+import os
+import re
+import tarfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from app import partitions
+from app.blobstore import blob_store
+from app.database import db, TABLE_PREFIX
+from app.logs import get_logger
+from app.recompress import recompressor
+
+log = get_logger(__name__)
+
+POLICY_TABLE = f"{TABLE_PREFIX}retention_policies"
+SNAP_TABLE = f"{TABLE_PREFIX}av_tblsnap"
+SESSION_TABLE = f"{TABLE_PREFIX}tblsession"
+ACTIVITY_TABLE = f"{TABLE_PREFIX}av_activity"
+
+ARCHIVE_PATH = os.getenv("ARCHIVE_PATH", "./data/archive")
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "0") == "1"
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", str(24 * 3600)))
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", "500"))
+RETENTION_PAUSE = float(os.getenv("RETENTION_PAUSE", "0.05"))
+
+_LOCK_NAME = "av_retention"
+
+
+class Policy(NamedTuple):
+    screenshot_days: int
+    thumbnail_days: int
+    session_days: int
+    activity_days: int
+
+
+DEFAULT_POLICY = Policy(
+    screenshot_days=int(os.getenv("RETAIN_SCREENSHOT_DAYS", "30")),
+    thumbnail_days=int(os.getenv("RETAIN_THUMBNAIL_DAYS", "365")),
+    session_days=int(os.getenv("RETAIN_SESSION_DAYS", "0")),
+    activity_days=int(os.getenv("RETAIN_ACTIVITY_DAYS", "90")),
+)
+
+
+def load_policies(cursor) -> Dict[str, Policy]:
+    cursor.execute(f"SELECT * FROM {POLICY_TABLE}")
+    rows = cursor.fetchall()
+    return {
+        row["email"]: Policy(*(
+            row[field] if row[field] is not None else getattr(DEFAULT_POLICY, field)
+            for field in Policy._fields
+        ))
+        for row in rows
+    }
+
+
+def _scopes(policies: Dict[str, Policy], email: Optional[str]):
+    """(policy, SQL filter on the user column, params): explicit accounts
+    one by one, then everyone else under the default policy."""
+    if email:
+        yield policies.get(email, DEFAULT_POLICY), "{col} = %s", [email]
+        return
+    for account, policy in policies.items():
+        yield policy, "{col} = %s", [account]
+    if policies:
+        yield DEFAULT_POLICY, f"{{col}} NOT IN ({', '.join(['%s'] * len(policies))})", list(policies)
+    else:
+        yield DEFAULT_POLICY, "1 = 1", []
+
+
+def _in(ids) -> str:
+    return ", ".join(["%s"] * len(ids))
+
+
+def _release_blobs(cursor, keys) -> int:
+    """Retire blobs no screenshot row points at any more. Returns how many.
+
+    They are not deleted here: an upload that just matched one, or re-sent
+    the same image, may be about to insert a row using it. The recompress
+    collector deletes them after the grace period if they are still unused."""
+    retired = 0
+    for key in set(k for k in keys if k):
+        cursor.execute(
+            f"SELECT 1 AS used FROM {SNAP_TABLE} WHERE blob_key = %s OR thumb_key = %s LIMIT 1", (key, key)
+        )
+        if cursor.fetchall():
+            continue
+        recompressor.retire(key)
+        retired += 1
+    return retired
+
+
+class RetentionRun:
+    """One pass over `conn`, a direct connection: a run takes minutes and
+    must not hold a pooled connection that requests are waiting for."""
+
+    def __init__(self, conn, dry_run: bool = False, batch_size: int = RETENTION_BATCH,
+                 pause: float = RETENTION_PAUSE, now: Optional[datetime] = None,
+                 should_stop: Callable[[], bool] = lambda: False):
+        self.cursor = conn.cursor(dictionary=True, buffered=True)
+        self.dry_run = dry_run
+        self.should_stop = should_stop
+        self.batch_size = batch_size
+        self.pause = pause
+        self.now = now or datetime.now()
+        self.report = {
+            "dry_run": dry_run,
+            "screenshots_archived": 0,
+            "bytes_archived": 0,
+            "screenshots_deleted": 0,
+            "sessions_deleted": 0,
+            "activity_deleted": 0,
+            "blobs_retired": 0,
+            "bundles": [],
+        }
+
+    def _fetchall(self, query: str, params=()) -> list:
+        self.cursor.execute(query, params)
+        return self.cursor.fetchall()
+
+    def _fetchone(self, query: str, params=()) -> Optional[dict]:
+        rows = self._fetchall(query, params)
+        return rows[0] if rows else None
+
+    def _execute(self, query: str, params=()):
+        self.cursor.execute(query, params)
+
+    def _cutoff(self, days: int) -> Optional[datetime]:
+        return self.now - timedelta(days=days) if days else None
+
+    def _batches(self, table: str, where: str, params: list, columns: str = "id"):
+        """Yield batches of rows matching `where`, lowest id first. Callers
+        must change or delete each batch, or the same rows come back."""
+        while not self.should_stop():
+            rows = self._fetchall(f"""
+                SELECT {columns} FROM {table} WHERE {where} ORDER BY id LIMIT %s
+            """, (*params, self.batch_size))
+            if not rows:
+                return
+            yield rows
+            if len(rows) < self.batch_size:
+                return
+            time.sleep(self.pause)
+
+    # ------------------------------------------------------------------
+    # Stages
+    # ------------------------------------------------------------------
+
+    def archive_screenshots(self, cutoff: datetime, user_filter: str, params: list,
+                            not_before: Optional[datetime] = None):
+        where = f"capture_time < %s AND archived_at IS NULL AND {user_filter.format(col='user_id')}"
+        where_params = [cutoff, *params]
+        if not_before:  # older rows are deleted outright
+            where += " AND capture_time >= %s"
+            where_params.append(not_before)
+        if self.dry_run:
+            row = self._fetchone(f"""
+                SELECT COUNT(*) AS n,
+                       COALESCE(SUM(CASE WHEN ref_id IS NULL THEN size_bytes END), 0) AS bytes
+                FROM {SNAP_TABLE}
+                WHERE {where} AND (blob_key IS NOT NULL OR screenshot_data IS NOT NULL)
+            """, where_params)
+            self.report["screenshots_archived"] += int(row["n"])
+            self.report["bytes_archived"] += int(row["bytes"])
+            return
+
+        where += " AND (blob_key IS NOT NULL OR screenshot_data IS NOT NULL)"
+        for rows in self._batches(SNAP_TABLE, where, where_params,
+                                  "id, user_id, capture_time, blob_key, content_type, screenshot_data"):
+            groups: Dict[tuple, List[dict]] = {}
+            for row in rows:
+                groups.setdefault((row["user_id"], row["capture_time"].strftime("%Y-%m")), []).append(row)
+            for (user, month), group in groups.items():
+                bundle = self._write_bundle(user, month, group)
+                ids = [r["id"] for r in group]
+                self._execute(f"""
+                    UPDATE {SNAP_TABLE}
+                    SET blob_key = NULL, screenshot_data = NULL, archive_bundle = %s, archived_at = %s
+                    WHERE id IN ({_in(ids)})
+                """, (bundle, self.now, *ids))
+                self.report["bundles"].append(bundle)
+            self.report["screenshots_archived"] += len(rows)
+            self.report["blobs_retired"] += _release_blobs(self.cursor, (r["blob_key"] for r in rows))
+
+    def _write_bundle(self, user: str, month: str, rows: List[dict]) -> str:
+        """One tar.gz per (user, month, batch): the images by blob key plus a manifest."""
+        safe_user = re.sub(r"[^A-Za-z0-9@._-]", "_", user)
+        directory = os.path.join(ARCHIVE_PATH, safe_user, month)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{rows[0]['id']}-{rows[-1]['id']}.tar.gz")
+        tmp = path + ".tmp"
+        manifest = []
+        written = set()
+        with tarfile.open(tmp, "w:gz", compresslevel=6) as tar:
+            for row in rows:
+                if row["blob_key"]:
+                    name = row["blob_key"]
+                    if name not in written:
+                        try:
+                            with blob_store.open(name) as f:
+                                data = f.read()
+                        except FileNotFoundError:
+                            data = None
+                        if data is not None:
+                            self._add(tar, name, data)
+                            written.add(name)
+                            self.report["bytes_archived"] += len(data)
+                else:
+                    name = f"legacy-{row['id']}"
+                    self._add(tar, name, row["screenshot_data"])
+                    written.add(name)
+                    self.report["bytes_archived"] += len(row["screenshot_data"])
+                manifest.append({
+                    "id": row["id"], "user_email": user, "capture_time": row["capture_time"].isoformat(),
+                    "content_type": row["content_type"], "member": name if name in written else None,
+                })
+            self._add(tar, "manifest.json", json.dumps(manifest, indent=1).encode())
+        os.replace(tmp, path)
+        return path
+
+    @staticmethod
+    def _add(tar: tarfile.TarFile, name: str, data: bytes):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        tar.addfile(info, io.BytesIO(data))
+
+    def delete_screenshots(self, cutoff: datetime, user_filter: str, params: list):
+        where = f"capture_time < %s AND {user_filter.format(col='user_id')}"
+        where_params = [cutoff, *params]
+        if self.dry_run:
+            row = self._fetchone(f"SELECT COUNT(*) AS n FROM {SNAP_TABLE} WHERE {where}", where_params)
+            self.report["screenshots_deleted"] += int(row["n"])
+            return
+        for rows in self._batches(SNAP_TABLE, where, where_params, "id, blob_key, thumb_key"):
+            ids = [r["id"] for r in rows]
+            self._execute(f"DELETE FROM {SNAP_TABLE} WHERE id IN ({_in(ids)})", ids)
+            self.report["screenshots_deleted"] += len(rows)
+            keys = [r["blob_key"] for r in rows] + [r["thumb_key"] for r in rows]
+            self.report["blobs_retired"] += _release_blobs(self.cursor, keys)
+
+    def delete_rows(self, table: str, counter: str, where: str, params: list):
+        if self.dry_run:
+            row = self._fetchone(f"SELECT COUNT(*) AS n FROM {table} WHERE {where}", params)
+            self.report[counter] += int(row["n"])
+            return
+        for rows in self._batches(table, where, params):
+            ids = [r["id"] for r in rows]
+            self._execute(f"DELETE FROM {table} WHERE id IN ({_in(ids)})", ids)
+            self.report[counter] += len(rows)
+
+    # ------------------------------------------------------------------
+
+    def execute(self, email: Optional[str] = None) -> dict:
+        for policy, user_filter, params in _scopes(load_policies(self.cursor), email):
+            delete_before = self._cutoff(policy.thumbnail_days)
+            if delete_before:
+                self.delete_screenshots(delete_before, user_filter, params)
+            cutoff = self._cutoff(policy.screenshot_days)
+            if cutoff:
+                self.archive_screenshots(cutoff, user_filter, params, not_before=delete_before)
+            cutoff = self._cutoff(policy.session_days)
+            if cutoff:
+                # Only closed sessions; the rollup keeps their time
+                self.delete_rows(SESSION_TABLE, "sessions_deleted",
+                                 f"start_time < %s AND end_time IS NOT NULL AND {user_filter.format(col='user_email')}",
+                                 [cutoff, *params])
+            cutoff = self._cutoff(policy.activity_days)
+            if cutoff:
+                self.delete_rows(ACTIVITY_TABLE, "activity_deleted",
+                                 f"sample_time < %s AND {user_filter.format(col='user_email')}",
+                                 [cutoff, *params])
+        return self.report
+
+
+def run(dry_run: bool = False, email: Optional[str] = None,
+        should_stop: Callable[[], bool] = lambda: False) -> Optional[dict]:
+    """One retention pass. Returns the report, or None if another worker holds the lock.
+    `should_stop` is checked between batches; the next run picks up the rest."""
+    conn = db.connect_direct()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (_LOCK_NAME,))
+        if not cursor.fetchone()[0]:
+            log.info("retention_skipped_locked")
+            return None
+        try:
+            report = RetentionRun(conn, dry_run=dry_run, should_stop=should_stop).execute(email)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (_LOCK_NAME,))
+            cursor.fetchone()
+    finally:
+        conn.close()
+    log.info("retention_done", extra={k: v for k, v in report.items() if k != "bundles"})
+    return report
+
+
+class RetentionScheduler:
+    """Runs a retention pass every `interval` seconds in the background.
+    Passes run on their own thread, not the DB executor: they use direct
+    connections, and would otherwise keep a DB thread busy for minutes."""
+
+    def __init__(self, interval: float = RETENTION_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self.runs = 0
+        self.failures = 0
+        self.last_report: Optional[dict] = None
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                report = await asyncio.to_thread(run, False, None, self._stopping.is_set)
+                if report is not None:
+                    self.runs += 1
+                    self.last_report = report
+            except Exception:
+                self.failures += 1
+                log.warning("retention_failed", exc_info=True)
+            try:
+                await asyncio.to_thread(partitions.maintain)
+            except Exception:
+                log.warning("partition_maintenance_failed", exc_info=True)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        # A pass in progress stops after its current batch
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    def stats(self) -> dict:
+        stats = {"runs": self.runs, "failures": self.failures}
+        if self.last_report:
+            stats.update({k: v for k, v in self.last_report.items() if isinstance(v, int) and k != "dry_run"})
+        return stats
+
+
+retention_scheduler = RetentionScheduler()
@@ -0,0 +1,296 @@
+"""Per-user, per-day activity rollup.
+
+Each row of av_daily_activity summarises one user's day: tracked seconds of
+closed sessions, session count, first/last activity and manual seconds.
+Sessions still open are carried as `open_count` and `open_start_sum` (sum of
+their start UNIX timestamps), so live time is
+`open_count * UNIX_TIMESTAMP() - open_start_sum` without touching tblsession.
+
+Sessions and manual logs count towards the day they start on, the same way
+the dashboards have always grouped them.
+"""
+import functools
+import os
+from datetime import datetime
+from typing import Optional
+
+from app.cache import ResultCache
+from app.database import db, hot_query, TABLE_PREFIX
+from app.logs import get_logger
+
+log = get_logger(__name__)
+
+ROLLUP_TABLE = f"{TABLE_PREFIX}av_daily_activity"
+SESSION_TABLE = f"{TABLE_PREFIX}tblsession"
+MANUAL_TABLE = f"{TABLE_PREFIX}av_manual_logs"
+
+# Seconds worked on a rollup row, counting open sessions up to now
+LIVE_SECONDS = "(tracked_seconds + open_count * UNIX_TIMESTAMP() - open_start_sum)"
+
+# Per-user dashboard responses. Every incremental update below drops the
+# user's entries; the TTL bounds how stale live (open-session) time gets.
+dashboard_cache = ResultCache(
+    maxsize=int(os.getenv("DASHBOARD_CACHE_SIZE", "5000")),
+    ttl=float(os.getenv("DASHBOARD_CACHE_TTL", "30")),
+    name="dashboard",
+)
+
+
+def cache_scope(user_email: str) -> str:
+    return user_email.strip().lower()
+
+
+# ------------------------------------------------------------------
+# Incremental maintenance
+# ------------------------------------------------------------------
+
+def _best_effort(fn):
+    # The source row is already written; a failed rollup update must not
+    # fail the request. `rebuild` repairs any drift.
+    @functools.wraps(fn)
+    async def wrapper(user_email: str, *args, **kwargs):
+        try:
+            await fn(user_email, *args, **kwargs)
+        except Exception:
+            log.warning("rollup_update_failed", exc_info=True, extra={"update": fn.__name__})
+        finally:
+            dashboard_cache.invalidate(cache_scope(user_email))
+    return wrapper
+
+
+@_best_effort
+async def session_started(user_email: str, start_time: datetime):
+    await db.execute(f"""
+        INSERT INTO {ROLLUP_TABLE}
+            (user_email, day, session_count, first_activity, open_count, open_start_sum)
+        VALUES (%s, DATE(%s), 1, %s, 1, UNIX_TIMESTAMP(%s))
+        ON DUPLICATE KEY UPDATE
+            session_count = session_count + 1,
+            first_activity = LEAST(COALESCE(first_activity, VALUES(first_activity)), VALUES(first_activity)),
+            open_count = open_count + 1,
+            open_start_sum = open_start_sum + VALUES(open_start_sum)
+    """, (user_email, start_time, start_time, start_time))
+
+
+@_best_effort
+async def session_ended(user_email: str, start_time: datetime, end_time: datetime,
+                        previous_end: Optional[datetime] = None):
+    """Fold a closed session into its day. `previous_end` is set when an
+    already-closed session is ended again, so only the difference is added."""
+    if previous_end is None:
+        await db.execute(f"""
+            UPDATE {ROLLUP_TABLE}
+            SET tracked_seconds = tracked_seconds + TIMESTAMPDIFF(SECOND, %s, %s),
+                last_activity = GREATEST(COALESCE(last_activity, %s), %s),
+                open_count = open_count - 1,
+                open_start_sum = open_start_sum - UNIX_TIMESTAMP(%s)
+            WHERE user_email = %s AND day = DATE(%s)
+        """, (start_time, end_time, end_time, end_time, start_time, user_email, start_time))
+    else:
+        await db.execute(f"""
+            UPDATE {ROLLUP_TABLE}
+            SET tracked_seconds = tracked_seconds + TIMESTAMPDIFF(SECOND, %s, %s),
+                last_activity = GREATEST(COALESCE(last_activity, %s), %s)
+            WHERE user_email = %s AND day = DATE(%s)
+        """, (previous_end, end_time, end_time, end_time, user_email, start_time))
+
+
+@_best_effort
+async def manual_log_changed(user_email: str, start_time, end_time, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) a manual log's duration.
+    Times may be datetimes or the strings the API accepted."""
+    await db.execute(f"""
+        INSERT INTO {ROLLUP_TABLE} (user_email, day, manual_seconds)
+        VALUES (%s, DATE(%s), %s * TIMESTAMPDIFF(SECOND, %s, %s))
+        ON DUPLICATE KEY UPDATE manual_seconds = manual_seconds + VALUES(manual_seconds)
+    """, (user_email, start_time, sign, start_time, end_time))
+
+
+# ------------------------------------------------------------------
+# Backfill / rebuild
+# ------------------------------------------------------------------
+
+def rebuild_user(user_email: str):
+    """Recompute one user's rollup rows from the source tables. Days before
+    the oldest remaining session are kept: retention may have deleted the
+    sessions they summarise."""
+    conn = db.get_connection()
+    try:
+        conn.start_transaction()
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT MIN(start_time) FROM {SESSION_TABLE} WHERE user_email = %s", (user_email,))
+        oldest = cursor.fetchone()[0]
+        if oldest is not None:
+            cursor.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE user_email = %s AND day >= DATE(%s)",
+                           (user_email, oldest))
+        cursor.execute(f"""
+            INSERT INTO {ROLLUP_TABLE}
+                (user_email, day, tracked_seconds, session_count, first_activity, last_activity,
+                 open_count, open_start_sum)
+            SELECT user_email, DATE(start_time),
+                   COALESCE(SUM(CASE WHEN end_time IS NOT NULL
+                                     THEN TIMESTAMPDIFF(SECOND, start_time, end_time) END), 0),
+                   COUNT(*),
+                   MIN(start_time),
+                   MAX(end_time),
+                   SUM(end_time IS NULL),
+                   COALESCE(SUM(CASE WHEN end_time IS NULL THEN UNIX_TIMESTAMP(start_time) END), 0)
+            FROM {SESSION_TABLE}
+            WHERE user_email = %s AND status IN ('completed', 'active')
+            GROUP BY user_email, DATE(start_time)
+        """, (user_email,))
+        cursor.execute(f"""
+            INSERT INTO {ROLLUP_TABLE} (user_email, day, manual_seconds)
+            SELECT user_email, DATE(start_time), SUM(TIMESTAMPDIFF(SECOND, start_time, end_time))
+            FROM {MANUAL_TABLE}
+            WHERE user_email = %s
+            GROUP BY user_email, DATE(start_time)
+            ON DUPLICATE KEY UPDATE manual_seconds = VALUES(manual_seconds)
+        """, (user_email,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def rebuild(user_email: Optional[str] = None) -> int:
+    """Rebuild one user, or everyone who has sessions or manual logs.
+    Each user is its own short transaction. Returns the number of users."""
+    if user_email:
+        emails = [user_email]
+    else:
+        rows = db.fetchall_sync(f"""
+            SELECT user_email FROM {SESSION_TABLE}
+            UNION
+            SELECT user_email FROM {MANUAL_TABLE}
+        """, dictionary=False)
+        emails = [r[0] for r in rows]
+
+    for i, email in enumerate(emails, 1):
+        rebuild_user(email)
+        if i % 100 == 0:
+            log.info("rollup_rebuild_progress", extra={"users_done": i, "users_total": len(emails)})
+    return len(emails)
+
+
+# ------------------------------------------------------------------
+# Reads
+# ------------------------------------------------------------------
+
+DAILY_TOTALS_QUERY = hot_query("dashboard.daily", f"""
+    SELECT day AS date,
+           SEC_TO_TIME({LIVE_SECONDS}) AS total_hours,
+           session_count AS sessions,
+           {LIVE_SECONDS} AS total_seconds
+    FROM {ROLLUP_TABLE}
+    WHERE user_email = %s AND day BETWEEN %s AND %s AND session_count > 0
+    ORDER BY day DESC
+""", ("probe@example.com", "2026-01-01", "2026-01-31"))
+
+
+async def daily_totals(email: str, start_date: str, end_date: str) -> list:
+    return await db.fetchall(DAILY_TOTALS_QUERY, (email, start_date, end_date))
+
+
+
+# ------------------------------------------------------------------
+# Team reads: many users, two queries
+# ------------------------------------------------------------------
+
+# Team figures come from the rollup alone: `logged_seconds` is session time
+# plus manual time as logged, without the idle gaps and overlaps that
+# timeline.compute removes from `worked_seconds`.
+TEAM_SORTS = {
+    "hours": "logged_seconds",
+    "tracked": "tracked_seconds",
+    "manual": "manual_seconds",
+    "email": "u.email",
+}
+
+_TEAM_TOTALS = f"""
+    SELECT u.email AS user_email,
+           COALESCE(SUM({LIVE_SECONDS}), 0) AS tracked_seconds,
+           COALESCE(SUM(r.manual_seconds), 0) AS manual_seconds,
+           COALESCE(SUM({LIVE_SECONDS} + r.manual_seconds), 0) AS logged_seconds,
+           COALESCE(SUM(r.session_count), 0) AS sessions,
+           COUNT(r.day) AS active_days,
+           COUNT(*) OVER () AS total_users
+    FROM av_user u
+    LEFT JOIN {ROLLUP_TABLE} r ON r.user_email = u.email AND r.day BETWEEN %s AND %s
+    WHERE u.status = 'Active' {{user_filter}}
+    GROUP BY u.email
+    ORDER BY {{order}}
+    LIMIT %s OFFSET %s
+"""
+
+_TEAM_COUNT = """
+    SELECT COUNT(*) AS total_users FROM av_user u WHERE u.status = 'Active' {user_filter}
+"""
+
+TEAM_TOTALS_QUERY = hot_query(
+    "team.totals",
+    _TEAM_TOTALS.format(user_filter="", order="logged_seconds DESC, u.email"),
+    ("2026-01-01", "2026-01-31", 50, 0),
+)
+
+
+def _in_list(values) -> str:
+    return ", ".join(["%s"] * len(values))
+
+
+async def team_totals(emails: Optional[list], start_date, end_date, sort: str = "hours",
+                      descending: bool = True, limit: int = 50, offset: int = 0) -> dict:
+    """One page of per-user totals for `emails`, or every active user.
+    Returns {"total": users matched, "users": [...]}."""
+    user_filter = f"AND u.email IN ({_in_list(emails)})" if emails else ""
+    order = f"{TEAM_SORTS[sort]} {'DESC' if descending else 'ASC'}"
+    if sort != "email":
+        order += ", u.email"  # stable pages when totals tie
+    rows = await db.fetchall(
+        _TEAM_TOTALS.format(user_filter=user_filter, order=order),
+        (start_date, end_date, *(emails or ()), limit, offset)
+    )
+    if rows:
+        total = int(rows[0]["total_users"])
+    elif offset:
+        # Paged past the end: the window count came back with no rows
+        row = await db.fetchone(_TEAM_COUNT.format(user_filter=user_filter), tuple(emails or ()))
+        total = int(row["total_users"])
+    else:
+        total = 0
+    users = [
+        {key: (value if key == "user_email" else int(value))
+         for key, value in row.items() if key != "total_users"}
+        for row in rows
+    ]
+    return {"total": total, "users": users}
+
+
+async def team_daily(emails: list, start_date, end_date) -> dict:
+    """Per-day rows for each of `emails`, keyed by email as given. Emails
+    match case-insensitively, like the database compares them."""
+    if not emails:
+        return {}
+    rows = await db.fetchall(f"""
+        SELECT user_email, day AS date,
+               {LIVE_SECONDS} AS tracked_seconds,
+               manual_seconds,
+               session_count AS sessions
+        FROM {ROLLUP_TABLE}
+        WHERE user_email IN ({_in_list(emails)}) AND day BETWEEN %s AND %s
+        ORDER BY user_email, day
+    """, (*emails, start_date, end_date))
+    daily = {email: [] for email in emails}
+    by_key = {email.lower(): days for email, days in daily.items()}
+    for row in rows:
+        tracked, manual = int(row["tracked_seconds"]), int(row["manual_seconds"])
+        by_key[row["user_email"].lower()].append({
+            "date": row["date"],
+            "tracked_seconds": tracked,
+            "manual_seconds": manual,
+            "logged_seconds": tracked + manual,
+            "sessions": row["sessions"],
+        })
+    return daily
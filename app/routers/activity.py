@@ -0,0 +1,46 @@
+from datetime import datetime
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+
+from app.admission import enforce_rate, retry_after
+from app.ingest import BufferFull, activity_buffer
+from app.presence import presence
+
+router = APIRouter(prefix="/activity", tags=["activity"])
+
+
+class ActivityEvent(BaseModel):
+    timestamp: datetime
+    state: Literal["active", "idle"]
+    app: Optional[str] = Field(None, max_length=255)
+    window: Optional[str] = Field(None, max_length=512)
+
+
+class ActivityBatch(BaseModel):
+    user_email: str
+    events: List[ActivityEvent] = Field(..., max_length=1000)
+
+
+@router.post("/batch", status_code=202)
+async def ingest_activity(batch: ActivityBatch):
+    """Accept a batch of activity samples; they are written asynchronously"""
+    enforce_rate("activity", batch.user_email)
+    received = datetime.now()
+    rows = [
+        (batch.user_email, e.timestamp, e.state, e.app, e.window, received)
+        for e in batch.events
+    ]
+    try:
+        await activity_buffer.submit(rows)
+    except BufferFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Activity ingestion is backlogged, retry later",
+            headers={"Retry-After": str(retry_after(5))},
+        )
+    if batch.events:
+        latest = max(batch.events, key=lambda e: e.timestamp)
+        presence.heartbeat(batch.user_email, latest.state, received, latest.app)
+    return {"status": "accepted", "count": len(rows)}
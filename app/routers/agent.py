@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+
+from app.auth import agent_config
+from app.responses import etag_matches
+
+router = APIRouter(prefix="/agent", tags=["agent"])
+
+
+@router.get("/config")
+async def get_agent_config(request: Request, response: Response, email: str = Query(...)):
+    """Current agent settings; poll with If-None-Match to get 304 while unchanged"""
+    config = await agent_config(email)
+    if not config:
+        raise HTTPException(status_code=403, detail="Inactive account")
+
+    etag = f'"{config["config_version"]}"'
+    headers = {"etag": etag, "cache-control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return config
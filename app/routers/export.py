@@ -0,0 +1,41 @@
+from datetime import date
+from typing import List, Literal
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.admission import retry_after
+from app.export import FORMATS, ExportBusy, export_filename, export_stream
+
+router = APIRouter(prefix="/api/export", tags=["export"])
+
+
+@router.get("")
+def export_records(
+    dataset: Literal["sessions", "manual_logs", "activity"] = Query("sessions"),
+    format: Literal["csv", "ndjson"] = Query("csv"),
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    emails: List[str] = Query([]),
+    gzip: bool = Query(False),
+):
+    """Org-wide export streamed as CSV or NDJSON; `emails` narrows it to some users"""
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date is before start_date")
+
+    # A sync generator: Starlette pulls it on a worker thread, so the
+    # blocking cursor reads never touch the event loop
+    try:
+        body = export_stream(dataset, format, emails, start_date, end_date, gzip=gzip)
+    except ExportBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many exports running, retry later",
+            headers={"Retry-After": str(retry_after(30))},
+        )
+    filename = export_filename(dataset, format, start_date, end_date, gzip)
+    return StreamingResponse(
+        body,
+        media_type="application/gzip" if gzip else FORMATS[format][0],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,61 @@
+from typing import List
+
+from fastapi import APIRouter, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from app.presence import PRESENCE_KEEPALIVE, presence
+
+router = APIRouter(prefix="/api/live", tags=["live"])
+
+
+def _filter(emails: List[str]):
+    return frozenset(emails) if emails else None
+
+
+@router.get("/status")
+async def live_status(emails: List[str] = Query([])):
+    """Current presence of every user (or the listed ones); no database work"""
+    return {"success": True, "data": presence.status(_filter(emails))}
+
+
+@router.get("/stream")
+async def live_stream(request: Request, emails: List[str] = Query([])):
+    """Server-Sent Events: a `snapshot` frame, then `update` frames as states change"""
+    sub = presence.subscribe(_filter(emails))
+
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                frame = await sub.next_frame(PRESENCE_KEEPALIVE)
+                if frame is None:
+                    yield ": keepalive\n\n"  # keeps proxies from closing an idle stream
+                else:
+                    yield f"data: {frame}\n\n"
+                if sub.closed:
+                    break
+        finally:
+            presence.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+@router.websocket("/ws")
+async def live_socket(websocket: WebSocket, emails: List[str] = Query([])):
+    """Same frames as /stream, one JSON text message each"""
+    await websocket.accept()
+    sub = presence.subscribe(_filter(emails))
+    try:
+        while True:
+            frame = await sub.next_frame(PRESENCE_KEEPALIVE)
+            await websocket.send_text(frame if frame is not None else '{"type": "keepalive"}')
+            if sub.closed:
+                await websocket.close(code=1012)  # service restart: reconnect
+                break
+    except (WebSocketDisconnect, RuntimeError, OSError):
+        pass
+    finally:
+        presence.unsubscribe(sub)
@@ -0,0 +1,36 @@
+from datetime import date
+from typing import List, Literal
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app import rollup
+
+router = APIRouter(prefix="/api/team", tags=["team"])
+
+
+@router.get("/dashboard")
+async def team_dashboard(
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    emails: List[str] = Query([]),
+    sort: Literal["hours", "tracked", "manual", "email"] = Query("hours"),
+    order: Literal["asc", "desc"] = Query("desc"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    daily: bool = Query(True),
+):
+    """Per-user totals (and per-day rows) for a list of users, or every active user"""
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date is before start_date")
+    if len(emails) > 1000:
+        raise HTTPException(status_code=400, detail="At most 1000 emails per request")
+
+    page = await rollup.team_totals(emails, start_date, end_date, sort,
+                                    descending=order == "desc", limit=limit, offset=offset)
+    if daily:
+        days = await rollup.team_daily([u["user_email"] for u in page["users"]], start_date, end_date)
+        for user in page["users"]:
+            user["days"] = days[user["user_email"]]
+
+    next_offset = offset + limit if offset + limit < page["total"] else None
+    return {"success": True, "total": page["total"], "next_offset": next_offset, "data": page["users"]}
@@ -0,0 +1,82 @@
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+
+from app.admission import enforce_rate
+from app.logs import get_logger
+from app.screenshots import store_screenshot
+from app.uploads import UploadError, upload_store
+
+log = get_logger(__name__)
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+
+class UploadInit(BaseModel):
+    user_email: str
+    size: int = Field(..., gt=0)
+    sha256: Optional[str] = Field(None, pattern="^[0-9a-fA-F]{64}$")
+
+
+def _error(e: UploadError):
+    # The current offset tells the agent where to resume
+    headers = {"Upload-Offset": str(e.offset)} if e.offset is not None else None
+    raise HTTPException(status_code=e.status, detail=e.detail, headers=headers)
+
+
+@router.post("", status_code=201)
+async def init_upload(body: UploadInit):
+    """Start a resumable upload; send the bytes with PUT /uploads/{id}?offset=N"""
+    enforce_rate("upload", body.user_email)
+    try:
+        return await run_in_threadpool(upload_store.create, body.user_email, body.size, body.sha256)
+    except UploadError as e:
+        _error(e)
+
+
+@router.get("/{upload_id}")
+async def upload_status(upload_id: str):
+    """Where to resume: `offset` is the number of bytes received so far"""
+    try:
+        status = await run_in_threadpool(upload_store.status, upload_id)
+    except UploadError as e:
+        _error(e)
+    return JSONResponse(status, headers={"Upload-Offset": str(status["offset"])})
+
+
+@router.put("/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    chunk_sha256: Optional[str] = Header(None, alias="X-Chunk-SHA256"),
+):
+    """Append raw bytes at `offset`; bytes before the received offset are skipped"""
+    try:
+        new_offset = await upload_store.append(upload_id, offset, request.stream(), chunk_sha256)
+    except UploadError as e:
+        _error(e)
+    return JSONResponse({"upload_id": upload_id, "offset": new_offset},
+                        headers={"Upload-Offset": str(new_offset)})
+
+
+@router.post("/{upload_id}/finalize")
+async def finalize_upload(upload_id: str):
+    """Verify size and checksum, then store it like a regular screenshot upload"""
+    try:
+        meta, f = await run_in_threadpool(upload_store.open_complete, upload_id)
+    except UploadError as e:
+        _error(e)
+    # `f` holds the upload's lock until its files are gone, so a retry can't store it twice
+    with f:
+        try:
+            result = await store_screenshot(meta["user_email"], f, meta["size"])
+        except Exception:
+            # The part file is kept: finalize can simply be retried
+            log.exception("upload_finalize_failed", extra={"upload_id": upload_id})
+            raise HTTPException(status_code=500, detail="Screenshot upload failed")
+        await run_in_threadpool(upload_store.complete, upload_id)
+    return result
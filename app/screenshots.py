@@ -0,0 +1,249 @@
+import base64
+import hashlib
+import io
+from datetime import datetime
+from typing import BinaryIO, Mapping, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+from app.blobstore import blob_store, sniff_content_type
+from app.database import db, hot_query, TABLE_PREFIX
+from app.responses import REVALIDATE_CACHE_CONTROL, conditional_response
+from app.dedupe import DEDUPE_ENABLED, Frame, dedupe_index
+from app.logs import HOT_SAMPLE_RATE, get_logger
+from app.recompress import recompressor
+from app.thumbnails import create_thumbnail, create_thumbnail_for_key
+
+log = get_logger(__name__)
+
+SNAP_TABLE = f"{TABLE_PREFIX}av_tblsnap"
+
+
+def migrate_blobs(batch_size: int = 100, keep_data: bool = False, limit: Optional[int] = None) -> int:
+    """Copy legacy screenshot_data BLOBs into the blob store.
+
+    Walks the table by id in batches so each round holds at most
+    `batch_size` images in memory and each UPDATE touches one row.
+    Returns the number of rows moved.
+    """
+    moved = 0
+    last_id = 0
+    while limit is None or moved < limit:
+        size = batch_size if limit is None else min(batch_size, limit - moved)
+        rows = db.fetchall_sync(f"""
+            SELECT id, screenshot_data FROM {SNAP_TABLE}
+            WHERE id > %s AND blob_key IS NULL AND screenshot_data IS NOT NULL
+            ORDER BY id
+            LIMIT %s
+        """, (last_id, size))
+        if not rows:
+            break
+
+        clear = "" if keep_data else ", screenshot_data = NULL"
+        for row in rows:
+            info = blob_store.put_bytes(row["screenshot_data"])
+            db.execute_sync(f"""
+                UPDATE {SNAP_TABLE}
+                SET blob_key = %s, content_type = %s, size_bytes = %s{clear}
+                WHERE id = %s
+            """, (info.key, info.content_type, info.size, row["id"]))
+            last_id = row["id"]
+            moved += 1
+
+        log.info("blob_migration_progress", extra={"moved": moved, "last_id": last_id})
+    return moved
+
+
+def _build_response(request_headers: Mapping[str, str], row: dict) -> Optional[Response]:
+    media_type = row.get("content_type") or "image/png"
+    key = row.get("blob_key")
+    if key:
+        etag = f'"{key}"'
+        path = blob_store.local_path(key)
+        try:
+            if path is not None:
+                return conditional_response(request_headers, etag, media_type, path=path,
+                                            cache_control=REVALIDATE_CACHE_CONTROL)
+            with blob_store.open(key) as f:
+                return conditional_response(request_headers, etag, media_type, data=f.read(),
+                                            cache_control=REVALIDATE_CACHE_CONTROL)
+        except FileNotFoundError:
+            return None
+
+    data = row.get("screenshot_data")
+    if data is None:
+        return None
+    # Legacy rows: same strong validator the blob store would have produced
+    etag = f'"{hashlib.sha256(data).hexdigest()}"'
+    return conditional_response(request_headers, etag, media_type, data=data,
+                                cache_control=REVALIDATE_CACHE_CONTROL)
+
+
+async def screenshot_response(request_headers: Mapping[str, str], row: dict) -> Optional[Response]:
+    """Conditional, range-aware response for an av_tblsnap row, or None if the image is gone."""
+    return await run_in_threadpool(_build_response, request_headers, row)
+
+
+# ------------------------------------------------------------------
+# Gallery pagination
+# ------------------------------------------------------------------
+
+def encode_cursor(capture_time: datetime, snap_id: int) -> str:
+    raw = f"{capture_time.isoformat()}|{snap_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError on anything malformed."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        when, snap_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(when), int(snap_id)
+    except (UnicodeDecodeError, ValueError, TypeError) as e:
+        raise ValueError("invalid cursor") from e
+
+
+_PAGE_SQL = f"""
+    SELECT id, capture_time AS timestamp, size_bytes
+    FROM {SNAP_TABLE}
+    WHERE user_id = %s AND capture_time >= %s AND capture_time < %s + INTERVAL 1 DAY {{after}}
+    ORDER BY capture_time DESC, id DESC
+    LIMIT %s
+"""
+FIRST_PAGE_QUERY = hot_query(
+    "screenshots.first_page", _PAGE_SQL.format(after=""),
+    ("probe@example.com", "2026-01-01", "2026-01-31", 51),
+)
+NEXT_PAGE_QUERY = hot_query(
+    "screenshots.next_page",
+    _PAGE_SQL.format(after="AND (capture_time < %s OR (capture_time = %s AND id < %s))"),
+    ("probe@example.com", "2026-01-01", "2026-01-31", "2026-01-15", "2026-01-15", 1000, 51),
+)
+
+
+async def list_screenshots(email: str, start_date: str, end_date: str, limit: int, cursor: Optional[str]) -> dict:
+    """One page of screenshot metadata, newest first, keyset-paginated on (capture_time, id)."""
+    # One extra row tells us whether another page exists
+    if cursor:
+        when, snap_id = decode_cursor(cursor)
+        rows = await db.fetchall(NEXT_PAGE_QUERY, (email, start_date, end_date, when, when, snap_id, limit + 1))
+    else:
+        rows = await db.fetchall(FIRST_PAGE_QUERY, (email, start_date, end_date, limit + 1))
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+
+    data = []
+    for row in rows:
+        size = row["size_bytes"]
+        data.append({
+            "id": row["id"],
+            "timestamp": row["timestamp"],
+            "timestamp_formatted": row["timestamp"],
+            "size_kb": round(size / 1024, 1) if size else None,
+            "thumbnail_url": f"/screenshot/{row['id']}/thumbnail",
+            "image_url": f"/screenshot/{row['id']}",
+        })
+    return {"data": data, "next_cursor": next_cursor}
+
+
+# ------------------------------------------------------------------
+# Thumbnails
+# ------------------------------------------------------------------
+
+def _thumbnail_key(row: dict) -> Optional[str]:
+    """Existing thumbnail key, or build one now for rows stored before thumbnails."""
+    if row.get("thumb_key"):
+        return row["thumb_key"]
+    if row.get("blob_key"):
+        try:
+            with blob_store.open(row["blob_key"]) as f:
+                info = create_thumbnail(f)
+        except FileNotFoundError:
+            return None
+    elif row.get("screenshot_data") is not None:
+        info = create_thumbnail(io.BytesIO(row["screenshot_data"]))
+    else:
+        return None
+    if info is None:
+        return None
+    db.execute_sync(f"UPDATE {SNAP_TABLE} SET thumb_key = %s WHERE id = %s", (info.key, row["id"]))
+    return info.key
+
+
+def _build_thumbnail_response(request_headers: Mapping[str, str], row: dict) -> Optional[Response]:
+    key = _thumbnail_key(row)
+    if key is None:
+        return None
+    try:
+        with blob_store.open(key) as f:
+            media_type = sniff_content_type(f.read(16))
+    except FileNotFoundError:
+        return None
+    path = blob_store.local_path(key)
+    if path is None:
+        with blob_store.open(key) as f:
+            return conditional_response(request_headers, f'"{key}"', media_type, data=f.read(),
+                                        cache_control=REVALIDATE_CACHE_CONTROL)
+    return conditional_response(request_headers, f'"{key}"', media_type, path=path,
+                                cache_control=REVALIDATE_CACHE_CONTROL)
+
+
+async def thumbnail_response(request_headers: Mapping[str, str], row: dict) -> Optional[Response]:
+    return await run_in_threadpool(_build_thumbnail_response, request_headers, row)
+
+
+# ------------------------------------------------------------------
+# Storing uploads
+# ------------------------------------------------------------------
+
+async def store_screenshot(user_email: str, fileobj: BinaryIO, upload_size: int) -> dict:
+    """Dedupe, store, thumbnail and record one uploaded image; queues recompression."""
+    # Near-identical to a recent frame (idle desktop): point at its blob
+    phash = await dedupe_index.hash(fileobj) if DEDUPE_ENABLED else None
+    frame = await dedupe_index.match(user_email, phash, upload_size) if DEDUPE_ENABLED else None
+    if frame:
+        result = await db.execute(
+            f"""
+            INSERT INTO {SNAP_TABLE}
+                (user_id, blob_key, content_type, size_bytes, thumb_key, phash, ref_id, capture_time)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            (user_email, frame.blob_key, frame.content_type, frame.size_bytes,
+             frame.thumb_key, phash, frame.screenshot_id, datetime.now())
+        )
+        log.info("screenshot_deduplicated", extra={
+            "email": user_email, "screenshot_id": result.lastrowid, "ref_id": frame.screenshot_id,
+            "sample": HOT_SAMPLE_RATE
+        })
+        return {"status": "saved", "screenshot_id": result.lastrowid, "duplicate_of": frame.screenshot_id}
+
+    # Copy the spooled upload into the blob store chunk by chunk
+    info = await run_in_threadpool(blob_store.put_fileobj, fileobj)
+    # Gallery thumbnail is built once here, not on every page view
+    thumb = await run_in_threadpool(create_thumbnail_for_key, info.key)
+
+    result = await db.execute(
+        f"""
+        INSERT INTO {SNAP_TABLE} (user_id, blob_key, content_type, size_bytes, thumb_key, phash, capture_time)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """,
+        (user_email, info.key, info.content_type, info.size,
+         thumb.key if thumb else None, phash, datetime.now())
+    )
+
+    screenshot_id = result.lastrowid
+    if phash is not None:
+        await dedupe_index.remember(user_email, Frame(
+            screenshot_id, phash, info.key, info.content_type, info.size, thumb.key if thumb else None
+        ))
+    # PNG -> WebP etc. happens after we answer
+    recompressor.submit(screenshot_id, info.key, info.content_type)
+
+    log.info("screenshot_saved", extra={
+        "email": user_email, "screenshot_id": screenshot_id, "bytes": info.size, "sample": HOT_SAMPLE_RATE
+    })
+    return {"status": "saved", "screenshot_id": screenshot_id}
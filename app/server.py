@@ -0,0 +1,33 @@
+"""Uvicorn server used by the gunicorn launcher (gunicorn.conf.py).
+
+On SIGTERM uvicorn stops accepting connections, waits up to
+`timeout_graceful_shutdown` for in-flight requests (uploads included) and
+then runs the app's shutdown hooks, which flush buffered writes. Requests
+that never finish on their own, like live dashboard streams, would hold
+that wait to its limit, so callbacks registered with `on_drain` run first
+and close them.
+"""
+from typing import Callable, List
+
+from uvicorn import Server
+
+from app.logs import get_logger
+
+log = get_logger(__name__)
+_drain_hooks: List[Callable[[], None]] = []
+
+
+def on_drain(fn: Callable[[], None]) -> Callable[[], None]:
+    """Run `fn` on the event loop as soon as the server starts draining."""
+    _drain_hooks.append(fn)
+    return fn
+
+
+class DrainingServer(Server):
+    async def shutdown(self, sockets=None):
+        for hook in _drain_hooks:
+            try:
+                hook()
+            except Exception:
+                log.warning("drain_hook_failed", exc_info=True, extra={"hook": getattr(hook, "__qualname__", repr(hook))})
+        await super().shutdown(sockets)
@@ -0,0 +1,36 @@
+import io
+import os
+from typing import BinaryIO, Optional
+
+from PIL import Image
+
+from app.blobstore import BlobInfo, blob_store
+
+THUMBNAIL_MAX_PX = int(os.getenv("THUMBNAIL_MAX_PX", "320"))
+THUMBNAIL_FORMAT = os.getenv("THUMBNAIL_FORMAT", "WEBP").upper()  # WEBP or JPEG
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "70"))
+
+
+def make_thumbnail(fileobj: BinaryIO) -> bytes:
+    with Image.open(fileobj) as img:
+        # draft() lets JPEG decode at reduced scale; a no-op for PNG
+        img.draft("RGB", (THUMBNAIL_MAX_PX, THUMBNAIL_MAX_PX))
+        img = img.convert("RGB")
+        img.thumbnail((THUMBNAIL_MAX_PX, THUMBNAIL_MAX_PX))
+        out = io.BytesIO()
+        img.save(out, format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+        return out.getvalue()
+
+
+def create_thumbnail(source: BinaryIO) -> Optional[BlobInfo]:
+    """Store a thumbnail of `source` in the blob store; None if it is not an image."""
+    try:
+        data = make_thumbnail(source)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return blob_store.put_bytes(data)
+
+
+def create_thumbnail_for_key(key: str) -> Optional[BlobInfo]:
+    with blob_store.open(key) as f:
+        return create_thumbnail(f)
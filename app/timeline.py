@@ -0,0 +1,330 @@
+"""Vectorised worked-time engine.
+
+Sessions, manual logs and activity samples for any number of users are
+turned into NumPy interval arrays and evaluated in one pass:
+
+    tracked = session time not covered by idle intervals
+    idle    = session time covered by idle intervals (and no manual log)
+    manual  = manual-log time not already tracked
+    worked  = tracked + manual
+
+Overlapping sessions or logs are counted once. Idle intervals come from the
+agent's activity samples: time after an `idle` sample, and any gap between
+samples longer than the user's `inactivitythreshold`. Users whose agent
+sends no samples get no idle subtraction.
+
+Every user's timeline is laid out on its own stretch of one int64 axis
+(`user_index * _USER_STRIDE + seconds`), so merging, subtracting and
+splitting at midnight are a handful of sorts and cumulative sums for the
+whole team at once. Times are naive local datetimes, as stored.
+
+A session left open by a crashed agent is counted until its last sign of
+life (last active sample, or its start) plus the inactivity threshold once
+it has been silent for SESSION_STALE_AFTER seconds; `close_stale_sessions`
+writes exactly that end time back.
+"""
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from app import rollup
+from app.database import db, hot_query, TABLE_PREFIX
+from app.logs import get_logger
+from app.presence import presence
+
+log = get_logger(__name__)
+
+SESSION_TABLE = f"{TABLE_PREFIX}tblsession"
+MANUAL_TABLE = f"{TABLE_PREFIX}av_manual_logs"
+ACTIVITY_TABLE = f"{TABLE_PREFIX}av_activity"
+
+DEFAULT_THRESHOLD = 30 * 60  # av_user.inactivitythreshold default, in seconds
+SESSION_STALE_AFTER = int(os.getenv("SESSION_STALE_AFTER", str(4 * 3600)))
+SESSION_REAP_INTERVAL = float(os.getenv("SESSION_REAP_INTERVAL", "300"))
+# How far before the range a session's start and samples are loaded. A
+# session open longer than this is clipped to start here: without a sample
+# since, it was stale long before the range and counts nothing in it.
+TIMELINE_MAX_LOOKBACK = int(os.getenv("TIMELINE_MAX_LOOKBACK", str(7 * 86400)))
+
+DAY = 86400
+# Samples this long before the range still decide whether it opens idle
+_LOOKBACK = DAY
+_USER_STRIDE = 1 << 34  # seconds; keeps users' timelines disjoint on one axis
+
+
+# ------------------------------------------------------------------
+# Loading
+# ------------------------------------------------------------------
+
+def _in_list(values: Sequence) -> str:
+    return ", ".join(["%s"] * len(values))
+
+
+def load_inputs(emails: Sequence[str], start_date: date, end_date: date) -> dict:
+    """Fetch everything the engine needs for `emails` over [start_date, end_date]."""
+    emails = list(dict.fromkeys(emails))
+    range_start = datetime.combine(start_date, datetime.min.time())
+    range_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+    inn = _in_list(emails)
+
+    thresholds = db.fetchall_sync(f"""
+        SELECT email, COALESCE(inactivitythreshold, 30) FROM av_user WHERE email IN ({inn})
+    """, emails, dictionary=False)
+    # Anything overlapping the range, however long ago it started
+    sessions = db.fetchall_sync(f"""
+        SELECT user_email, start_time, end_time FROM {SESSION_TABLE}
+        WHERE user_email IN ({inn}) AND start_time < %s
+          AND (end_time IS NULL OR end_time >= %s)
+          AND status IN ('completed', 'active')
+    """, [*emails, range_end, range_start], dictionary=False)
+    floor = range_start - timedelta(seconds=max(TIMELINE_MAX_LOOKBACK, _LOOKBACK))
+    sessions = [(email, max(start, floor), end) for email, start, end in sessions]
+    manual = db.fetchall_sync(f"""
+        SELECT user_email, start_time, end_time FROM {MANUAL_TABLE}
+        WHERE user_email IN ({inn}) AND start_time < %s AND end_time >= %s
+    """, [*emails, range_end, range_start], dictionary=False)
+    # Back to the oldest (clipped) session too: an open one needs its last active sample
+    lookback = min([range_start - timedelta(seconds=_LOOKBACK)] + [s[1] for s in sessions])
+    samples = db.fetchall_sync(f"""
+        SELECT user_email, sample_time, state FROM {ACTIVITY_TABLE}
+        WHERE user_email IN ({inn}) AND sample_time >= %s AND sample_time < %s
+    """, [*emails, lookback, range_end], dictionary=False)
+
+    return {
+        "emails": emails,
+        "thresholds": {email: int(minutes) * 60 for email, minutes in thresholds},
+        "sessions": sessions,
+        "manual": manual,
+        "samples": samples,
+    }
+
+
+# ------------------------------------------------------------------
+# Interval arithmetic
+# ------------------------------------------------------------------
+
+def _seconds(values, origin: datetime) -> np.ndarray:
+    if not len(values):
+        return np.zeros(0, dtype=np.int64)
+    return (np.array(values, dtype="datetime64[s]") - np.datetime64(origin, "s")).astype(np.int64)
+
+
+def _coverage(points: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """How many of the intervals cover each elementary segment [points[k], points[k+1])."""
+    n = len(points)
+    delta = (np.bincount(np.searchsorted(points, starts), minlength=n + 1)
+             - np.bincount(np.searchsorted(points, ends), minlength=n + 1))
+    return np.cumsum(delta)[:n - 1]
+
+
+def _idle_intervals(user: np.ndarray, t: np.ndarray, idle: np.ndarray, threshold: np.ndarray):
+    """Idle stretches from samples sorted by (user, time), as (user, start, end).
+    The last sample of each user opens a stretch running past the window."""
+    if not len(t):
+        return user, t, t
+    has_next = np.append(user[:-1] == user[1:], False)
+    starts = np.where(idle, t, t + threshold[user])
+    ends = np.where(has_next, np.append(t[1:], 0), np.iinfo(np.int64).max // 4)
+    keep = starts < ends
+    return user[keep], starts[keep], ends[keep]
+
+
+def compute(inputs: dict, start_date: date, end_date: date, now: Optional[datetime] = None) -> Dict[str, list]:
+    """Per-user, per-day totals in seconds. Days without any time are left out."""
+    now = now or datetime.now()
+    emails = inputs["emails"]
+    if not emails:
+        return {}
+    # MySQL matched the rows case-insensitively; so must we
+    index = {email.lower(): i for i, email in enumerate(emails)}
+    n_days = (end_date - start_date).days + 1
+    origin = datetime.combine(start_date, datetime.min.time()) - timedelta(seconds=_LOOKBACK)
+    window_start, window_end = _LOOKBACK, _LOOKBACK + n_days * DAY
+    now_s = _seconds([now], origin)[0]
+
+    thresholds = {e.lower(): v for e, v in inputs["thresholds"].items()}
+    threshold = np.array([thresholds.get(e.lower(), DEFAULT_THRESHOLD) for e in emails], dtype=np.int64)
+
+    # Activity samples, sorted by (user, time)
+    samples = inputs["samples"]
+    s_user = np.array([index[r[0].lower()] for r in samples], dtype=np.int64)
+    s_time = _seconds([r[1] for r in samples], origin)
+    s_idle = np.array([r[2] == "idle" for r in samples], dtype=bool)
+    order = np.lexsort((s_time, s_user))
+    s_user, s_time, s_idle = s_user[order], s_time[order], s_idle[order]
+    idle_user, idle_start, idle_end = _idle_intervals(s_user, s_time, s_idle, threshold)
+
+    # Sessions; open ones end at now, or at last sign of life + threshold once stale
+    sessions = inputs["sessions"]
+    se_user = np.array([index[r[0].lower()] for r in sessions], dtype=np.int64)
+    se_start = _seconds([r[1] for r in sessions], origin)
+    is_open = np.array([r[2] is None for r in sessions], dtype=bool)
+    se_end = _seconds([r[2] or now for r in sessions], origin)
+    if is_open.any():
+        active_keys = (s_user * _USER_STRIDE + s_time)[~s_idle]
+        probe = se_user * _USER_STRIDE + now_s
+        pos = np.searchsorted(active_keys, probe, side="right") - 1
+        last = active_keys[pos.clip(0)] if len(active_keys) else np.zeros_like(probe)
+        found = (pos >= 0) & (last >= se_user * _USER_STRIDE + se_start)
+        last_seen = np.where(found, last - se_user * _USER_STRIDE, se_start)
+        stale = now_s - last_seen > SESSION_STALE_AFTER
+        open_end = np.where(stale, np.minimum(last_seen + threshold[se_user], now_s), now_s)
+        se_end = np.where(is_open, open_end, se_end)
+
+    manual = inputs["manual"]
+    m_user = np.array([index[r[0].lower()] for r in manual], dtype=np.int64)
+    m_start = _seconds([r[1] for r in manual], origin)
+    m_end = _seconds([r[2] for r in manual], origin)
+
+    def place(user, starts, ends):
+        starts = np.clip(starts, window_start, window_end)
+        ends = np.clip(ends, window_start, window_end)
+        keep = ends > starts
+        base = user[keep] * _USER_STRIDE
+        return base + starts[keep], base + ends[keep]
+
+    se_a, se_b = place(se_user, se_start, se_end)
+    id_a, id_b = place(idle_user, idle_start, idle_end)
+    m_a, m_b = place(m_user, m_start, m_end)
+
+    # Midnights split segments so each one falls in a single day
+    users = np.arange(len(emails), dtype=np.int64)
+    midnights = (users[:, None] * _USER_STRIDE
+                 + window_start + np.arange(n_days + 1, dtype=np.int64)[None, :] * DAY).ravel()
+    points = np.unique(np.concatenate([midnights, se_a, se_b, id_a, id_b, m_a, m_b]))
+
+    in_session = _coverage(points, se_a, se_b) > 0
+    in_idle = _coverage(points, id_a, id_b) > 0
+    in_manual = _coverage(points, m_a, m_b) > 0
+    tracked = in_session & ~in_idle
+    idle = in_session & in_idle & ~in_manual
+    manual_only = in_manual & ~tracked
+
+    seg_start = points[:-1]
+    length = np.diff(points)
+    seg_user = seg_start // _USER_STRIDE
+    seg_day = (seg_start % _USER_STRIDE - window_start) // DAY
+    valid = (seg_day >= 0) & (seg_day < n_days)
+    bins = (seg_user * n_days + seg_day)[valid]
+    size = len(emails) * n_days
+
+    def total(mask):
+        return np.bincount(bins, weights=(length * mask)[valid], minlength=size).reshape(len(emails), n_days)
+
+    tracked_s, idle_s, manual_s = total(tracked), total(idle), total(manual_only)
+
+    result = {}
+    for u, email in enumerate(emails):
+        days = []
+        for d in np.flatnonzero(tracked_s[u] + idle_s[u] + manual_s[u]):
+            days.append({
+                "date": (start_date + timedelta(days=int(d))).isoformat(),
+                "tracked_seconds": int(tracked_s[u, d]),
+                "idle_seconds": int(idle_s[u, d]),
+                "manual_seconds": int(manual_s[u, d]),
+                "worked_seconds": int(tracked_s[u, d] + manual_s[u, d]),
+            })
+        result[email] = days
+    return result
+
+
+def team_timeline_sync(emails: Sequence[str], start_date: date, end_date: date) -> Dict[str, list]:
+    return compute(load_inputs(emails, start_date, end_date), start_date, end_date)
+
+
+async def team_timeline(emails: Sequence[str], start_date: date, end_date: date) -> Dict[str, list]:
+    """Per-user, per-day totals for `emails`; loading and maths run off the event loop."""
+    return await db.run(team_timeline_sync, emails, start_date, end_date)
+
+
+def summarize(days: list) -> dict:
+    keys = ("tracked_seconds", "idle_seconds", "manual_seconds", "worked_seconds")
+    return {key: sum(day[key] for day in days) for key in keys}
+
+
+# ------------------------------------------------------------------
+# Stale sessions
+# ------------------------------------------------------------------
+
+STALE_SESSIONS_QUERY = hot_query("sessions.stale", f"""
+    SELECT s.id, s.user_email, s.start_time,
+           (SELECT MAX(a.sample_time) FROM {ACTIVITY_TABLE} a
+            WHERE a.user_email = s.user_email AND a.sample_time >= s.start_time
+              AND a.state = 'active') AS last_sample,
+           COALESCE(u.inactivitythreshold, 30) AS threshold_min
+    FROM {SESSION_TABLE} s
+    LEFT JOIN av_user u ON u.email = s.user_email
+    WHERE s.end_time IS NULL AND s.status = 'active' AND s.start_time < %s
+""", ("2026-01-15 08:00:00",))
+
+
+async def close_stale_sessions(now: Optional[datetime] = None) -> int:
+    """End sessions whose agent went silent SESSION_STALE_AFTER seconds ago,
+    at their last sign of life plus the user's inactivity threshold."""
+    now = now or datetime.now()
+    silent_since = now - timedelta(seconds=SESSION_STALE_AFTER)
+    closed = 0
+    for row in await db.fetchall(STALE_SESSIONS_QUERY, (silent_since,)):
+        last_seen = max(row["start_time"], row["last_sample"] or row["start_time"])
+        if last_seen >= silent_since:
+            continue
+        ended = min(last_seen + timedelta(minutes=int(row["threshold_min"])), now)
+        result = await db.execute(
+            f"UPDATE {SESSION_TABLE} SET end_time = %s, status = 'completed' "
+            f"WHERE id = %s AND end_time IS NULL",
+            (ended, row["id"])
+        )
+        if result.rowcount:  # the agent may have ended it meanwhile
+            await rollup.session_ended(row["user_email"], row["start_time"], ended)
+            presence.session_ended(row["user_email"], row["id"], ended)
+            log.info("session_auto_closed", extra={
+                "session_id": row["id"], "email": row["user_email"], "end_time": ended
+            })
+            closed += 1
+    return closed
+
+
+class SessionReaper:
+    """Background task running close_stale_sessions every `interval` seconds."""
+
+    def __init__(self, interval: float = 300.0):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self.runs = 0
+        self.closed = 0
+        self.failures = 0
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.closed += await close_stale_sessions()
+                self.runs += 1
+            except Exception:
+                self.failures += 1
+                log.warning("session_reap_failed", exc_info=True)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        # Not cancelled: a pass in progress finishes its rollup updates
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "closed": self.closed, "failures": self.failures}
+
+
+session_reaper = SessionReaper(interval=SESSION_REAP_INTERVAL)
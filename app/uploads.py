@@ -0,0 +1,294 @@
+"""Resumable, chunked screenshot uploads.
+
+    POST /uploads                   {user_email, size, sha256?}  -> upload_id, offset 0
+    PUT  /uploads/{id}?offset=N     raw chunk bytes              -> new offset
+    GET  /uploads/{id}                                           -> offset to resume from
+    POST /uploads/{id}/finalize                                  -> screenshot_id
+
+Each upload is a `.part` file plus a small `.json` descriptor under
+UPLOAD_TMP_PATH. The committed offset is simply the size of the part file,
+so it survives restarts and is the same for every worker on the host.
+A chunk is spooled as it arrives (to disk past 1 MB) and then appended,
+so nothing holds a whole image in memory. A chunk may start before the
+committed offset (a retry whose response was lost): the bytes already on
+disk are skipped, never overwritten. An optional per-chunk SHA-256 is checked before the
+chunk is committed, and the whole-file SHA-256 at finalize.
+
+Workers (and gunicorn processes) coordinate through `flock` on the part
+file: appends take it in turn, and finalize holds it, non-blocking, from
+the checksum until the files are removed, so a retried finalize answers
+409 instead of storing the screenshot twice. Descriptors are written to a
+temporary file and renamed into place, so a reader never sees half of one.
+
+Uploads not finalized within UPLOAD_TTL seconds expire and are purged.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import secrets
+import tempfile
+import time
+from typing import AsyncIterator, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+UPLOAD_TMP_PATH = os.getenv("UPLOAD_TMP_PATH", "./data/uploads")
+UPLOAD_TTL = int(os.getenv("UPLOAD_TTL", str(24 * 3600)))
+UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", str(50 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))  # suggested to agents
+UPLOAD_MAX_CHUNK = int(os.getenv("UPLOAD_MAX_CHUNK", str(8 * 1024 * 1024)))
+
+_PURGE_EVERY = 60.0
+_SPOOL_MAX = 1024 * 1024
+_COPY_BLOCK = 64 * 1024
+
+
+class UploadError(Exception):
+    """Protocol error; `status` is the HTTP status to answer with."""
+
+    def __init__(self, status: int, detail: str, offset: Optional[int] = None):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.offset = offset
+
+
+class UploadStore:
+    def __init__(self, root: str, ttl: int = UPLOAD_TTL, max_size: int = UPLOAD_MAX_SIZE):
+        self.root = root
+        self.ttl = ttl
+        self.max_size = max_size
+        self._last_purge = 0.0
+
+        self.created = 0
+        self.finalized = 0
+        self.expired = 0
+        self.chunks = 0
+        self.bytes_received = 0
+        self.checksum_failures = 0
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+
+    def _path(self, upload_id: str, suffix: str) -> str:
+        if len(upload_id) != 32 or not all(c in "0123456789abcdef" for c in upload_id):
+            raise UploadError(404, "Unknown upload")
+        return os.path.join(self.root, upload_id + suffix)
+
+    @staticmethod
+    def _lock(f, blocking: bool = True) -> bool:
+        """flock `f` exclusively; the lock goes when the file is closed."""
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        # Finalized or purged while we waited: the name now leads nowhere
+        if os.fstat(f.fileno()).st_nlink == 0:
+            raise UploadError(404, "Unknown upload")
+        return True
+
+    def _open_part(self, upload_id: str, mode: str):
+        try:
+            return open(self._path(upload_id, ".part"), mode)
+        except FileNotFoundError:
+            raise UploadError(404, "Unknown upload")
+
+    def _load(self, upload_id: str) -> dict:
+        try:
+            with open(self._path(upload_id, ".json")) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise UploadError(404, "Unknown upload")
+        if time.time() > meta["expires_at"]:
+            self._remove(upload_id)
+            self.expired += 1
+            raise UploadError(410, "Upload expired")
+        return meta
+
+    def _remove(self, upload_id: str):
+        for suffix in (".part", ".json"):
+            try:
+                os.unlink(self._path(upload_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def offset(self, upload_id: str) -> int:
+        return os.path.getsize(self._path(upload_id, ".part"))
+
+    # ------------------------------------------------------------------
+    # Protocol steps (blocking; called through run_in_threadpool)
+    # ------------------------------------------------------------------
+
+    def create(self, user_email: str, size: int, sha256: Optional[str]) -> dict:
+        if size <= 0 or size > self.max_size:
+            raise UploadError(413, f"Upload size must be between 1 and {self.max_size} bytes")
+        self.purge_expired()
+        os.makedirs(self.root, exist_ok=True)
+        upload_id = secrets.token_hex(16)
+        meta = {
+            "upload_id": upload_id,
+            "user_email": user_email,
+            "size": size,
+            "sha256": sha256.lower() if sha256 else None,
+            "expires_at": int(time.time()) + self.ttl,
+        }
+        open(self._path(upload_id, ".part"), "wb").close()
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, self._path(upload_id, ".json"))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self.created += 1
+        return {**meta, "offset": 0, "chunk_size": UPLOAD_CHUNK_SIZE}
+
+    def status(self, upload_id: str) -> dict:
+        meta = self._load(upload_id)
+        return {**meta, "offset": self.offset(upload_id)}
+
+    def _write(self, upload_id: str, offset: int, pieces, expected_sha256: Optional[str]) -> int:
+        meta = self._load(upload_id)
+        with self._open_part(upload_id, "r+b") as f:
+            self._lock(f)
+            committed = f.seek(0, os.SEEK_END)
+            if offset > committed:
+                raise UploadError(409, "Chunk starts past the received data", offset=committed)
+            digest = hashlib.sha256()
+            skip = committed - offset
+            written = 0
+            try:
+                for piece in pieces:
+                    digest.update(piece)
+                    if skip >= len(piece):
+                        skip -= len(piece)
+                        continue
+                    piece = piece[skip:]
+                    skip = 0
+                    if committed + written + len(piece) > meta["size"]:
+                        raise UploadError(413, "Chunk runs past the declared size", offset=committed)
+                    f.write(piece)
+                    written += len(piece)
+                if expected_sha256 and digest.hexdigest() != expected_sha256.lower():
+                    self.checksum_failures += 1
+                    raise UploadError(422, "Chunk checksum mismatch", offset=committed)
+                f.flush()
+            except BaseException:
+                f.truncate(committed)  # nothing from a bad or cut-off chunk is kept
+                raise
+            self.chunks += 1
+            self.bytes_received += written
+            return committed + written
+
+    async def append(self, upload_id: str, offset: int, stream: AsyncIterator[bytes],
+                     expected_sha256: Optional[str] = None) -> int:
+        """Stream a chunk to disk; returns the new committed offset."""
+        await run_in_threadpool(self._load, upload_id)  # 404/410 before reading the body
+        # Like UploadFile: small chunks stay in memory, big ones spill to disk
+        with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX, dir=self.root) as spool:
+            total = 0
+            async for piece in stream:
+                total += len(piece)
+                if total > UPLOAD_MAX_CHUNK:
+                    raise UploadError(413, f"Chunks are limited to {UPLOAD_MAX_CHUNK} bytes")
+                if total > _SPOOL_MAX:  # on disk from here on
+                    await run_in_threadpool(spool.write, piece)
+                else:
+                    spool.write(piece)
+            spool.seek(0)
+            pieces = iter(lambda: spool.read(_COPY_BLOCK), b"")
+            return await run_in_threadpool(self._write, upload_id, offset, pieces, expected_sha256)
+
+    def open_complete(self, upload_id: str):
+        """Verify a fully received upload and open it for reading; returns (meta, file).
+        The file holds the upload's lock: call `complete` before closing it."""
+        f = self._open_part(upload_id, "rb")
+        try:
+            if not self._lock(f, blocking=False):
+                raise UploadError(409, "Upload is already being finalized")
+            meta = self._load(upload_id)
+            received = f.seek(0, os.SEEK_END)
+            if received != meta["size"]:
+                raise UploadError(409, "Upload is incomplete", offset=received)
+            f.seek(0)
+        except BaseException:
+            f.close()
+            raise
+        if meta["sha256"]:
+            digest = hashlib.sha256()
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+            f.seek(0)
+            if digest.hexdigest() != meta["sha256"]:
+                f.close()
+                self.checksum_failures += 1
+                self._remove(upload_id)
+                raise UploadError(422, "Upload checksum mismatch; start a new upload")
+        return meta, f
+
+    def complete(self, upload_id: str):
+        self._remove(upload_id)
+        self.finalized += 1
+
+    def purge_expired(self, force: bool = False) -> int:
+        """Delete expired uploads; runs at most once a minute unless forced."""
+        now = time.time()
+        if not force and now - self._last_purge < _PURGE_EVERY:
+            return 0
+        self._last_purge = now
+        purged = 0
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            path = os.path.join(self.root, name)
+            if not name.endswith(".json"):
+                # Leftovers of a create that died half way
+                if name.endswith(".tmp") or (name.endswith(".part") and not os.path.exists(path[:-5] + ".json")):
+                    self._purge_orphan(path, now)
+                continue
+            upload_id = name[:-5]
+            try:
+                with open(path) as f:
+                    expired = now > json.load(f)["expires_at"]
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError, KeyError):
+                # Unreadable: judge by age, so a live upload is never dropped
+                expired = self._older_than_ttl(path, now)
+            if expired:
+                self._remove(upload_id)
+                purged += 1
+        self.expired += purged
+        return purged
+
+    def _older_than_ttl(self, path: str, now: float) -> bool:
+        try:
+            return now - os.path.getmtime(path) > self.ttl
+        except FileNotFoundError:
+            return False
+
+    def _purge_orphan(self, path: str, now: float):
+        if self._older_than_ttl(path, now):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "created": self.created,
+            "finalized": self.finalized,
+            "expired": self.expired,
+            "chunks": self.chunks,
+            "bytes_received": self.bytes_received,
+            "checksum_failures": self.checksum_failures,
+        }
+
+
+upload_store = UploadStore(UPLOAD_TMP_PATH)
@@ -0,0 +1,106 @@
+"""Concurrent throughput of async handlers: blocking DB calls vs. the async layer.
+
+Runs entirely in-process: a FastAPI app exposes the same query twice, once
+calling the blocking ``db.fetchone_sync`` straight from an ``async def``
+handler (the old behaviour) and once awaiting ``db.fetchone``. The MySQL
+driver is replaced by a connection whose queries sleep for ``--latency``
+seconds, so the numbers isolate event-loop blocking from real DB cost.
+
+    python -m benchmarks.bench_async_db --requests 400 --concurrency 50 --latency 0.02
+
+Needs httpx (pip install httpx) in addition to requirements.txt.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.database import Database
+
+
+class _SlowCursor:
+    def __init__(self, latency):
+        self.latency = latency
+        self.lastrowid = None
+        self.rowcount = 1
+
+    def execute(self, query, params=()):
+        time.sleep(self.latency)
+
+    def fetchone(self):
+        return {"ok": 1}
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class _SlowConnection:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def cursor(self, dictionary=False):
+        return _SlowCursor(self.latency)
+
+    def ping(self, reconnect=False):
+        pass
+
+    def consume_results(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def build_app(database: Database) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/blocking")
+    async def blocking():
+        return database.fetchone_sync("SELECT 1")
+
+    @app.get("/async")
+    async def non_blocking():
+        return await database.fetchone("SELECT 1")
+
+    return app
+
+
+async def _drive(app, path, total, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    sem = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            async with sem:
+                resp = await client.get(path)
+                resp.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated query time (s)")
+    parser.add_argument("--pool-size", type=int, default=10)
+    args = parser.parse_args()
+
+    database = Database()
+    database._connect = lambda: _SlowConnection(args.latency)
+    database.pool.max_size = args.pool_size
+    app = build_app(database)
+
+    for label, path in (("before (blocking)", "/blocking"), ("after (async)", "/async")):
+        elapsed = asyncio.run(_drive(app, path, args.requests, args.concurrency))
+        print(f"{label:<18} {args.requests / elapsed:8.1f} req/s  ({elapsed:.2f}s for {args.requests})")
+
+
+if __name__ == "__main__":
+    main()
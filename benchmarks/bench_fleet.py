@@ -0,0 +1,397 @@
+"""A fleet of monitoring agents and dashboard readers against the full API.
+
+Serves app.main_backup through the gunicorn launcher on a throwaway
+SQLite stand-in database (benchmarks.sqlite_standin) and blob store, then
+for ``--duration`` seconds runs:
+
+    agents   log in, then back-to-back sessions of ``--session-length``
+             seconds: start, every ``--interval`` seconds (the agent's
+             sstime, compressed) upload a screenshot and post an activity
+             batch, end. ``--idle`` of the uploads repeat the previous
+             frame, the way an idle desktop does.
+    readers  poll the dashboard, summary, screenshot gallery and live
+             status for random agents every ``--read-interval`` seconds.
+
+It reports requests/s and p50/p95/p99 latency per endpoint, errors,
+requests shed by admission control (429/503 with Retry-After), and the
+server's resident memory (all gunicorn processes) at start and peak.
+Per-agent rate limits are off unless ADMISSION_*_RATE is set: agents
+here upload far more often than real ones.
+
+``--save-baseline`` stores the result as JSON; every later run with the
+same settings is compared with it and exits 1 when throughput, an
+endpoint's p95 or peak memory is worse than the baseline by more than
+``--tolerance``, or errors appear that the baseline did not have. A p95
+must also have grown by ``--slack-ms``: a few milliseconds either way on
+a fast endpoint is run-to-run noise.
+
+    python -m benchmarks.bench_fleet --agents 100 --readers 10 --duration 60
+    python -m benchmarks.bench_fleet --save-baseline
+
+Absolute numbers depend on the machine and on SQLite standing in for
+MySQL; compare runs made on the same host.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import signal
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import httpx
+from PIL import Image, ImageDraw
+
+from benchmarks.sqlite_standin import create_schema
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "fleet.json")
+
+# Settings a baseline is only comparable under
+_COMPARABLE = ("agents", "readers", "duration", "interval", "session_length", "read_interval",
+               "idle", "image_size", "workers", "seed")
+
+
+# ------------------------------------------------------------------
+# Fixtures
+# ------------------------------------------------------------------
+
+def _email(i: int) -> str:
+    return f"agent{i:05d}@fleet.test"
+
+
+def _seed(path: str, agents: int):
+    create_schema(path)
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.executemany("INSERT INTO av_user (email, status, sstime, inactivitythreshold) VALUES (?, 'Active', 5, 30)",
+                             [(_email(i),) for i in range(agents)])
+            conn.executemany("INSERT INTO av_master_account (email, accstatus) VALUES (?, 'Active')",
+                             [(_email(i),) for i in range(agents)])
+    finally:
+        conn.close()
+
+
+def _frames(count: int, size: str) -> list:
+    """Distinct desktop-like PNGs: flat windows and text-ish strokes, not noise."""
+    width, height = (int(v) for v in size.split("x"))
+    rng = random.Random(42)
+    frames = []
+    for _ in range(count):
+        img = Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(12):
+            x, y = rng.randrange(width), rng.randrange(height)
+            draw.rectangle((x, y, x + rng.randrange(80, width // 2), y + rng.randrange(60, height // 2)),
+                           fill=tuple(rng.randrange(256) for _ in range(3)))
+        for _ in range(300):
+            x, y = rng.randrange(width), rng.randrange(height)
+            draw.line((x, y, x + rng.randrange(10, 120), y), fill=(20, 20, 20), width=2)
+        buf = io.BytesIO()
+        img.save(buf, "PNG")
+        frames.append(buf.getvalue())
+    return frames
+
+
+# ------------------------------------------------------------------
+# Server
+# ------------------------------------------------------------------
+
+def _rss_bytes(pid: int) -> int:
+    """Resident memory of `pid` and its children (the gunicorn workers)."""
+    total = 0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1]) * 1024
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(c) for c in f.read().split()]
+    except OSError:
+        return total
+    return total + sum(_rss_bytes(child) for child in children)
+
+
+def _start_server(args, workdir: str, db_path: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "APP_MODULE": "benchmarks.fleet_app:app",
+        "PORT": str(args.port),
+        "WEB_CONCURRENCY": str(args.workers),
+        "FLEET_DB": db_path,
+        "BLOB_STORE": "local",
+        "BLOB_STORE_PATH": os.path.join(workdir, "blobs"),
+        "UPLOAD_TMP_PATH": os.path.join(workdir, "uploads"),
+        "ARCHIVE_PATH": os.path.join(workdir, "archive"),
+        "RETENTION_ENABLED": "0",
+        "ADMISSION_UPLOAD_RATE": os.getenv("ADMISSION_UPLOAD_RATE", "0"),
+        "ADMISSION_ACTIVITY_RATE": os.getenv("ADMISSION_ACTIVITY_RATE", "0"),
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+    }
+    log = open(os.path.join(workdir, "server.log"), "wb")
+    return subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+                            env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def _wait_ready(client: httpx.AsyncClient, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+# ------------------------------------------------------------------
+# Load
+# ------------------------------------------------------------------
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.shed = defaultdict(int)
+
+    async def call(self, label: str, request):
+        start = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError:
+            response = None
+        self.latencies[label].append(time.perf_counter() - start)
+        if response is not None and response.status_code in (429, 503) and "retry-after" in response.headers:
+            self.shed[label] += 1
+            return None
+        if response is None or response.status_code >= 400:
+            self.errors[label] += 1
+            return None
+        return response
+
+
+def _jitter(seconds: float) -> float:
+    return seconds * random.uniform(0.8, 1.2)
+
+
+def _activity(email: str, interval: float) -> dict:
+    now = datetime.now()
+    return {"user_email": email, "events": [
+        {"timestamp": (now - timedelta(seconds=interval * k / 4)).isoformat(),
+         "state": random.choice(("active", "active", "idle")),
+         "app": "Code", "window": f"report-{random.randrange(50)}.py"}
+        for k in range(4)
+    ]}
+
+
+async def _agent(i: int, client: httpx.AsyncClient, rec: Recorder, frames: list, args, stop_at: float):
+    email = _email(i)
+    await asyncio.sleep(random.uniform(0, args.interval))  # fleets don't boot in lockstep
+    if not await rec.call("POST /login", client.post("/login", json={"email": email, "password": "x"})):
+        return
+    frame = random.choice(frames)
+    while time.monotonic() < stop_at:
+        started = await rec.call("POST /sessions/start", client.post("/sessions/start", json={"user_email": email}))
+        if not started:
+            await asyncio.sleep(_jitter(args.interval))
+            continue
+        session_id = started.json()["session_id"]
+        session_end = min(time.monotonic() + args.session_length, stop_at)
+        while time.monotonic() < session_end:
+            await asyncio.sleep(_jitter(args.interval))
+            if random.random() >= args.idle:
+                frame = random.choice(frames)
+            await rec.call("POST /upload-screenshot", client.post(
+                "/upload-screenshot", data={"user_email": email},
+                files={"screenshot": ("screen.png", frame, "image/png")},
+            ))
+            await rec.call("POST /activity/batch", client.post("/activity/batch", json=_activity(email, args.interval)))
+        await rec.call("POST /sessions/end/{id}", client.post(f"/sessions/end/{session_id}", json={"user_email": email}))
+
+
+async def _reader(client: httpx.AsyncClient, rec: Recorder, args, stop_at: float):
+    today = date.today().isoformat()
+    reads = [
+        ("GET /api/dashboard", lambda e: client.get("/api/dashboard", params={
+            "email": e, "start_date": today, "end_date": today})),
+        ("GET /api/dashboard-summary", lambda e: client.get("/api/dashboard-summary", params={"email": e})),
+        ("GET /api/screenshots", lambda e: client.get("/api/screenshots", params={
+            "email": e, "start_date": today, "end_date": today})),
+        ("GET /api/live/status", lambda e: client.get("/api/live/status")),
+    ]
+    while time.monotonic() < stop_at:
+        await asyncio.sleep(_jitter(args.read_interval))
+        label, request = random.choice(reads)
+        await rec.call(label, request(_email(random.randrange(args.agents))))
+
+
+async def _sample_memory(pid: int, samples: list, stop: asyncio.Event):
+    while not stop.is_set():
+        samples.append(_rss_bytes(pid))
+        try:
+            await asyncio.wait_for(stop.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _run(args, server: subprocess.Popen, frames: list) -> dict:
+    rec = Recorder()
+    connections = args.agents + args.readers
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=60) as client:
+        await _wait_ready(client)
+        memory = [_rss_bytes(server.pid)]
+        stop_sampling = asyncio.Event()
+        sampler = asyncio.create_task(_sample_memory(server.pid, memory, stop_sampling))
+        started = time.monotonic()
+        stop_at = started + args.duration
+        await asyncio.gather(
+            *(_agent(i, client, rec, frames, args, stop_at) for i in range(args.agents)),
+            *(_reader(client, rec, args, stop_at) for _ in range(args.readers)),
+        )
+        elapsed = time.monotonic() - started
+        stop_sampling.set()
+        await sampler
+    return _summarise(rec, elapsed, memory)
+
+
+# ------------------------------------------------------------------
+# Report
+# ------------------------------------------------------------------
+
+def _percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+def _summarise(rec: Recorder, elapsed: float, memory: list) -> dict:
+    endpoints = {}
+    for label, values in sorted(rec.latencies.items()):
+        endpoints[label] = {
+            "count": len(values),
+            "errors": rec.errors[label],
+            "shed": rec.shed[label],
+            "rate": round(len(values) / elapsed, 2),
+            "p50_ms": round(_percentile(values, 50) * 1000, 1),
+            "p95_ms": round(_percentile(values, 95) * 1000, 1),
+            "p99_ms": round(_percentile(values, 99) * 1000, 1),
+        }
+    return {
+        "elapsed_s": round(elapsed, 1),
+        "requests": sum(e["count"] for e in endpoints.values()),
+        "errors": sum(e["errors"] for e in endpoints.values()),
+        "shed": sum(e["shed"] for e in endpoints.values()),
+        "throughput": round(sum(e["count"] for e in endpoints.values()) / elapsed, 2),
+        "rss_start_mb": round(memory[0] / 2 ** 20, 1),
+        "rss_peak_mb": round(max(memory) / 2 ** 20, 1),
+        "endpoints": endpoints,
+    }
+
+
+def _print_report(result: dict):
+    print(f"{'endpoint':<28} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'shed':>6}")
+    for label, e in result["endpoints"].items():
+        print(f"{label:<28} {e['count']:>7} {e['rate']:8.1f} {e['p50_ms']:8.1f} {e['p95_ms']:8.1f} "
+              f"{e['p99_ms']:8.1f} {e['errors']:>7} {e['shed']:>6}")
+    print(f"\n{result['requests']} requests in {result['elapsed_s']}s: {result['throughput']:.1f} req/s, "
+          f"{result['errors']} errors, {result['shed']} shed")
+    print(f"server RSS {result['rss_start_mb']} MB at start, {result['rss_peak_mb']} MB peak")
+
+
+def _compare(result: dict, baseline: dict, tolerance: float, slack_ms: float) -> list:
+    """Regressions beyond `tolerance`, as printable lines."""
+    regressions = []
+
+    def worse(name, now, before, higher_is_worse=True, slack=0.0):
+        if not before:
+            return
+        change = (now - before) / before
+        if (change if higher_is_worse else -change) > tolerance and abs(now - before) > slack:
+            regressions.append(f"{name}: {before} -> {now} ({change:+.0%})")
+
+    worse("throughput req/s", result["throughput"], baseline["throughput"], higher_is_worse=False)
+    worse("peak RSS MB", result["rss_peak_mb"], baseline["rss_peak_mb"])
+    for label, e in result["endpoints"].items():
+        before = baseline["endpoints"].get(label)
+        if before is None:
+            continue
+        worse(f"{label} p95 ms", e["p95_ms"], before["p95_ms"], slack=slack_ms)
+        if e["errors"] and not before["errors"]:
+            regressions.append(f"{label}: {e['errors']} errors, baseline had none")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=50)
+    parser.add_argument("--readers", type=int, default=5)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between an agent's uploads")
+    parser.add_argument("--session-length", type=float, default=30.0)
+    parser.add_argument("--read-interval", type=float, default=1.0)
+    parser.add_argument("--idle", type=float, default=0.5, help="share of uploads repeating the last frame")
+    parser.add_argument("--image-size", default="1280x720")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8913)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--slack-ms", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    frames = _frames(16, args.image_size)
+    with tempfile.TemporaryDirectory(prefix="fleet-") as workdir:
+        db_path = os.path.join(workdir, "fleet.sqlite3")
+        _seed(db_path, args.agents)
+        server = _start_server(args, workdir, db_path)
+        try:
+            result = asyncio.run(_run(args, server, frames))
+        except RuntimeError:
+            with open(os.path.join(workdir, "server.log")) as f:
+                sys.stderr.write(f.read()[-4000:])
+            raise
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+
+    print(f"{os.cpu_count()} CPUs, {args.agents} agents, {args.readers} readers, {args.duration:.0f}s\n")
+    _print_report(result)
+
+    settings = {name: getattr(args, name) for name in _COMPARABLE}
+    record = {"settings": settings, "host": {"cpus": os.cpu_count(), "python": platform.python_version()},
+              "recorded_at": datetime.now().isoformat(timespec="seconds"), **result}
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(record, f, indent=2)
+            f.write("\n")
+        print(f"\nbaseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["settings"] != settings:
+        print(f"\nbaseline {args.baseline} was recorded with other settings; not compared")
+        return
+    regressions = _compare(result, baseline, args.tolerance, args.slack_ms)
+    print(f"\ncompared with baseline from {baseline['recorded_at']} (tolerance {args.tolerance:.0%}):")
+    for line in regressions or ["no regressions"]:
+        print(f"  {line}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Size and speed of screenshot recompression per output format.
+
+Encodes every PNG in ``--fixtures`` (or a generated set of desktop-like
+1920x1080 screenshots when no directory is given) with each format and
+reports the average output size, the saving against the PNG, the encode
+time per image and the throughput of a ``--workers`` sized pool.
+
+    python -m benchmarks.bench_recompress --fixtures ./screens --formats WEBP JPEG AVIF --quality 80
+"""
+import argparse
+import glob
+import io
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageDraw, features
+
+from app.recompress import encode
+
+
+def _synthetic_screens(count: int, seed: int = 7):
+    """PNG bytes of fake desktops: title bars, text lines, a photo-like panel."""
+    rng = random.Random(seed)
+    screens = []
+    for _ in range(count):
+        img = Image.new("RGB", (1920, 1080), (236, 239, 244))
+        draw = ImageDraw.Draw(img)
+        draw.rectangle((0, 1040, 1920, 1080), fill=(32, 34, 40))  # taskbar
+        for _ in range(rng.randint(2, 4)):
+            x, y = rng.randint(0, 900), rng.randint(0, 500)
+            w, h = rng.randint(600, 1000), rng.randint(350, 520)
+            draw.rectangle((x, y, x + w, y + h), fill="white", outline=(180, 180, 180))
+            draw.rectangle((x, y, x + w, y + 28), fill=(rng.randint(40, 90), 90, 160))
+            for line in range(y + 40, y + h - 14, 18):
+                draw.text((x + 12, line), "".join(rng.choice("abcdefgh ijklmnop") for _ in range(70)),
+                          fill=(30, 30, 30))
+        # a gradient "photo" panel, the part that PNG compresses worst
+        panel = Image.linear_gradient("L").resize((480, 320)).convert("RGB")
+        noise = Image.effect_noise((480, 320), 40).convert("RGB")
+        img.paste(Image.blend(panel, noise, 0.5), (rng.randint(0, 1400), rng.randint(0, 700)))
+        out = io.BytesIO()
+        img.save(out, format="PNG")
+        screens.append(out.getvalue())
+    return screens
+
+
+def _load(fixtures: str):
+    return [open(path, "rb").read() for path in sorted(glob.glob(os.path.join(fixtures, "*.png")))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", default=None, help="directory of PNG screenshots")
+    parser.add_argument("--count", type=int, default=12, help="generated screenshots without --fixtures")
+    parser.add_argument("--formats", nargs="+", default=["WEBP", "JPEG", "AVIF"])
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--max-px", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    screens = _load(args.fixtures) if args.fixtures else _synthetic_screens(args.count)
+    if not screens:
+        parser.error("no PNG files found")
+    original = sum(map(len, screens))
+    print(f"{len(screens)} screenshots, {original / len(screens) / 1024:.0f} KiB PNG on average\n")
+    print(f"{'format':<6} {'avg KiB':>8} {'saved':>7} {'ms/img':>8} {'img/s (' + str(args.workers) + ' workers)':>20}")
+
+    for fmt in args.formats:
+        fmt = fmt.upper()
+        if fmt == "AVIF" and not features.check("avif"):
+            print(f"{fmt:<6} not supported by this Pillow build")
+            continue
+
+        def one(data):
+            return len(encode(io.BytesIO(data), fmt, args.quality, args.max_px)[0])
+
+        start = time.perf_counter()
+        sizes = [one(data) for data in screens]
+        serial = time.perf_counter() - start
+
+        with ThreadPoolExecutor(args.workers) as pool:
+            start = time.perf_counter()
+            list(pool.map(one, screens))
+            pooled = time.perf_counter() - start
+
+        total = sum(sizes)
+        print(f"{fmt:<6} {total / len(sizes) / 1024:8.0f} {1 - total / original:7.1%} "
+              f"{serial / len(screens) * 1000:8.1f} {len(screens) / pooled:20.1f}")
+
+
+if __name__ == "__main__":
+    main()
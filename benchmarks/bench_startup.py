@@ -0,0 +1,82 @@
+"""Cold-start cost of the API: import time and time to first request.
+
+For each ``--app`` this runs ``--runs`` fresh processes and reports the
+median of:
+
+    import     seconds to import the module (nothing may touch the network)
+    first req  seconds from launching uvicorn to the first 200 on ``/``
+    ready      seconds until ``/ready`` answers 200, or "-" if the database
+               is unreachable within ``--ready-timeout``
+
+    python -m benchmarks.bench_startup --app app.main:app app.main_backup:app --runs 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+_IMPORT_SNIPPET = "import importlib, time; t = time.perf_counter(); importlib.import_module({module!r}); " \
+                  "print(time.perf_counter() - t)"
+
+
+def _import_time(module: str) -> float:
+    out = subprocess.run([sys.executable, "-c", _IMPORT_SNIPPET.format(module=module)],
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _poll(client: httpx.Client, path: str, deadline: float):
+    while time.perf_counter() < deadline:
+        try:
+            if client.get(path).status_code == 200:
+                return time.perf_counter()
+        except httpx.TransportError:
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def _serve_times(target: str, port: int, ready_timeout: float):
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", target, "--port", str(port), "--log-level", "warning"],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+            first = _poll(client, "/", started + 60)
+            ready = _poll(client, "/ready", (first or started) + ready_timeout)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return (first - started if first else None), (ready - started if ready else None)
+
+
+def _median(values):
+    values = [v for v in values if v is not None]
+    return f"{statistics.median(values):.2f}" if values else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", nargs="+", default=["app.main:app", "app.main_backup:app"])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8912)
+    parser.add_argument("--ready-timeout", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{'app':<24} {'import s':>9} {'first req s':>12} {'ready s':>8}")
+    for target in args.app:
+        module = target.split(":")[0]
+        imports, firsts, readies = [], [], []
+        for _ in range(args.runs):
+            imports.append(_import_time(module))
+            first, ready = _serve_times(target, args.port, args.ready_timeout)
+            firsts.append(first)
+            readies.append(ready)
+        print(f"{target:<24} {_median(imports):>9} {_median(firsts):>12} {_median(readies):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Throughput of the gunicorn launcher as the worker count grows.
+
+Starts ``gunicorn -c gunicorn.conf.py`` once per ``--workers`` value,
+drives it with ``--concurrency`` keep-alive clients for ``--duration``
+seconds and reports requests/s and latency percentiles. The default
+target is a DB-free endpoint in this file that does the CPU work of a
+real request: validating an activity batch and serialising a page of
+screenshot rows. Point ``--app``/``--path`` at the real app to include
+the database.
+
+    python -m benchmarks.bench_workers --workers 1 2 4 --concurrency 64 --duration 10
+
+Throughput should grow close to linearly up to the number of cores and
+flatten after; on a single core extra workers only add context switches.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi import FastAPI
+
+from app.routers.activity import ActivityBatch
+
+app = FastAPI()
+
+_EVENTS = [
+    {"timestamp": (datetime(2026, 1, 15, 9) + timedelta(seconds=10 * i)).isoformat(),
+     "state": "active" if i % 7 else "idle", "app": "Code", "window": f"main.py - project {i}"}
+    for i in range(200)
+]
+BATCH = {"user_email": "bench@example.com", "events": _EVENTS}
+
+
+@app.post("/bench/activity")
+async def bench_activity(batch: ActivityBatch):
+    rows = [
+        {"id": i, "user_email": batch.user_email, "capture_time": e.timestamp,
+         "url": f"/screenshot/{i}", "thumbnail_url": f"/screenshot/{i}/thumbnail", "state": e.state}
+        for i, e in enumerate(batch.events)
+    ]
+    return {"success": True, "data": rows}
+
+
+async def _wait_ready(client: httpx.AsyncClient, url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.get(url)
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not come up")
+
+
+async def _load(base: str, path: str, concurrency: int, duration: float):
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=30) as client:
+        await _wait_ready(client, "/")
+        stop_at = time.monotonic() + duration
+
+        async def one_client():
+            nonlocal errors
+            while time.monotonic() < stop_at:
+                start = time.perf_counter()
+                try:
+                    r = await client.post(path, json=BATCH)
+                    if r.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        started = time.monotonic()
+        await asyncio.gather(*(one_client() for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+    return latencies, errors, elapsed
+
+
+def _percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--app", default="benchmarks.bench_workers:app")
+    parser.add_argument("--path", default="/bench/activity")
+    parser.add_argument("--port", type=int, default=8911)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.concurrency} clients, {args.duration:.0f}s per run\n")
+    print(f"{'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'scaling':>8}")
+    baseline = None
+    for count in args.workers:
+        env = {**os.environ, "APP_MODULE": args.app, "PORT": str(args.port), "WEB_CONCURRENCY": str(count)}
+        server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+                                  env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            latencies, errors, elapsed = asyncio.run(
+                _load(f"http://127.0.0.1:{args.port}", args.path, args.concurrency, args.duration)
+            )
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+        rate = len(latencies) / elapsed
+        baseline = baseline or rate
+        print(f"{count:>7} {rate:9.0f} {_percentile(latencies, 50) * 1000:8.1f} "
+              f"{_percentile(latencies, 99) * 1000:8.1f} {errors:>7} {rate / baseline:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+"""The full API (app.main_backup) on the SQLite stand-in; served by bench_fleet.
+
+    FLEET_DB=/tmp/fleet.sqlite3 uvicorn benchmarks.fleet_app:app
+"""
+import os
+
+from benchmarks.sqlite_standin import install
+
+install(os.environ["FLEET_DB"])
+
+from app.main_backup import app  # noqa: E402  (db must be swapped before the app builds its pool)
@@ -0,0 +1,307 @@
+"""A SQLite stand-in for MySQL, for running the real app on a laptop.
+
+`install(path)` swaps `db._connect` for a factory of SQLite connections
+that speak the small slice of the mysql.connector API the app uses
+(`cursor(dictionary=...)`, `execute`/`executemany`, `fetchone`/`fetchall`,
+`lastrowid`, `rowcount`, `ping`, ...). Everything above the connection
+stays real: the pool, the DB executor, query timing, caches, the blob
+store. Queries are rewritten on the way in for the MySQL-isms the API
+issues (`%s` placeholders, `ON DUPLICATE KEY UPDATE`, `+ INTERVAL n DAY`,
+`TIMESTAMPDIFF`, `UNIX_TIMESTAMP`, ...) and DATETIME strings come back
+as datetimes.
+
+Only the tables the agent and dashboard paths touch are created, and
+timings are SQLite's, not MySQL's: use it to compare two versions of the
+app with each other, not to size a database server. Paths that need
+MySQL itself (partition maintenance, `GET_LOCK`) fail the same way they
+would against an unreachable server.
+"""
+import functools
+import re
+import sqlite3
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+from app.database import db, TABLE_PREFIX
+
+SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS av_user (
+        userid INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT NOT NULL UNIQUE,
+        status TEXT NOT NULL DEFAULT 'Active',
+        sstime INTEGER NULL,
+        inactivitythreshold INTEGER NULL,
+        config_updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS av_master_account (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT NOT NULL UNIQUE,
+        accstatus TEXT NOT NULL DEFAULT 'Active',
+        config_updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS {TABLE_PREFIX}tblsession (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_email TEXT NOT NULL,
+        start_time DATETIME NOT NULL,
+        end_time DATETIME NULL,
+        status TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_session_user_start ON {TABLE_PREFIX}tblsession (user_email, start_time);
+    CREATE INDEX IF NOT EXISTS idx_session_open ON {TABLE_PREFIX}tblsession (status, end_time, user_email);
+    CREATE TABLE IF NOT EXISTS {TABLE_PREFIX}av_tblsnap (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        screenshot_data BLOB NULL,
+        blob_key TEXT NULL,
+        content_type TEXT NULL,
+        size_bytes INTEGER NULL,
+        thumb_key TEXT NULL,
+        phash TEXT NULL,
+        ref_id INTEGER NULL,
+        capture_time DATETIME NOT NULL,
+        archive_bundle TEXT NULL,
+        archived_at DATETIME NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_snap_user_capture ON {TABLE_PREFIX}av_tblsnap (user_id, capture_time);
+    CREATE INDEX IF NOT EXISTS idx_snap_blob_key ON {TABLE_PREFIX}av_tblsnap (blob_key);
+    CREATE TABLE IF NOT EXISTS {TABLE_PREFIX}av_manual_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_email TEXT NOT NULL,
+        start_time DATETIME NOT NULL,
+        end_time DATETIME NOT NULL,
+        notes TEXT NULL,
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_manual_user_start ON {TABLE_PREFIX}av_manual_logs (user_email, start_time);
+    CREATE TABLE IF NOT EXISTS {TABLE_PREFIX}av_daily_activity (
+        user_email TEXT NOT NULL,
+        day DATE NOT NULL,
+        tracked_seconds INTEGER NOT NULL DEFAULT 0,
+        session_count INTEGER NOT NULL DEFAULT 0,
+        first_activity DATETIME NULL,
+        last_activity DATETIME NULL,
+        manual_seconds INTEGER NOT NULL DEFAULT 0,
+        open_count INTEGER NOT NULL DEFAULT 0,
+        open_start_sum INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_email, day)
+    );
+    CREATE TABLE IF NOT EXISTS {TABLE_PREFIX}av_activity (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_email TEXT NOT NULL,
+        sample_time DATETIME NOT NULL,
+        state TEXT NOT NULL,
+        app_name TEXT NULL,
+        window_title TEXT NULL,
+        received_at DATETIME NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_activity_user_time ON {TABLE_PREFIX}av_activity (user_email, sample_time);
+"""
+
+# 64-bit unsigned values overflow SQLite's signed INTEGER; stored as text
+_UNSIGNED_COLUMNS = {"phash"}
+_INT64_MAX = 2 ** 63 - 1
+
+_DATETIME_RE = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(\.\d{1,6})?$")
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+_REWRITES = [
+    (re.compile(r"\bINSERT IGNORE\b", re.I), "INSERT OR IGNORE"),
+    (re.compile(r"\bTIMESTAMPDIFF\(\s*(\w+)\s*,", re.I), r"TIMESTAMPDIFF('\1',"),
+    (re.compile(r"([\w.?]+)\s*([+-])\s*INTERVAL\s+(\d+)\s+(DAY|HOUR|MINUTE|SECOND)\b", re.I),
+     r"datetime(\1, '\2\3 \4')"),
+    (re.compile(r"\bGREATEST\(", re.I), "MAX("),
+    (re.compile(r"\bLEAST\(", re.I), "MIN("),
+    (re.compile(r"<=>"), "IS"),
+]
+_UPSERT_RE = re.compile(r"\bON DUPLICATE KEY UPDATE\b", re.I)
+_VALUES_FN_RE = re.compile(r"\bVALUES\((\w+)\)", re.I)
+
+
+@functools.lru_cache(maxsize=512)
+def translate(sql: str) -> str:
+    """MySQL statement -> SQLite statement, for the constructs the API uses."""
+    sql = sql.replace("%s", "?")
+    for pattern, repl in _REWRITES:
+        sql = pattern.sub(repl, sql)
+    parts = _UPSERT_RE.split(sql, maxsplit=1)
+    if len(parts) == 2:
+        # No conflict target: SQLite (3.35+) then means "any unique key", like MySQL
+        sql = parts[0] + " ON CONFLICT DO UPDATE SET " + _VALUES_FN_RE.sub(r"excluded.\1", parts[1])
+    return sql
+
+
+def _param(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, int) and not isinstance(value, bool) and value > _INT64_MAX:
+        return str(value)
+    return value
+
+
+def _value(column: str, value):
+    if isinstance(value, str):
+        if _DATETIME_RE.match(value):
+            return datetime.fromisoformat(value)
+        if _DATE_RE.match(value):
+            return date.fromisoformat(value)
+        if column in _UNSIGNED_COLUMNS:
+            return int(value)
+    return value
+
+
+# ------------------------------------------------------------------
+# MySQL functions SQLite lacks
+# ------------------------------------------------------------------
+
+def _to_datetime(value) -> datetime:
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _unix_timestamp(*args):
+    if not args:
+        return int(time.time())
+    return None if args[0] is None else int(_to_datetime(args[0]).timestamp())
+
+
+_UNIT_SECONDS = {"SECOND": 1, "MINUTE": 60, "HOUR": 3600, "DAY": 86400}
+
+
+def _timestampdiff(unit, start, end):
+    if start is None or end is None:
+        return None
+    seconds = (_to_datetime(end) - _to_datetime(start)).total_seconds()
+    return int(seconds / _UNIT_SECONDS[unit.upper()])  # MySQL truncates towards zero
+
+
+def _sec_to_time(seconds):
+    if seconds is None:
+        return None
+    seconds = int(seconds)
+    sign, seconds = ("-", -seconds) if seconds < 0 else ("", seconds)
+    return f"{sign}{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def _time_format(value, fmt):
+    if value is None:
+        return None
+    return _to_datetime(value).strftime(fmt.replace("%i", "%M").replace("%s", "%S"))
+
+
+def _now():
+    return datetime.now().isoformat(sep=" ", timespec="seconds")
+
+
+_FUNCTIONS = [
+    ("UNIX_TIMESTAMP", -1, _unix_timestamp),
+    ("TIMESTAMPDIFF", 3, _timestampdiff),
+    ("SEC_TO_TIME", 1, _sec_to_time),
+    ("TIME_FORMAT", 2, _time_format),
+    ("NOW", 0, _now),
+]
+
+
+# ------------------------------------------------------------------
+# mysql.connector look-alikes
+# ------------------------------------------------------------------
+
+class StandinCursor:
+    def __init__(self, conn: sqlite3.Connection, dictionary: bool = False):
+        self._cursor = conn.cursor()
+        self._dictionary = dictionary
+        self._columns = ()
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, query: str, params=()):
+        self._cursor.execute(translate(query), [_param(p) for p in params or ()])
+        self._columns = tuple(d[0] for d in self._cursor.description or ())
+
+    def executemany(self, query: str, seq_params):
+        self._cursor.executemany(translate(query), [[_param(p) for p in row] for row in seq_params])
+        self._columns = ()
+
+    def _row(self, raw):
+        values = [_value(c, v) for c, v in zip(self._columns, raw)]
+        return dict(zip(self._columns, values)) if self._dictionary else tuple(values)
+
+    def fetchone(self):
+        raw = self._cursor.fetchone()
+        return None if raw is None else self._row(raw)
+
+    def fetchall(self):
+        return [self._row(raw) for raw in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._cursor.close()
+
+
+class StandinConnection:
+    def __init__(self, path: str, busy_timeout: float = 30.0):
+        # Pooled connections move between executor threads, one at a time
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for name, nargs, fn in _FUNCTIONS:
+            self._conn.create_function(name, nargs, fn)
+
+    def cursor(self, dictionary: bool = False, **_):
+        return StandinCursor(self._conn, dictionary)
+
+    def start_transaction(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+
+    def rollback(self):
+        if self._conn.in_transaction:
+            self._conn.execute("ROLLBACK")
+
+    def ping(self, reconnect: bool = False):
+        self._conn.execute("SELECT 1")
+
+    def consume_results(self):
+        pass
+
+    def close(self):
+        self._conn.close()
+
+
+def create_schema(path: str):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+    finally:
+        conn.close()
+
+
+def install(path: str):
+    """Point the app's database at the SQLite file `path`, creating the tables."""
+    create_schema(path)
+    db._connect = functools.partial(StandinConnection, path)
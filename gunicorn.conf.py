@@ -0,0 +1,73 @@
+"""Multi-process production server.
+
+    gunicorn -c gunicorn.conf.py
+
+Settings come from the environment:
+
+    APP_MODULE         ASGI app to serve (default app.main:app)
+    PORT               listen port (default 8000)
+    WEB_CONCURRENCY    worker processes (default: one per CPU); admission
+                       limits (ADMISSION_*) apply to each worker separately
+    PRELOAD_APP        1 imports the app once in the master before forking,
+                       so workers share its memory and boot faster (default 1)
+    GRACEFUL_TIMEOUT   seconds a worker gets to stop after SIGTERM (default 30)
+    WORKER_TIMEOUT     seconds before a hung worker is killed (default 60)
+    MAX_REQUESTS       recycle a worker after this many requests (default 0, never)
+
+On SIGTERM each worker stops accepting, closes live dashboard streams,
+lets in-flight requests finish for GRACEFUL_TIMEOUT minus SHUTDOWN_RESERVE
+seconds, and then runs the app's shutdown hooks (activity buffer flush,
+recompression queue, ...) in the reserve. Connection pools, the DB
+thread pool and the log writer thread reset themselves in each forked
+worker (see app.pool, app.logs).
+"""
+import multiprocessing
+import os
+
+from gunicorn.arbiter import Arbiter
+from uvicorn.workers import UvicornWorker
+
+from app.server import DrainingServer
+
+wsgi_app = os.getenv("APP_MODULE", "app.main:app")
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+preload_app = os.getenv("PRELOAD_APP", "1") == "1"
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+keepalive = 5
+forwarded_allow_ips = "*"
+
+SHUTDOWN_RESERVE = int(os.getenv("SHUTDOWN_RESERVE", "10"))
+
+if workers > 1:
+    # Presence is held per process; keep the workers' views in step
+    os.environ.setdefault("PRESENCE_RESYNC", "15")
+
+
+class DrainingUvicornWorker(UvicornWorker):
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        "timeout_graceful_shutdown": max(graceful_timeout - SHUTDOWN_RESERVE, 1),
+    }
+
+    async def _serve(self) -> None:
+        self.config.app = self.wsgi
+        server = DrainingServer(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            raise SystemExit(Arbiter.WORKER_BOOT_ERROR)
+
+
+worker_class = DrainingUvicornWorker
+
+
+def post_fork(server, worker):
+    server.log.info("worker %s booted (preload=%s)", worker.pid, preload_app)
+
+
+def worker_exit(server, worker):
+    server.log.info("worker %s exited", worker.pid)
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from app.admission import AdmissionController, Lane, TokenBucket
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_lane_admits_up_to_concurrency_then_queues_then_sheds():
+    async def main():
+        lane = Lane("test", concurrency=1, queue=1, shed_on_backlog=False)
+        assert await lane.acquire(1) is None
+        waiter = asyncio.ensure_future(lane.acquire(1))
+        await settle()
+        assert await lane.acquire(1) == "too many requests queued"
+        lane.release()
+        assert await waiter is None
+        assert (lane.active, lane.admitted, lane.queued, lane.shed_full) == (1, 2, 1, 1)
+    run(main())
+
+
+def test_release_hands_the_slot_to_the_oldest_waiter():
+    async def main():
+        lane = Lane("test", concurrency=1, queue=5, shed_on_backlog=False)
+        await lane.acquire(1)
+        order = []
+
+        async def request(name):
+            await lane.acquire(1)
+            order.append(name)
+
+        waiters = [asyncio.ensure_future(request(n)) for n in "abc"]
+        await settle()
+        for _ in waiters:
+            lane.release()
+            await settle()
+        assert order == ["a", "b", "c"]
+        assert lane.active == 1
+        lane.release()
+        assert lane.active == 0
+    run(main())
+
+
+def test_newcomer_does_not_jump_the_queue():
+    async def main():
+        lane = Lane("test", concurrency=1, queue=5, shed_on_backlog=False)
+        await lane.acquire(1)
+        waiter = asyncio.ensure_future(lane.acquire(1))
+        await settle()
+        lane.release()  # handed to the waiter, not left free
+        newcomer = asyncio.ensure_future(lane.acquire(0.01))
+        assert await waiter is None
+        assert await newcomer == "timed out waiting for capacity"
+    run(main())
+
+
+def test_queued_request_times_out():
+    async def main():
+        lane = Lane("test", concurrency=1, queue=5, shed_on_backlog=False)
+        await lane.acquire(1)
+        assert await lane.acquire(0.01) == "timed out waiting for capacity"
+        assert (lane.shed_timeout, len(lane._waiters)) == (1, 0)
+        lane.release()
+        assert lane.active == 0
+    run(main())
+
+
+def test_cancel_while_queued_leaves_the_slot_accounting_intact():
+    async def main():
+        lane = Lane("test", concurrency=1, queue=5, shed_on_backlog=False)
+        await lane.acquire(1)
+        gone = asyncio.ensure_future(lane.acquire(1))
+        staying = asyncio.ensure_future(lane.acquire(1))
+        await settle()
+        gone.cancel()
+        await settle()
+        assert gone.cancelled()
+        lane.release()
+        assert await staying is None
+        assert lane.active == 1
+        lane.release()
+        assert (lane.active, len(lane._waiters)) == (0, 0)
+    run(main())
+
+
+def test_unlimited_lane_never_queues():
+    async def main():
+        lane = Lane("test", concurrency=0, queue=0, shed_on_backlog=False)
+        for _ in range(100):
+            assert await lane.acquire(0) is None
+        assert lane.active == 100
+    run(main())
+
+
+def test_token_bucket_allows_a_burst_then_refills_at_rate():
+    bucket = TokenBucket(rate=2.0, burst=3, now=0.0)
+    assert [bucket.take(0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take(0.0) == pytest.approx(0.5)
+    assert bucket.take(0.5) == 0.0
+    # Never saves up more than the burst
+    bucket.take(100.0)
+    assert [bucket.take(100.0) for _ in range(3)] == [0.0, 0.0, pytest.approx(0.5)]
+
+
+def test_rate_limits_are_per_agent_and_case_insensitive(monkeypatch):
+    monkeypatch.setenv("ADMISSION_UPLOAD_RATE", "0.001")
+    monkeypatch.setenv("ADMISSION_UPLOAD_BURST", "1")
+    controller = AdmissionController()
+    assert controller.check_rate("upload", "a@example.com") == 0
+    assert controller.check_rate("upload", "A@Example.com ") > 0
+    assert controller.check_rate("upload", "b@example.com") == 0
+    assert controller.check_rate("dashboard", "a@example.com") == 0  # no rate set
+
+
+@pytest.mark.parametrize("method, path, lane", [
+    ("POST", "/login", "critical"),
+    ("POST", "/sessions/end/42", "critical"),
+    ("POST", "/upload-screenshot", "upload"),
+    ("PUT", "/uploads/" + "a" * 32, "upload"),
+    ("POST", "/activity/batch", "activity"),
+    ("GET", "/api/dashboard", "dashboard"),
+    ("GET", "/api/exporter-stats", "dashboard"),
+    ("GET", "/api/live/stream", None),
+    ("GET", "/api/export", None),
+    ("GET", "/api/export/sessions", None),
+    ("GET", "/health", None),
+])
+def test_routes_map_to_lanes(method, path, lane):
+    found = AdmissionController().lane_for(method, path)
+    assert (found.name if found else None) == lane
@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from app.cache import ResultCache, TTLCache
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class Loader:
+    """Counts calls; each call waits for `release` before answering."""
+
+    def __init__(self, value="v", error=None):
+        self.value = value
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        call = self.calls
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return f"{self.value}{call}"
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_ttl_cache_expires_and_evicts(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("a", None) is None  # least recently used went first
+    now[0] += 10
+    assert cache.get("b", None) is None
+
+
+def test_concurrent_callers_share_one_load():
+    async def main():
+        cache, loader = ResultCache(), Loader()
+        callers = [asyncio.ensure_future(cache.get_or_load("u", "k", loader)) for _ in range(5)]
+        await settle()
+        loader.release.set()
+        results = await asyncio.gather(*callers)
+        assert results == ["v1"] * 5
+        assert loader.calls == 1
+        assert await cache.get_or_load("u", "k", loader) == "v1"  # now cached
+        assert cache.stats()["coalesced"] == 4
+    run(main())
+
+
+def test_cancelling_the_first_caller_does_not_cancel_the_others():
+    async def main():
+        cache, loader = ResultCache(), Loader()
+        first = asyncio.ensure_future(cache.get_or_load("u", "k", loader))
+        await settle()
+        second = asyncio.ensure_future(cache.get_or_load("u", "k", loader))
+        await settle()
+        first.cancel()
+        await settle()
+        loader.release.set()
+        assert await second == "v1"
+        assert first.cancelled()
+        assert await cache.get_or_load("u", "k", loader) == "v1"
+        assert loader.calls == 1
+    run(main())
+
+
+def test_load_completes_and_is_stored_when_every_caller_went_away():
+    async def main():
+        cache, loader = ResultCache(), Loader()
+        caller = asyncio.ensure_future(cache.get_or_load("u", "k", loader))
+        await settle()
+        caller.cancel()
+        loader.release.set()
+        await settle()
+        assert await cache.get_or_load("u", "k", loader) == "v1"
+    run(main())
+
+
+def test_invalidation_during_load_answers_waiters_but_does_not_store():
+    async def main():
+        cache, loader = ResultCache(), Loader()
+        caller = asyncio.ensure_future(cache.get_or_load("u", "k", loader))
+        await settle()
+        cache.invalidate("u")
+        # A caller after the invalidation must not join the stale load
+        later = asyncio.ensure_future(cache.get_or_load("u", "k", loader))
+        await settle()
+        loader.release.set()
+        assert await caller == "v1"
+        assert await later == "v2"
+        assert await cache.get_or_load("u", "k", loader) == "v2"
+        assert loader.calls == 2
+    run(main())
+
+
+def test_invalidate_drops_cached_entries_of_that_scope_only():
+    async def main():
+        cache, loader = ResultCache(), Loader()
+        loader.release.set()
+        assert await cache.get_or_load("u", "k", loader) == "v1"
+        assert await cache.get_or_load("w", "k", loader) == "v2"
+        cache.invalidate("u")
+        assert await cache.get_or_load("u", "k", loader) == "v3"
+        assert await cache.get_or_load("w", "k", loader) == "v2"
+    run(main())
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    async def main():
+        cache, loader = ResultCache(), Loader(error=RuntimeError("db down"))
+        callers = [asyncio.ensure_future(cache.get_or_load("u", "k", loader)) for _ in range(3)]
+        await settle()
+        loader.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        assert [str(r) for r in results] == ["db down"] * 3
+        assert cache.stats()["load_errors"] == 1
+
+        loader.error = None
+        assert await cache.get_or_load("u", "k", loader) == "v2"
+    run(main())
+
+
+def test_generations_are_forgotten_after_the_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.cache.time.monotonic", lambda: now[0])
+
+    async def main():
+        cache, loader = ResultCache(ttl=30), Loader()
+        loader.release.set()
+        assert await cache.get_or_load("u", "k", loader) == "v1"
+        for scope in range(100):
+            cache.invalidate(scope)
+        cache.invalidate("u")
+        assert cache.stats()["generations"] == 101
+        assert await cache.get_or_load("u", "k", loader) == "v2"
+
+        now[0] += 30
+        assert await cache.get_or_load("u", "k", loader) == "v3"  # v2 expired with its generation
+        assert cache.stats()["generations"] == 0
+        # Back at the default generation, the entry from before the invalidation is long gone
+        assert await cache.get_or_load("u", "k", loader) == "v3"
+    run(main())
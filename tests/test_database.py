@@ -0,0 +1,62 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.database import Database
+
+
+def one_thread_db() -> Database:
+    database = Database()
+    database._executor = ThreadPoolExecutor(max_workers=1)
+    return database
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0.01)
+
+
+def test_backlog_counts_work_no_thread_has_started():
+    async def main():
+        database = one_thread_db()
+        gate = threading.Event()
+        busy = asyncio.ensure_future(database.run(gate.wait))
+        queued = [asyncio.ensure_future(database.run(lambda: None)) for _ in range(3)]
+        await settle()
+        assert database.backlog() == 3
+        gate.set()
+        await asyncio.gather(busy, *queued)
+        assert database.backlog() == 0
+    asyncio.run(main())
+
+
+def test_cancelled_work_leaves_the_backlog():
+    async def main():
+        database = one_thread_db()
+        gate = threading.Event()
+        busy = asyncio.ensure_future(database.run(gate.wait))
+        queued = asyncio.ensure_future(database.run(lambda: None))
+        await settle()
+        queued.cancel()
+        await settle()
+        assert database.backlog() == 0
+        gate.set()
+        await busy
+        await settle()
+        assert database.backlog() == 0
+    asyncio.run(main())
+
+
+def test_errors_leave_the_backlog():
+    async def main():
+        database = one_thread_db()
+
+        def fail():
+            raise ValueError("boom")
+
+        try:
+            await database.run(fail)
+        except ValueError:
+            pass
+        assert database.backlog() == 0
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+import atexit
+import json
+import logging
+import os
+
+import pytest
+
+from app import logs
+
+
+@pytest.fixture
+def configured(tmp_path, monkeypatch):
+    monkeypatch.setattr(logs, "_listener", None)
+    monkeypatch.setattr(logs, "_queue_handler", None)
+    root = logging.getLogger("app")
+    propagate, level = root.propagate, root.level
+    path = tmp_path / "log.jsonl"
+    with open(path, "a") as stream:
+        logs.configure_logging("INFO", stream)
+        try:
+            yield path
+        finally:
+            atexit.unregister(logs._listener.stop)
+            if logs._listener._thread is not None:
+                logs._listener.stop()
+            root.removeHandler(logs._queue_handler)
+            root.propagate, root.level = propagate, level
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_child_writes_its_own_log_lines(configured):
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            logs.get_logger("app.test").info("from_child", extra={"pid": os.getpid()})
+            logs._listener.stop()  # os._exit skips atexit
+            code = 0
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+    logs.get_logger("app.test").info("from_parent")
+    logs._listener.stop()
+    events = {json.loads(line)["event"]: json.loads(line) for line in configured.read_text().splitlines()}
+    assert events["from_child"]["pid"] == pid
+    assert "from_parent" in events
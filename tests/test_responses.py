@@ -0,0 +1,33 @@
+import hashlib
+
+from app.responses import conditional_response, etag_matches, parse_range
+from app.screenshots import _build_response
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"x" * 100
+
+
+def test_id_addressed_screenshots_revalidate_instead_of_being_immutable():
+    response = _build_response({}, {"screenshot_data": PNG, "content_type": "image/png"})
+    cache_control = response.headers["cache-control"]
+    assert "immutable" not in cache_control
+    assert "must-revalidate" in cache_control
+    assert response.headers["etag"] == f'"{hashlib.sha256(PNG).hexdigest()}"'
+
+
+def test_matching_etag_gets_304():
+    etag = f'"{hashlib.sha256(PNG).hexdigest()}"'
+    response = _build_response({"if-none-match": etag}, {"screenshot_data": PNG})
+    assert response.status_code == 304
+
+
+def test_range_request_gets_206():
+    response = conditional_response({"range": "bytes=0-9"}, '"k"', "image/png", data=PNG)
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 0-9/{len(PNG)}"
+    assert response.body == PNG[:10]
+
+
+def test_parse_range_and_weak_etags():
+    assert parse_range("bytes=-5", 100) == (95, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert etag_matches('W/"a", "b"', '"a"')
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+import pytest
+
+from app import recompress, retention
+from app.blobstore import LocalBlobStore
+from app.recompress import Recompressor
+
+
+@pytest.fixture
+def blobs(tmp_path, monkeypatch):
+    store = LocalBlobStore(str(tmp_path))
+    monkeypatch.setattr(recompress, "blob_store", store)
+    return store
+
+
+class ReferenceCursor:
+    """Answers the "is this blob still used" query from a set of keys."""
+
+    def __init__(self, monkeypatch):
+        self.keys = set()
+        self._rows = []
+        monkeypatch.setattr(recompress.db, "fetchone_sync", self.fetchone_sync)
+
+    def execute(self, query, params=()):
+        self._rows = [{"used": 1}] if params[0] in self.keys else []
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone_sync(self, query, params=(), dictionary=True):
+        self.execute(query, params)
+        return self._rows[0] if self._rows else None
+
+
+@pytest.fixture
+def referenced(monkeypatch):
+    return ReferenceCursor(monkeypatch)
+
+
+@pytest.fixture
+def collector(monkeypatch):
+    recompressor = Recompressor(delete_grace=60)
+    monkeypatch.setattr(retention, "recompressor", recompressor)
+    return recompressor
+
+
+def test_released_blobs_outlive_the_grace_period_only_if_unused(blobs, referenced, collector):
+    old = blobs.put_bytes(b"old frame").key
+    reused = blobs.put_bytes(b"matched by an upload").key
+    kept = blobs.put_bytes(b"still referenced").key
+    referenced.keys.add(kept)
+
+    assert retention._release_blobs(referenced, [old, reused, kept, None, old]) == 2
+    assert blobs.exists(old) and blobs.exists(reused)
+
+    # An upload dedupes against `reused` before the collector runs
+    referenced.keys.add(reused)
+    assert collector.collect(now=collector.retired_until()) == 1
+    assert not blobs.exists(old)
+    assert blobs.exists(reused) and blobs.exists(kept)
+
+
+def test_collect_waits_for_the_grace_period(blobs, referenced, collector):
+    key = blobs.put_bytes(b"frame").key
+    retention._release_blobs(referenced, [key])
+    assert collector.collect(now=collector.retired_until() - 1) == 0
+    assert blobs.exists(key)
+
+
+def test_scheduler_runs_passes_off_the_db_executor(monkeypatch):
+    threads = []
+    scheduler = retention.RetentionScheduler(interval=3600)
+
+    def fake_run(dry_run, email, should_stop):
+        threads.append(threading.current_thread().name)
+        return {"dry_run": False}
+
+    monkeypatch.setattr(retention, "run", fake_run)
+    monkeypatch.setattr(retention.partitions, "maintain", lambda: None)
+
+    async def main():
+        scheduler.start()
+        while not scheduler.runs:
+            await asyncio.sleep(0.01)
+        await scheduler.stop()
+    asyncio.run(main())
+
+    assert scheduler.runs == 1
+    assert threads and not threads[0].startswith("db")
@@ -0,0 +1,140 @@
+from datetime import date, datetime, timedelta
+
+from app.timeline import compute
+
+DAY = date(2026, 1, 15)
+NOW = datetime(2026, 1, 20, 12, 0)
+
+
+def at(hour, minute=0, day=DAY):
+    return datetime.combine(day, datetime.min.time()) + timedelta(hours=hour, minutes=minute)
+
+
+def inputs(sessions=(), manual=(), samples=(), threshold=30 * 60, email="a@example.com"):
+    return {
+        "emails": [email],
+        "thresholds": {email: threshold},
+        "sessions": [(email, *s) for s in sessions],
+        "manual": [(email, *m) for m in manual],
+        "samples": [(email, *s) for s in samples],
+    }
+
+
+def active_every(minutes, start, end):
+    t, out = start, []
+    while t <= end:
+        out.append((t, "active"))
+        t += timedelta(minutes=minutes)
+    return out
+
+
+def only_day(result, email="a@example.com"):
+    (day,) = result[email]
+    return day
+
+
+def test_overlapping_sessions_count_once():
+    day = only_day(compute(inputs(sessions=[(at(9), at(11)), (at(10), at(12))]), DAY, DAY, NOW))
+    assert day["tracked_seconds"] == 3 * 3600
+    assert day["worked_seconds"] == 3 * 3600
+
+
+def test_idle_sample_is_subtracted():
+    samples = active_every(10, at(9), at(9, 50)) + [(at(10), "idle")] + active_every(10, at(10, 30), at(11))
+    day = only_day(compute(inputs(sessions=[(at(9), at(11))], samples=samples), DAY, DAY, NOW))
+    assert day["idle_seconds"] == 30 * 60
+    assert day["tracked_seconds"] == 90 * 60
+
+
+def test_gap_longer_than_threshold_is_idle():
+    samples = [(at(9), "active"), (at(9, 40), "active"), (at(9, 50), "active")]
+    day = only_day(compute(inputs(sessions=[(at(9), at(10))], samples=samples, threshold=10 * 60),
+                           DAY, DAY, NOW))
+    # Idle from 9:10 (threshold after the 9:00 sample) to the next sample, and after 10:00 via 9:50 + 10 min
+    assert day["idle_seconds"] == 30 * 60
+    assert day["tracked_seconds"] == 30 * 60
+
+
+def test_no_samples_means_no_idle():
+    day = only_day(compute(inputs(sessions=[(at(9), at(17))]), DAY, DAY, NOW))
+    assert day["idle_seconds"] == 0
+    assert day["tracked_seconds"] == 8 * 3600
+
+
+def test_manual_log_overlapping_tracked_time_counts_once():
+    day = only_day(compute(inputs(sessions=[(at(9), at(11))], manual=[(at(10), at(12))]), DAY, DAY, NOW))
+    assert day["tracked_seconds"] == 2 * 3600
+    assert day["manual_seconds"] == 3600
+    assert day["worked_seconds"] == 3 * 3600
+
+
+def test_manual_log_replaces_idle_time():
+    samples = [(at(9), "active"), (at(9, 10), "idle"), (at(10), "active")]
+    day = only_day(compute(inputs(sessions=[(at(9), at(10))], manual=[(at(9, 10), at(10))], samples=samples),
+                           DAY, DAY, NOW))
+    assert day["idle_seconds"] == 0
+    assert day["tracked_seconds"] == 10 * 60
+    assert day["manual_seconds"] == 50 * 60
+    assert day["worked_seconds"] == 3600
+
+
+def test_session_across_midnight_is_split():
+    result = compute(inputs(sessions=[(at(22), at(2, day=DAY + timedelta(days=1)))]),
+                     DAY, DAY + timedelta(days=1), NOW)
+    assert [(d["date"], d["tracked_seconds"]) for d in result["a@example.com"]] == [
+        ("2026-01-15", 2 * 3600), ("2026-01-16", 2 * 3600),
+    ]
+
+
+def test_session_started_days_before_the_range():
+    started = at(9, day=DAY - timedelta(days=3))
+    day = only_day(compute(inputs(sessions=[(started, at(10))]), DAY, DAY, NOW))
+    assert day["tracked_seconds"] == 10 * 3600
+
+
+def test_open_session_runs_until_now():
+    now = at(11)
+    samples = active_every(10, at(9), now)
+    day = only_day(compute(inputs(sessions=[(at(9), None)], samples=samples), DAY, DAY, now))
+    assert day["tracked_seconds"] == 2 * 3600
+
+
+def test_stale_open_session_ends_at_last_sign_of_life_plus_threshold():
+    samples = active_every(10, at(9), at(10))
+    day = only_day(compute(inputs(sessions=[(at(9), None)], samples=samples), DAY, DAY, at(20)))
+    # Last active sample 10:00 + 30 min threshold; the silence after it is idle
+    assert day["tracked_seconds"] + day["idle_seconds"] == 90 * 60
+
+
+def test_rows_match_emails_case_insensitively():
+    data = inputs(sessions=[(at(9), at(10))], email="A@Example.com")
+    data["emails"] = ["a@example.com"]
+    day = only_day(compute(data, DAY, DAY, NOW))
+    assert day["tracked_seconds"] == 3600
+
+
+def test_days_without_time_are_left_out():
+    assert compute(inputs(), DAY, DAY, NOW) == {"a@example.com": []}
+
+
+def test_load_inputs_bounds_the_lookback_of_long_open_sessions(monkeypatch):
+    from app import timeline
+
+    ancient = at(9, day=DAY - timedelta(days=200))
+    sample_params = []
+
+    def fetchall_sync(query, params, dictionary=True):
+        if "av_activity" in query:
+            sample_params.append(params)
+            return []
+        if "tblsession" in query:
+            return [("a@example.com", ancient, None)]
+        return []
+
+    monkeypatch.setattr(timeline.db, "fetchall_sync", fetchall_sync)
+    monkeypatch.setattr(timeline, "TIMELINE_MAX_LOOKBACK", 7 * 86400)
+    data = timeline.load_inputs(["a@example.com"], DAY, DAY)
+
+    floor = at(0) - timedelta(days=7)
+    assert data["sessions"] == [("a@example.com", floor, None)]
+    assert sample_params[0][-2] == floor
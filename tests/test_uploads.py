@@ -0,0 +1,102 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+
+from app.uploads import UploadError, UploadStore
+
+
+async def _stream(*pieces):
+    for piece in pieces:
+        yield piece
+
+
+def append(store, upload_id, offset, *pieces):
+    return asyncio.run(store.append(upload_id, offset, _stream(*pieces)))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path), ttl=3600, max_size=1024)
+
+
+def test_append_resumes_and_skips_bytes_already_received(store):
+    upload_id = store.create("a@example.com", 6, None)["upload_id"]
+    assert append(store, upload_id, 0, b"abc") == 3
+    assert append(store, upload_id, 1, b"bcdef") == 6
+    meta, f = store.open_complete(upload_id)
+    with f:
+        assert f.read() == b"abcdef"
+        store.complete(upload_id)
+    assert os.listdir(store.root) == []
+
+
+def test_chunk_past_received_offset_is_refused(store):
+    upload_id = store.create("a@example.com", 6, None)["upload_id"]
+    with pytest.raises(UploadError) as e:
+        append(store, upload_id, 2, b"cd")
+    assert (e.value.status, e.value.offset) == (409, 0)
+
+
+def test_second_finalize_is_refused_while_the_first_holds_the_upload(store):
+    upload_id = store.create("a@example.com", 3, None)["upload_id"]
+    append(store, upload_id, 0, b"abc")
+    meta, f = store.open_complete(upload_id)
+    with f:
+        with pytest.raises(UploadError) as e:
+            store.open_complete(upload_id)
+        assert e.value.status == 409
+        store.complete(upload_id)
+    with pytest.raises(UploadError) as e:
+        store.open_complete(upload_id)
+    assert e.value.status == 404
+
+
+def test_append_after_finalize_finds_no_upload(store):
+    upload_id = store.create("a@example.com", 3, None)["upload_id"]
+    append(store, upload_id, 0, b"abc")
+    meta, f = store.open_complete(upload_id)
+    with f:
+        store.complete(upload_id)
+    with pytest.raises(UploadError) as e:
+        append(store, upload_id, 3, b"")
+    assert e.value.status == 404
+
+
+def test_descriptor_is_complete_json_and_no_temp_file_is_left(store):
+    upload_id = store.create("a@example.com", 3, "AB" * 32)["upload_id"]
+    with open(os.path.join(store.root, upload_id + ".json")) as f:
+        assert json.load(f)["sha256"] == "ab" * 32
+    assert sorted(os.listdir(store.root)) == [upload_id + ".json", upload_id + ".part"]
+
+
+def test_purge_keeps_young_unreadable_descriptors(store):
+    live = store.create("a@example.com", 3, None)["upload_id"]
+    stale = store.create("a@example.com", 3, None)["upload_id"]
+    for upload_id in (live, stale):
+        with open(os.path.join(store.root, upload_id + ".json"), "w") as f:
+            f.write("{not json")
+    old = time.time() - 2 * store.ttl
+    os.utime(os.path.join(store.root, stale + ".json"), (old, old))
+
+    assert store.purge_expired(force=True) == 1
+    assert sorted(os.listdir(store.root)) == [live + ".json", live + ".part"]
+
+
+def test_purge_removes_expired_uploads_and_old_orphans(store):
+    upload_id = store.create("a@example.com", 3, None)["upload_id"]
+    path = os.path.join(store.root, upload_id + ".json")
+    with open(path) as f:
+        meta = json.load(f)
+    meta["expires_at"] = int(time.time()) - 1
+    with open(path, "w") as f:
+        json.dump(meta, f)
+    orphan = os.path.join(store.root, "f" * 32 + ".part")
+    open(orphan, "wb").close()
+    old = time.time() - 2 * store.ttl
+    os.utime(orphan, (old, old))
+
+    assert store.purge_expired(force=True) == 1
+    assert os.listdir(store.root) == []